@@ -23,7 +23,7 @@ VERSION = '0.1.0'
 
 # What packages are required for this module to be executed?
 REQUIRED = [ 'numpy', 'scipy', 'pandas', 'matplotlib',
-             'networkx', 'ipython', 'anytree']
+             'networkx', 'ipython']
 
 # What packages are optional?
 EXTRAS = {
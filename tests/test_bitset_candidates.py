@@ -0,0 +1,98 @@
+import numpy as np
+
+from uclasmcode import uclasm
+from uclasmcode.uclasm import BitsetCandidates
+from uclasmcode.uclasm.filters import topology_filter_bitset, topology_filter_dense
+from uclasmcode.uclasm.filters.run_filters_cs import run_filters as run_filters_cs
+from uclasmcode.uclasm.utils.bitset_candidates import call_filter, popcount
+from uclasmcode.utils import data
+
+tmplts, world = data.tim_test_graph_1(1)
+tmplt = tmplts[0]
+
+
+def random_candidates(seed, shape=(7, 70), density=0.3):
+    return np.random.RandomState(seed).rand(*shape) < density
+
+
+def test_popcount():
+    words = np.array([0, 1, 0xFF, 2**63, 2**64 - 1], dtype=np.uint64)
+    assert popcount(words).tolist() == [0, 1, 8, 1, 64]
+
+
+def test_same_as_bool():
+    is_cand = random_candidates(0)
+    cands = BitsetCandidates.from_bool(is_cand)
+    assert cands.shape == is_cand.shape
+    assert cands.nbytes * 8 <= is_cand.nbytes + 8 * 64
+    assert np.array_equal(cands.to_bool(), is_cand)
+    assert np.array_equal(np.asarray(cands), is_cand)
+    assert np.array_equal(cands.sum(axis=1), is_cand.sum(axis=1))
+    assert np.array_equal(cands.sum(axis=0), is_cand.sum(axis=0))
+    assert cands.sum() == is_cand.sum()
+    assert np.array_equal(cands.any(axis=1), is_cand.any(axis=1))
+    assert np.array_equal(cands.any(axis=0), is_cand.any(axis=0))
+    assert np.array_equal(cands[3], is_cand[3])
+    assert cands[3, 5] == is_cand[3, 5]
+    is_col = is_cand.any(axis=0) & (np.arange(70) % 3 > 0)
+    assert np.array_equal(cands[:, is_col].to_bool(), is_cand[:, is_col])
+    assert BitsetCandidates.ones(3, 70) == BitsetCandidates.from_bool(np.ones((3, 70), dtype=bool))
+    assert not BitsetCandidates.zeros(3, 70).any()
+
+
+def test_setitem():
+    is_cand = random_candidates(1)
+    cands = BitsetCandidates.from_bool(is_cand)
+    copy = cands.copy()
+    for key, value in [((slice(None), 66), False), ((slice(None), 2), True), ((4, slice(None)), is_cand[0]),
+                       ((2, 65), True), ((5, is_cand[6]), False), (1, is_cand[1] & is_cand[2])]:
+        cands[key] = value
+        is_cand[key] = value
+        assert np.array_equal(cands.to_bool(), is_cand)
+    cands[:, :] = True
+    assert cands.sum() == 7 * 70
+    assert copy == BitsetCandidates.from_bool(random_candidates(1))
+    assert np.array_equal(cands.difference(copy).to_bool(), ~random_candidates(1))
+    assert cands.changed_rows(copy).all()
+
+
+def test_permutation_filter():
+    for seed in range(20):
+        is_cand = random_candidates(seed, shape=(6, 9), density=0.4)
+        is_cand[:3, :3] |= np.eye(3, dtype=bool)
+        _, _, expected = uclasm.permutation_filter(tmplt, world, is_cand.copy())
+        _, _, cands = uclasm.permutation_filter(tmplt, world, BitsetCandidates.from_bool(is_cand))
+        assert np.array_equal(cands.to_bool(), expected)
+
+
+def test_run_filters():
+    """ run_filters gives the same candidates for bool arrays and BitsetCandidates """
+    for filters in [uclasm.cheap_filters, uclasm.all_filters]:
+        _, new_world, expected = uclasm.run_filters(tmplt, world, filters=filters, verbose=False)
+        _, bitset_world, cands = uclasm.run_filters(
+            tmplt, world, candidates=BitsetCandidates.ones(tmplt.n_nodes, world.n_nodes), filters=filters)
+        assert isinstance(cands, BitsetCandidates)
+        assert np.array_equal(cands.to_bool(), expected)
+        assert list(bitset_world.nodes) == list(new_world.nodes)
+    for filters in [uclasm.cs_filters, [topology_filter_dense.topology_filter]]:
+        candidates = np.ones((tmplt.n_nodes, world.n_nodes), dtype=bool)
+        _, _, expected = run_filters_cs(tmplt, world, candidates=candidates, filters=filters, reduce_world=False)
+        _, _, cands = run_filters_cs(tmplt, world, candidates=BitsetCandidates.from_bool(candidates),
+                                     filters=filters, reduce_world=False)
+        assert np.array_equal(cands.to_bool(), expected)
+
+
+def test_call_filter():
+    """ Filters not marked with accepts_bitsets get a bool array """
+    seen = []
+
+    def bool_filter(tmplt, world, candidates, **kwargs):
+        seen.append(type(candidates))
+        candidates[0, :] = False
+        return tmplt, world, candidates
+
+    cands = BitsetCandidates.ones(tmplt.n_nodes, world.n_nodes)
+    _, _, cands = call_filter(bool_filter, tmplt, world, cands)
+    assert seen == [np.ndarray]
+    assert isinstance(cands, BitsetCandidates) and not cands[0].any() and cands[1].all()
+    assert getattr(topology_filter_bitset.topology_filter, "accepts_bitsets", False)
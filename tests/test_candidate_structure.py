@@ -108,3 +108,87 @@ def test_superedge_multiplicity():
 
 
 
+def test_restore_changes():
+    cs_copy = cs.copy()
+    assert cs_copy.world_graph is cs.world_graph  # the world is shared, never copied
+    original = cs_copy.candidates_array.copy()
+    mark = cs_copy.mark_changes()
+    snC = cs_copy.get_supernode_by_name('C')
+    assert cs_copy.update_candidates((snC, cs_copy.get_cand_node_from_idxs([1, 2])))
+    cs_copy.run_cheap_filters()
+    assert not cs_copy.candidates_array[:, 3].any()
+    cs_copy.restore_changes(mark)
+    assert np.all(cs_copy.candidates_array == original)
+    assert np.all(cs.candidates_array == original)
+
+
+def test_apply_changes():
+    cs_copy = cs.copy()
+    snC = cs_copy.get_supernode_by_name('C')
+    cs_copy.update_candidates((snC, cs_copy.get_cand_node_from_idxs([1, 2])))
+    cs_copy.run_cheap_filters()
+    other = cs.copy()
+    other.apply_changes(cs_copy.get_changes())
+    assert np.all(other.candidates_array == cs_copy.candidates_array)
+    other.restore_changes()
+    assert np.all(other.candidates_array == cs.candidates_array)
+
+
+def test_partition_candidates():
+    for candstruct in [cs, cs1]:
+        for sn in candstruct.supernodes.values():
+            cand_idxs = candstruct.get_cand_list_idxs(sn)
+            expected = equivalence_partition.Equivalence(cand_idxs)
+            expected.partition(candstruct.candidate_equivalence, sn)
+            result = candstruct.partition_candidates(cand_idxs, sn)
+            assert [sorted(c) for c in result] == [sorted(c) for c in expected.classes()]
+            # memoized: the same classes the second time
+            assert candstruct.partition_candidates(cand_idxs, sn) == result
+
+
+def test_superedge_index():
+    for candstruct in [cs, cs1]:
+        supernodes = list(candstruct.supernodes.values())
+        for ch in candstruct.channels:
+            for u in supernodes:
+                incoming = {v: candstruct.get_superedge_multiplicity(v, u, ch) for v in supernodes if v is not u}
+                outgoing = {v: candstruct.get_superedge_multiplicity(u, v, ch) for v in supernodes if v is not u}
+                assert dict(zip(*candstruct.get_incoming_superedges(u, ch))) == \
+                    {v: m for v, m in incoming.items() if m != 0}
+                assert dict(zip(*candstruct.get_outgoing_superedges(u, ch))) == \
+                    {v: m for v, m in outgoing.items() if m != 0}
+    # shared with the copies
+    assert cs.copy().superedge_index is cs.superedge_index
+
+
+def test_get_unfiltered_rows():
+    cs_copy = cs.copy()
+    assert cs_copy.get_unfiltered_rows() is None  # never filtered: all of them
+    cs_copy.run_cheap_filters()
+    assert cs_copy.is_filtered()
+    mark = cs_copy.mark_changes()
+    snC = cs_copy.get_supernode_by_name('C')
+    assert cs_copy.update_candidates((snC, cs_copy.get_cand_node_from_idxs([1, 2])))
+    assert np.flatnonzero(cs_copy.get_unfiltered_rows()).tolist() == sorted(snC.vertices)
+    filtered = cs.copy()
+    filtered.update_candidates((snC, filtered.get_cand_node_from_idxs([1, 2])))
+    filtered.run_cheap_filters()  # from all the template nodes
+    cs_copy.run_cheap_filters()  # only from those of snC
+    assert cs_copy.is_filtered()
+    assert np.all(cs_copy.candidates_array == filtered.candidates_array)
+    cs_copy.restore_changes(mark)
+    assert cs_copy.is_filtered()
+    cs_copy.restore_changes(0)
+    assert cs_copy.is_filtered() == (mark == 0)
+
+
+def test_sparse_adjacency():
+    from uclasmcode.candidate_structure.graph_data_structure import SparseAdjacency
+    rng = np.random.RandomState(0)
+    dense = (rng.rand(30, 20) < 0.2) * rng.randint(1, 4, (30, 20))
+    adj = SparseAdjacency(sparse.csr_matrix(dense))
+    for rows, cols in [([3, 1, 3], list(range(20))), (list(range(30)), [5, 0, 5]), ([], [1, 2]), ([4], [])]:
+        assert np.all(adj.dense_submatrix(rows, cols) == dense[np.ix_(rows, cols)])
+    for ch, world_adj in cs.world_adjacency.items():  # the same as the world graph
+        assert np.all(world_adj.dense_submatrix(range(cs.num_world_nodes), range(cs.num_world_nodes)) ==
+                      cs.world_graph.ch_to_adj[ch].toarray())
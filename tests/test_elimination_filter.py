@@ -0,0 +1,16 @@
+import numpy as np
+
+from uclasmcode import uclasm
+from uclasmcode.candidate_structure.benchmark_orderings import synthetic_instance
+
+
+def test_parallel_elimination_filter():
+    """ The pool of the parallel mode eliminates the same candidates """
+    tmplt, world = synthetic_instance(5, num_world_nodes=60, num_tmplt_nodes=6)
+    tmplt, world, candidates = uclasm.run_filters(tmplt, world, filters=uclasm.cheap_filters)
+    _, expected_world, expected = uclasm.elimination_filter(tmplt, world, candidates.copy())
+    _, new_world, new_candidates = uclasm.parallel_elimination_filter(
+        tmplt, world, candidates.copy(), num_workers=2)
+    assert expected.sum() < candidates.sum()
+    assert np.array_equal(new_candidates, expected)
+    assert list(new_world.nodes) == list(expected_world.nodes)
@@ -1,5 +1,8 @@
 import time
 
+import numpy as np
+import scipy.sparse as sparse
+
 from uclasmcode import equivalence_partition
 from uclasmcode.utils import data
 
@@ -102,4 +105,47 @@ def test_tim_test_graph_1():
     assert sorted(non_triv) == [2, 2]
 
 
-
+def test_partition_multichannel_hashing():
+    tmplts, world = data.tim_test_graph_1()
+    for graph in [tmplts[0], world]:
+        expected = equivalence_partition.partition_multichannel(graph.ch_to_adj)
+        result = equivalence_partition.partition_multichannel_hashing(graph.ch_to_adj)
+        assert sorted(map(sorted, result.classes())) == sorted(map(sorted, expected.classes()))
+
+    # twins with and without an edge between them, on a subset of the vertices
+    adj_matrix = np.array([
+        [0, 1, 1, 0, 0],
+        [0, 2, 1, 1, 1],
+        [0, 1, 2, 1, 1],
+        [1, 0, 0, 0, 0],
+        [1, 0, 0, 0, 0]])
+    for vertices in [None, [1, 2, 3]]:
+        expected = equivalence_partition.partition_vertices(adj_matrix, vertices)
+        result = equivalence_partition.partition_vertices_hashing(sparse.csr_matrix(adj_matrix), vertices)
+        assert sorted(map(sorted, result.classes())) == sorted(map(sorted, expected.classes()))
+    assert sorted(map(sorted, result.classes())) == [[1, 2], [3]]
+
+
+def test_array_equivalence():
+    rng = np.random.RandomState(0)
+    vertices = [0, 2, 3, 5, 6, 8, 9, 11]
+    expected = equivalence_partition.Equivalence(vertices)
+    result = equivalence_partition.ArrayEquivalence(vertices)
+    for a, b in rng.choice(vertices, size=(5, 2)):
+        expected.merge_classes_of(a, b)
+        result.merge_classes_of(a, b)
+    result.add_singleton(12)
+    expected.add_singleton(12)
+    for equiv in [result, equivalence_partition.ArrayEquivalence.from_equivalence(expected)]:
+        assert sorted(map(sorted, equiv.classes())) == sorted(map(sorted, expected.classes()))
+        assert sorted(map(sorted, equiv.non_trivial_classes())) == sorted(map(sorted, expected.non_trivial_classes()))
+        assert equiv.class_count() == expected.class_count() and len(equiv) == len(expected)
+        for a in vertices:
+            assert equiv.get_equiv_size(a) == expected.get_equiv_size(a)
+            assert all(equiv.in_same_class(a, b) == expected.in_same_class(a, b) for b in vertices)
+    assert result.labels[1] == -1 and result.labels[12] == 12
+
+    labels = np.array([3, 1, 3, 1, 2])
+    equiv = equivalence_partition.ArrayEquivalence.from_labels(labels, [1, 2, 3, 4])
+    assert equiv.classes() == [{1, 3}, {2}, {4}]
+    assert equiv.compress_to_root(3) == 1 and equiv.get_all_roots() == {1, 2, 4}
@@ -2,6 +2,7 @@ from uclasmcode.utils import data
 from uclasmcode import equivalence_partition
 from uclasmcode.candidate_structure.candidate_structure import *
 from uclasmcode.candidate_structure.find_isomorphisms import *
+from uclasmcode.candidate_structure.solution_store import SolutionStore
 
 tmplts, world = data.tim_test_graph_1()
 tmplt = tmplts[0]
@@ -39,3 +40,92 @@ def test_find_isomorphism1():
 # def test_find_iso_pnnlv6():
 # 	sol = find_isomorphisms(cs2)
 # 	assert sol.get_isomorphisms_count() == 1152
+
+
+def test_find_isomorphism_parallel():
+	sol = find_isomorphisms(cs, False, False)
+	sol_parallel = find_isomorphisms(cs, False, False, num_workers=2)
+	assert sol_parallel.get_isomorphisms_count() == 12
+	assert str(sol_parallel) == str(sol)
+
+
+def test_find_isomorphism_work_stealing():
+	sol = find_isomorphisms(cs1, False, False)
+	sol_parallel = find_isomorphisms(cs1, False, False, num_workers=2, scheduler="work_stealing")
+	assert sol_parallel.get_isomorphisms_count() == 4
+	assert sol_parallel.get_signal_nodes() == sol.get_signal_nodes()
+
+
+def test_search_engine_step():
+	engine = SearchEngine(cs, count_only=True)
+	engine.start()
+	max_depth = 0
+	while engine.step():
+		max_depth = max(max_depth, len(engine.stack))
+		assert len(engine.pm) == engine.base + len(engine.stack) - 1
+	assert engine.solution.get_isomorphisms_count() == 12
+	assert max_depth <= cs.get_supernodes_count()
+
+
+def test_resume_find_isomorphisms(tmp_path):
+	checkpoint_path = str(tmp_path / "search.p")
+	sol = find_isomorphisms(cs, False, False, checkpoint_path=checkpoint_path)
+	assert resume_find_isomorphisms(checkpoint_path, False, False).get_isomorphisms_count() == 12
+	# stop in the middle of the search and continue from there
+	engine = SearchEngine(cs)
+	engine.start()
+	for i in range(3):
+		engine.step()
+	save_checkpoint(checkpoint_path, engine, {"count_only": False, "filter_verbose": False, "cap_iso": None})
+	sol_resumed = resume_find_isomorphisms(checkpoint_path, False, False)
+	assert sol_resumed.get_isomorphisms_count() == 12
+	assert str(sol_resumed) == str(sol)
+
+
+def test_iter_isomorphisms():
+	sol = find_isomorphisms(cs, False, False)
+	matches = list(iter_isomorphisms(cs))
+	assert len(matches) == sol.get_num_matches()
+	assert sum(SolutionTree.count_isomorphisms(match) for match in matches) == 12
+	assert {frozenset(match.items()) for match in matches} == \
+		{frozenset(match.items()) for match in sol.iterate_isomorphisms()}
+
+
+def test_solution_store(tmp_path):
+	store_path = str(tmp_path / "solutions")
+	sol = find_isomorphisms(cs, False, False, solution_store=store_path)
+	store = SolutionStore(store_path)
+	assert store.get_num_matches() == sol.get_num_matches()
+	assert store.get_isomorphisms_count() == 12
+	assert store.get_min_complete_cand_set() == sol.get_min_complete_cand_set()
+	assert store.get_signal_nodes() == sol.get_signal_nodes()
+
+
+def test_compress_world(tmp_path):
+	for candstruct in [cs, cs1]:
+		sol = find_isomorphisms(candstruct, False, False)
+		compressed_cs = candstruct.copy()
+		world_classes = compressed_cs.compress_world()
+		assert len(world_classes) < candstruct.num_world_nodes
+		store_path = str(tmp_path / f"solutions{len(world_classes)}")
+		compressed_sol = find_isomorphisms(compressed_cs, False, False, solution_store=store_path)
+		assert compressed_sol.get_isomorphisms_count() == sol.get_isomorphisms_count()
+		assert compressed_sol.get_num_matches() <= sol.get_num_matches()
+		assert SolutionStore(store_path).get_isomorphisms_count() == sol.get_isomorphisms_count()
+		assert candstruct.world_classes is None
+
+
+def test_benchmark_orderings():
+	from uclasmcode.candidate_structure.benchmark_orderings import benchmark_orderings, format_table, \
+		synthetic_instances
+	instances = [("tim_0", cs), ("tim_1", cs1)] + synthetic_instances([1])
+	rows = benchmark_orderings(instances)
+	assert len(rows) == len(instances) * len(Ordering.SCORINGS)
+	counts = {}
+	for row in rows:
+		counts.setdefault(row["instance"], set()).add(row["isomorphisms"])
+		assert row["search_nodes"] > 0 and not row["stopped"]
+	assert counts["tim_0"] == {12} and counts["tim_1"] == {4}
+	assert len(counts["synthetic_1"]) == 1 and counts["synthetic_1"].pop() >= 1  # the planted template
+	assert all(row["filter_calls"] > 0 for row in rows if row["instance"] == "tim_1")
+	assert len(format_table(rows).splitlines()) == len(rows) + 1
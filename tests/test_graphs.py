@@ -7,3 +7,35 @@ tmplts, world = data.tim_test_graph_1()
 tmplt = tmplts[0]
 print("Loading took {} seconds".format(time.time()-start_time))
 
+
+
+def test_edge_index():
+    import numpy as np
+    import scipy.sparse as sparse
+    from uclasmcode.uclasm import Graph
+    for graph in [tmplt, world]:
+        for ch, adj in graph.ch_to_adj.items():
+            src, dst = np.meshgrid(np.arange(graph.n_nodes), np.arange(graph.n_nodes), indexing="ij")
+            assert np.all(graph.multiplicity(ch, src, dst) == adj.toarray())
+    rng = np.random.RandomState(0)
+    dense = (rng.rand(50, 50) < 0.3) * rng.randint(1, 5, (50, 50))
+    graph = Graph(list(range(50)), ["0"], [sparse.csr_matrix(dense)])
+    src, dst = rng.randint(0, 50, 1000), rng.randint(0, 50, 1000)
+    assert np.all(graph.multiplicity("0", src, dst) == dense[src, dst])
+    assert graph.multiplicity("0", 3, 4) == dense[3, 4]
+    assert len(graph.edge_index) == np.count_nonzero(dense)
+    graph.add_edge("0", 3, 4, count=2)  # invalidates the index
+    assert graph.multiplicity("0", 3, 4) == dense[3, 4] + 2
+
+
+def test_shared_graph():
+    import pickle
+    import numpy as np
+    from uclasmcode.uclasm import SharedGraph
+    with SharedGraph(world) as shared:
+        assert shared.attach() is world
+        attached = pickle.loads(pickle.dumps(shared)).attach()
+        assert list(attached.nodes) == list(world.nodes)
+        assert list(attached.channels) == list(world.channels)
+        for ch, adj in world.ch_to_adj.items():
+            assert np.array_equal(attached.ch_to_adj[ch].toarray(), adj.toarray())
@@ -1,8 +1,12 @@
+from itertools import permutations
+
+from scipy.special import comb
+
 import pytest
 
 from uclasmcode import equivalence_partition
 from uclasmcode.candidate_structure.candidate_structure import *
-from uclasmcode.candidate_structure.match_subgraph_utils import is_joinable
+from uclasmcode.candidate_structure.match_subgraph_utils import is_joinable, get_joinable_mask
 from uclasmcode.candidate_structure.partial_match import *
 from uclasmcode.utils import data
 
@@ -104,6 +108,51 @@ def test_isjoinable1():
     assert is_joinable(pm, cs1, snE, mE)
 
 
+def test_get_joinable_mask():
+    """ get_joinable_mask agrees with is_joinable for every candidate node of every supernode """
+    for candstruct in [cs, cs1]:
+        pm = PartialMatch()
+        for sn in candstruct.supernodes.values():
+            cands = [Supernode(idxs, candstruct.get_names_from_vertices(idxs))
+                     for idxs in permutations(range(candstruct.num_world_nodes), len(sn))]
+            for partial in [PartialMatch(), pm]:
+                if sn in partial.matches:
+                    continue
+                expected = [is_joinable(partial, candstruct, sn, cand) for cand in cands]
+                mask = get_joinable_mask(partial, candstruct, sn, [cand.vertices for cand in cands])
+                assert mask.tolist() == expected
+            if any(expected):  # grow the partial match with the first joinable candidate node
+                pm.add_match(sn, cands[expected.index(True)])
+
+
 if __name__ == "__main__":
     test_isjoinable0()
     test_isjoinable1()
+
+
+def test_ordering():
+    """ The queue of Ordering picks the same supernode as a full rescan """
+    from uclasmcode.candidate_structure.find_isomorphisms import SearchEngine
+    from uclasmcode.candidate_structure.match_subgraph_utils import Ordering
+    for candstruct in [cs, cs1]:
+        for scoring in Ordering.SCORINGS:
+            engine = SearchEngine(candstruct)
+            engine.ordering = ordering = Ordering(engine.cs, scoring)
+            positions = list(engine.cs.supernodes.values())
+            queue_next_cand = ordering.get_next_cand
+
+            def get_next_cand(pm):
+                def get_key(sn):
+                    return ordering.scoring(
+                        ordering, sn, comb(engine.cs.get_candidates_count(sn), len(sn))), positions.index(sn)
+                expected = min((sn for sn in positions if sn not in pm.matches), key=get_key)
+                assert queue_next_cand(pm) == expected
+                assert all(ordering.num_matched_nbrs[sn] == len(ordering._get_neighbors(sn) & set(pm.matches))
+                           for sn in positions)
+                return expected
+
+            ordering.get_next_cand = get_next_cand
+            engine.start()
+            while engine.step():
+                pass
+            assert engine.solution.get_isomorphisms_count() == (12 if candstruct is cs else 4)
@@ -28,3 +28,11 @@ def test_create():
     four_match.add_match(SuperTemplateNode(equiv_classes[4]),
                          Supernode(new_match[4], '4'))
     assert four_match == create_partial_match(5)
+
+
+def test_matched_world_nodes():
+    partial_match = create_partial_match(3)
+    assert partial_match.get_matched_world_nodes(8).tolist() == [True, False, True, False, True, True, False, False]
+    partial_match.rm_last_match()
+    assert partial_match.get_matched_world_nodes(6).tolist() == [True, False, True, False, False, False]
+    assert partial_match.copy().get_matched_world_nodes(6).tolist() == [True, False, True, False, False, False]
@@ -0,0 +1,54 @@
+import numpy as np
+
+from uclasmcode import uclasm
+from uclasmcode.uclasm import BitsetCandidates
+from uclasmcode.uclasm.filters.sac_filter import SACEngine
+from uclasmcode.candidate_structure.benchmark_orderings import synthetic_instance
+
+tmplt, world = synthetic_instance(5, num_world_nodes=60, num_tmplt_nodes=6)
+tmplt, world, candidates = uclasm.run_filters(tmplt, world, filters=uclasm.cheap_filters)
+
+
+def isomorphism_pairs():
+    """ The (template node, world node) pairs of every isomorphism, by backtracking over the candidates """
+    tmplt_adjs = [adj.toarray() for adj in tmplt.adjs]
+    world_adjs = [world.ch_to_adj[ch].toarray() for ch in tmplt.channels]
+    pairs = np.zeros(candidates.shape, dtype=bool)
+
+    def extend(assignment):
+        i = len(assignment)
+        if i == tmplt.n_nodes:
+            pairs[np.arange(i), assignment] = True
+            return
+        for cand in np.flatnonzero(candidates[i]):
+            if cand not in assignment and all(
+                    world_adj[cand, cand] >= tmplt_adj[i, i] and
+                    all(world_adj[cand, assignment[j]] >= tmplt_adj[i, j] and
+                        world_adj[assignment[j], cand] >= tmplt_adj[j, i] for j in range(i))
+                    for tmplt_adj, world_adj in zip(tmplt_adjs, world_adjs)):
+                extend(assignment + [cand])
+
+    extend([])
+    return pairs
+
+
+def test_sac_filter():
+    """ Only candidates of no isomorphism are eliminated """
+    _, _, sac_cands = uclasm.sac_filter(tmplt, world, candidates.copy())
+    assert sac_cands.sum() < candidates.sum()
+    assert np.all(sac_cands[isomorphism_pairs()])
+    _, _, packed = uclasm.sac_filter(tmplt, world, BitsetCandidates.from_bool(candidates))
+    assert np.array_equal(packed.to_bool(), sac_cands)
+
+
+def test_rollback():
+    """ A trial leaves the candidates and support counts as they were """
+    engine = SACEngine(tmplt, world, BitsetCandidates.from_bool(candidates))
+    assert engine.is_consistent
+    words = engine.words.copy()
+    supports = {arc: support.copy() for arc, support in engine.supports.items()}
+    for node_idx in range(tmplt.n_nodes):
+        for cand_idx in engine.cand_idxs(node_idx):
+            engine.try_assignment(node_idx, cand_idx)
+            assert np.array_equal(engine.words, words)
+            assert all(np.array_equal(engine.supports[arc], supports[arc]) for arc in supports)
@@ -24,3 +24,17 @@ def test_add_solution():
     s7 = SolutionNode(Supernode(5), parent=s4)
 
 
+
+
+def test_append_to_tree_shares_prefixes():
+    template_nodes = [Supernode([0], ["a"]), Supernode([1], ["b"])]
+    st = SolutionTree(template_nodes)
+    for match in [(5, 6), (5, 7), (8, 6)]:
+        pm = PartialMatch()
+        for sn, v in zip(template_nodes, match):
+            pm.add_match(sn, Supernode([v], [str(v)]))
+        st.add_solution(pm)
+    assert len(st.root.children) == 2
+    assert len(st.root.get_child(Supernode([5], ["5"])).children) == 2
+    assert st.get_isomorphisms_count() == 3
+    assert len(list(st.iterate_isomorphisms())) == 3
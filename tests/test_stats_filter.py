@@ -0,0 +1,34 @@
+import numpy as np
+
+from uclasmcode.uclasm.filters.stats_filter import FeatureCache
+from uclasmcode.utils import data
+
+tmplts, world = data.tim_test_graph_1(1)
+tmplt = tmplts[0]
+
+
+def test_root_features_bound_subgraph():
+    cache = FeatureCache()
+    subgraph = world.subgraph(np.array([True, False, True, True, True]))
+    subsubgraph = subgraph.subgraph([0, 2])
+    assert subsubgraph.root_graph is world
+    assert list(subsubgraph.root_idxs) == [0, 3]
+    for graph in [subgraph, subsubgraph]:
+        upper_bounds = cache.get_upper_bounds(graph)
+        assert np.all(upper_bounds >= cache.get(graph))
+        assert np.all(upper_bounds == cache.get(world)[:, graph.root_idxs])
+
+
+def test_cache_invalidation():
+    cache = FeatureCache()
+    graph = world.copy()
+    channel = next(iter(graph.channels))
+    before = cache.get(graph).copy()
+    assert cache.get(graph) is cache.get(graph)
+    graph.add_edge(channel, 0, 1)
+    assert not np.all(cache.get(graph) == before)
+    subgraph = graph.subgraph([0, 1])
+    graph.add_edge(channel, 0, 1)
+    assert not subgraph.is_root_current
+    cache.invalidate(graph)
+    cache.invalidate()
@@ -0,0 +1,38 @@
+import numpy as np
+from scipy import sparse
+
+from uclasmcode.uclasm.filters import topology_filter_bitset, topology_filter_dense
+from uclasmcode.uclasm.filters.run_filters_cs import run_filters
+from uclasmcode.utils import data
+
+tmplts, world = data.tim_test_graph_1(1)
+tmplt = tmplts[0]
+
+
+def test_pack_rows():
+    is_set = np.zeros((2, 70), dtype=bool)
+    is_set[0, [0, 63, 64, 69]] = True
+    packed = topology_filter_bitset.pack_rows(is_set)
+    assert packed.shape == (2, 2)
+    assert packed[0, 0] == (1 << 0) | (1 << 63)
+    assert packed[0, 1] == (1 << 0) | (1 << 5)
+    assert not packed[1].any()
+
+
+def test_pack_threshold():
+    adj = sparse.csr_matrix(np.array([[0, 2, 1], [1, 0, 0], [0, 3, 0]]))
+    for threshold in [1, 2, 3]:
+        assert np.all(topology_filter_bitset.pack_threshold(adj, threshold) ==
+                      topology_filter_bitset.pack_rows(adj.A >= threshold))
+
+
+def test_same_as_dense():
+    candidates = np.ones((tmplt.n_nodes, world.n_nodes), dtype=bool)
+    _, _, dense_cands = run_filters(
+        tmplt, world, candidates=candidates.copy(),
+        filters=[topology_filter_dense.topology_filter], reduce_world=False)
+    _, _, bitset_cands = run_filters(
+        tmplt, world, candidates=candidates.copy(),
+        filters=[topology_filter_bitset.topology_filter], reduce_world=False)
+    assert np.all(dense_cands == bitset_cands)
+    assert not np.all(bitset_cands)
@@ -0,0 +1,157 @@
+""" Compare the orderings of the search (Ordering.SCORINGS) on the same instances.
+
+Every instance is searched once per ordering with a SearchEngine (the search of the single process
+find_isomorphisms) and reported as a row: isomorphisms and matches found, search nodes expanded, runs of the
+cheap filters, time spent filtering and wall time (building the ordering included). The instances are the TIM
+test graphs bundled in data/TIM and synthetic worlds with a planted template (see synthetic_instance).
+
+From the command line, e.g.:
+    python -m uclasmcode.candidate_structure.benchmark_orderings --tim 0 1 2 --synthetic 5 --timeout 60
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sparse
+
+from uclasmcode import equivalence_partition, uclasm
+from .candidate_structure import CandidateStructure
+from .find_isomorphisms import SearchEngine
+from .match_subgraph_utils import Ordering
+from .logging_utils import print_warning
+import uclasmcode.candidate_structure.logging_utils as simple_utils
+
+COLUMNS = ["instance", "ordering", "isomorphisms", "matches", "search_nodes", "filter_calls", "filter_time",
+           "wall_time"]
+
+
+def build_candidate_structure(tmplt: uclasm.Graph, world: uclasm.Graph) -> CandidateStructure:
+    """ The candidate structure of tmplt in world after the cheap filters """
+    tmplt, world, candidates = uclasm.run_filters(tmplt, world, filters=uclasm.cheap_filters, verbose=False)
+    equiv_classes = equivalence_partition.partition_multichannel(tmplt.ch_to_adj)
+    return CandidateStructure(tmplt, world, candidates, equiv_classes)
+
+
+def synthetic_instance(
+        seed: int, num_world_nodes=60, num_tmplt_nodes=8, num_channels=2, density=0.08, keep_edge=0.8
+) -> (uclasm.Graph, uclasm.Graph):
+    """ A random multichannel world (each edge present with probability density, with multiplicity 1 or 2) and
+    a template planted in it: a connected set of num_tmplt_nodes world nodes grown at random from one of them,
+    keeping each of their edges with probability keep_edge. Returns (tmplt, world) """
+    rng = np.random.RandomState(seed)
+    channels = [str(ch) for ch in range(num_channels)]
+    world_adjs = []
+    for ch in channels:
+        adj = (rng.rand(num_world_nodes, num_world_nodes) < density) * rng.randint(1, 3, (num_world_nodes,) * 2)
+        np.fill_diagonal(adj, 0)
+        world_adjs.append(adj)
+    is_nbr = sum(adj + adj.T for adj in world_adjs) > 0
+    planted = [rng.randint(num_world_nodes)]
+    while len(planted) < num_tmplt_nodes:
+        frontier = sorted(set(np.flatnonzero(is_nbr[planted].any(axis=0)).tolist()) - set(planted))
+        if len(frontier) == 0:  # the component of the first node is smaller than the template
+            break
+        planted.append(frontier[rng.randint(len(frontier))])
+    tmplt_adjs = [adj[np.ix_(planted, planted)] * (rng.rand(len(planted), len(planted)) < keep_edge)
+                  for adj in world_adjs]
+    tmplt = uclasm.Graph([f"t{i}" for i in range(len(planted))], channels,
+                         [sparse.csr_matrix(adj) for adj in tmplt_adjs])
+    world = uclasm.Graph([f"w{i}" for i in range(num_world_nodes)], channels,
+                         [sparse.csr_matrix(adj) for adj in world_adjs])
+    return tmplt, world
+
+
+def tim_instances(indices=(0, 1, 2, 3)) -> [(str, CandidateStructure)]:
+    """ The instances of data/TIM that can be loaded """
+    from uclasmcode.utils import data
+    instances = []
+    for i in indices:
+        try:
+            tmplts, world = data.tim_test_graph_1(i, verbose=False)
+        except OSError as e:
+            print_warning(f"Skipping TIM instance {i}: {e}")
+            continue
+        instances.append((f"tim_{i}", build_candidate_structure(tmplts[0], world)))
+    return instances
+
+
+def synthetic_instances(seeds, **kwargs) -> [(str, CandidateStructure)]:
+    """ The synthetic_instance of each seed. kwargs are passed to synthetic_instance """
+    return [(f"synthetic_{seed}", build_candidate_structure(*synthetic_instance(seed, **kwargs))) for seed in seeds]
+
+
+def run_ordering(candstruct: CandidateStructure, ordering, timeout=None, cap_iso=None) -> dict:
+    """ Search candstruct with the given ordering (count only). Returns the statistics of the search """
+    st = time.time()
+    engine = SearchEngine(candstruct, count_only=True, cap_iso=cap_iso, ordering=ordering)
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, engine.stop)
+        timer.daemon = True
+        timer.start()
+    engine.start()
+    engine.run()
+    if timer is not None:
+        timer.cancel()
+    return {
+        "ordering": ordering, "isomorphisms": engine.solution.get_isomorphisms_count(),
+        "matches": engine.solution.get_num_matches(), "search_nodes": engine.num_nodes,
+        "filter_calls": engine.num_filter_calls, "filter_time": engine.total_filter_time,
+        "wall_time": time.time() - st, "stopped": engine.is_stopped()}
+
+
+def benchmark_orderings(
+        instances: [(str, CandidateStructure)], orderings=None, timeout=None, cap_iso=None) -> [dict]:
+    """ Run every ordering (default all of Ordering.SCORINGS) on every (name, candstruct) instance.
+    Returns one row (see run_ordering) per instance and ordering """
+    if orderings is None:
+        orderings = list(Ordering.SCORINGS)
+    verbose, debug = simple_utils.VERBOSE, simple_utils.DEBUG
+    simple_utils.VERBOSE = simple_utils.DEBUG = False
+    rows = []
+    try:
+        for name, candstruct in instances:
+            for ordering in orderings:
+                row = run_ordering(candstruct, ordering, timeout=timeout, cap_iso=cap_iso)
+                row["instance"] = name
+                rows.append(row)
+    finally:
+        simple_utils.VERBOSE, simple_utils.DEBUG = verbose, debug
+    return rows
+
+
+def format_table(rows: [dict]) -> str:
+    """ The rows of benchmark_orderings as a text table. Searches that were stopped are marked with a * """
+    def fmt(row, column):
+        value = row[column]
+        if column.endswith("time"):
+            return f"{value:.3f}" + ("*" if row["stopped"] and column == "wall_time" else "")
+        return f"{value:g}" if isinstance(value, float) else str(value)
+    cells = [COLUMNS] + [[fmt(row, column) for column in COLUMNS] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(COLUMNS))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the orderings of find_isomorphisms")
+    parser.add_argument("--tim", type=int, nargs="*", default=[0, 1, 2, 3], help="indices of the TIM instances")
+    parser.add_argument("--synthetic", type=int, default=5, help="number of synthetic instances (seeds 0, 1, ...)")
+    parser.add_argument("--world-nodes", type=int, default=60)
+    parser.add_argument("--tmplt-nodes", type=int, default=8)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--density", type=float, default=0.08)
+    parser.add_argument("--orderings", nargs="*", default=list(Ordering.SCORINGS), choices=list(Ordering.SCORINGS))
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per search")
+    parser.add_argument("--cap-iso", type=float, default=None)
+    args = parser.parse_args(argv)
+    instances = tim_instances(args.tim) + synthetic_instances(
+        range(args.synthetic), num_world_nodes=args.world_nodes, num_tmplt_nodes=args.tmplt_nodes,
+        num_channels=args.channels, density=args.density)
+    rows = benchmark_orderings(instances, args.orderings, timeout=args.timeout, cap_iso=args.cap_iso)
+    print(format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
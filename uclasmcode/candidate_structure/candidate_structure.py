@@ -14,20 +14,26 @@ by Tim Nguyen
 Last update: 7/17/19 """
 
 import numpy as np
+import scipy.sparse as sparse
 
 from uclasmcode.equivalence_partition.equivalence_data_structure import Equivalence
+from uclasmcode.equivalence_partition.array_equivalence import ArrayEquivalence
 from uclasmcode.uclasm.utils.data_structures import Graph
+from .graph_data_structure import SparseAdjacency
 from .logging_utils import print_debug
 from .supernodes import Supernode, SuperTemplateNode
+from .world_equivalence import WorldClasses
 from itertools import combinations  # for getting all subsets
 from uclasmcode.uclasm.filters.run_filters_cs import run_filters
 from uclasmcode import uclasm
 from scipy.special import comb  # to calculate number of branches
 
+# number of candidate partitions memoized by partition_candidates
+PARTITION_CACHE_SIZE = 1024
+
 
 # TODO: Make new graph datastructure without using Sparse Matrices
 # TODO: Make Subgraph Matcher class for logistics
-# TODO: Implement world equivalence (and prove before)
 
 
 class CandidateStructure(object):
@@ -48,7 +54,8 @@ class CandidateStructure(object):
 		# 	ch: np.clip(adj.A, 0, np.amax(template.ch_to_adj[ch].A)) for ch, adj in self.world_graph.ch_to_adj.items()}
 
 		self.candidates_array = candidates  # a 2D boolean array of shape (#TemplateNode, #WorldNodes) indicate candidates
-		self.equiv_classes = equiv_classes  # store the equivalent classes information to check equiv.
+		# store the equivalent classes information to check equiv. (array backed: it is queried constantly)
+		self.equiv_classes = ArrayEquivalence.from_equivalence(equiv_classes)
 
 		# self.compressed_template_graph = self.tmplt_graph.subgraph(
 		# 	list(self.equiv_classes.root_size_map))
@@ -57,14 +64,49 @@ class CandidateStructure(object):
 		self._supernodes = {}  # a dict storing root: SuperTemplateNode
 		# a dict storing the candidates (subsets) of nontrivial supernodes.
 		self._equiv_size_array = []
+		# undo log: each entry is a (rows, cols) pair of index arrays of the bits of candidates_array that were flipped.
+		# The world graph is never modified; world nodes are "removed" by clearing their candidate columns
+		self._trail = []
+		# the structural equivalence classes of the world nodes if the search should branch on them
+		# (see compress_world)
+		self.world_classes: WorldClasses = None
+		self._partition_cache = {}  # see partition_candidates
+		self._superedge_index = {}  # see superedge_index
+		self._world_adjacency = {}  # see world_adjacency
+		self._cand_counts = None  # see cand_counts
+		self._changed_rows = np.zeros(len(candidates), dtype=np.bool_)  # see pop_changed_rows
+		self._filtered_marks = []  # see get_unfiltered_rows
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state["_partition_cache"] = {}
+		state["_world_adjacency"] = {}  # rebuilt from the world graph when needed
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.__dict__.setdefault("_trail", [])  # pickled before the trail existed
+		self.__dict__.setdefault("world_classes", None)
+		self.__dict__.setdefault("_partition_cache", {})
+		self.__dict__.setdefault("_superedge_index", {})
+		self.__dict__.setdefault("_world_adjacency", {})
+		self.__dict__.setdefault("_cand_counts", None)
+		self.__dict__.setdefault("_changed_rows", np.zeros(len(self.candidates_array), dtype=np.bool_))
+		self.__dict__.setdefault("_filtered_marks", [])
+		self.equiv_classes = ArrayEquivalence.from_equivalence(self.equiv_classes)
 
 	def copy(self):
-		""" We need to copy the world_graph since tmplt is never modified """
+		""" Only the candidates_array is copied since neither the tmplt nor the world graph is ever modified.
+		The copy starts with an empty trail """
 		temp = CandidateStructure(
-			self.tmplt_graph, self.world_graph.copy(),
+			self.tmplt_graph, self.world_graph,
 			self.candidates_array.copy(), self.equiv_classes)
 		temp._supernodes = self._supernodes
 		temp.non_trivial_supernodes = self.non_trivial_supernodes
+		temp.world_classes = self.world_classes
+		temp._partition_cache = self._partition_cache
+		temp._superedge_index = self._superedge_index
+		temp._world_adjacency = self._world_adjacency
 		return temp
 
 	@property
@@ -83,6 +125,34 @@ class CandidateStructure(object):
 					self.non_trivial_supernodes.add(temp)
 		return self._supernodes
 
+	@property
+	def superedge_index(self) -> {str: ({int: tuple}, {int: tuple})}:
+		""" For each channel, the incoming and outgoing superedges of each supernode (by root) as a pair
+		(tuple of neighbour SuperTemplateNodes, array of the multiplicities of the superedges).
+		The template never changes so this is built once and shared by the copies """
+		if len(self._superedge_index) == 0:
+			roots = list(self.supernodes)
+			for ch, adj in self.tmplt_graph.ch_to_adj.items():
+				multiplicities = adj[roots, :][:, roots]
+				multiplicities = np.array(multiplicities.toarray() if sparse.issparse(multiplicities) else multiplicities)
+				np.fill_diagonal(multiplicities, 0)  # edges inside a supernode are not superedges
+				incoming, outgoing = {}, {}
+				for i, root in enumerate(roots):
+					in_idxs, out_idxs = np.flatnonzero(multiplicities[:, i]), np.flatnonzero(multiplicities[i])
+					incoming[root] = (tuple(self.supernodes[roots[j]] for j in in_idxs), multiplicities[in_idxs, i])
+					outgoing[root] = (tuple(self.supernodes[roots[j]] for j in out_idxs), multiplicities[i, out_idxs])
+				self._superedge_index[ch] = (incoming, outgoing)
+		return self._superedge_index
+
+	@property
+	def world_adjacency(self) -> {str: SparseAdjacency}:
+		""" The adjacency of the world graph in each channel as queried by the search (see SparseAdjacency).
+		The world never changes so this is built once and shared by the copies """
+		if len(self._world_adjacency) == 0:
+			for ch, adj in self.world_graph.ch_to_adj.items():
+				self._world_adjacency[ch] = SparseAdjacency(adj)
+		return self._world_adjacency
+
 	@property
 	def channels(self):
 		return self.tmplt_graph.channels
@@ -91,16 +161,26 @@ class CandidateStructure(object):
 	def num_world_nodes(self):
 		return self.world_graph.n_nodes
 
+	@property
+	def num_active_world_nodes(self):
+		""" The number of world nodes that are still a candidate for some template node """
+		return int(np.count_nonzero(self.candidates_array.any(axis=0)))
+
+	@property
+	def cand_counts(self) -> np.ndarray:
+		""" The number of candidates of each template node. Kept up to date by the changes to candidates_array
+		made through the trail (see _flip) rather than summed again. Do not modify """
+		if self._cand_counts is None:
+			self._cand_counts = np.count_nonzero(self.candidates_array, axis=1)
+		return self._cand_counts
+
 	@property
 	def equiv_size_array(self):
 		"""
 		:return: An array of shape tmplt node that contains the size of equiv classes
 		"""
 		if len(self._equiv_size_array) == 0:
-			self._equiv_size_array = np.array(
-				[self.equiv_classes.root_size_map[self.equiv_classes.compress_to_root(i)] for i in
-				 range(self.tmplt_graph.n_nodes)]
-			)
+			self._equiv_size_array = self.equiv_classes.size[self.equiv_classes.labels[:self.tmplt_graph.n_nodes]]
 		return self._equiv_size_array
 
 	# matching algorithm should have some good ordering to follow candidate-edges
@@ -108,93 +188,177 @@ class CandidateStructure(object):
 	# 	obtain neighbor list of current node -> sort and append to order  (how to get neighbors?)
 	# ========== METHODS ==========
 	def get_candidate_combination(self, sn):
-		""" Get the combinations of candidates of a supernode"""
-		candidates = self._get_cand_list(sn)
+		""" Get the combinations of candidates (idxs) of a supernode"""
+		candidates = self.get_cand_list_idxs(sn)
 		return combinations(candidates, len(sn))  # this is a generator
 
+	def compress_world(self) -> WorldClasses:
+		""" Partition the world nodes into structurally equivalent classes (given the current candidates)
+		so that the search branches on the classes rather than on every world node (see world_equivalence).
+		Done once before the search: the counts of the solution tree are expanded by the sizes of the classes """
+		self.world_classes = WorldClasses.from_graph(self.world_graph, self.candidates_array)
+		print_debug(
+			f"World compression: {len(self.world_classes)} classes for {self.num_world_nodes} world nodes")
+		return self.world_classes
+
 	def update_candidates(self, last_match: (SuperTemplateNode, Supernode)) -> bool:
 		""" Given a last match, update the candidates_array to reflect that last match
-		Modifies candidates_array and world_graph
+		Modifies candidates_array (the changes are recorded in the trail)
 		:return: bool indicating if there was any change (True if changed, False if not changed)"""
 		if last_match is None:
 			return False
 		sn, match = last_match
-		# print_debug(f"update_candidate: candidates_array before\n{str(self.candidates_array)}")
-		# make an np array of shape (len(sn), world.n_nodes) to all False
-		toset = np.zeros((len(sn), self.num_world_nodes), dtype=np.bool)
-		world_idx = self.get_vertices_from_names(match.name)
-		toset[:, world_idx] = True  # set only the matching vertices to True
-		# then set the appropriate rows and columns
-		no_change = np.all(self.candidates_array[np.ix_(sn.vertices, range(self.num_world_nodes))] == toset)
-		self.candidates_array[np.ix_(sn.vertices, range(self.num_world_nodes))] = toset
-		return not no_change
+		# every row of sn becomes the matching vertices (the rows that change are found from the trail entry,
+		# see get_unfiltered_rows)
+		toset = np.zeros(self.num_world_nodes, dtype=np.bool_)
+		toset[list(match.vertices)] = True
+		return self._set_rows(list(sn.vertices), np.broadcast_to(toset, (len(sn), self.num_world_nodes)))
 
 	def run_cheap_filters(self, verbose=False, cheap_only=True) -> int:
-		""" Not sure if we should modify the current structure directly and store the changes
-			somewhere for restore or if we should make a new structure entirely """
+		""" Runs the cs filters and records whatever they eliminate in the trail so the changes
+		can be undone with restore_changes. The filters always see the same (full) world graph
+		so whatever they precompute for it (e.g. the topology bitsets) is reused across levels.
+		The filters only propagate from the template nodes given by get_unfiltered_rows (all of them the first
+		time) and are not run at all if there are none.
+		Returns the (non-positive) change in the number of active world nodes """
 		# TODO: Modify filters to only run on root node of supernodes (minor speed up??)
 		# TODO: Modify topology filter to take into account of edge multiplicity in supernodes
 		# TODO: Neighborhood filter for cliques (union)
-		# TODO: topology filter still slow
-		before = self.world_graph.n_nodes
-		_, self.world_graph, self.candidates_array = run_filters(
+		changed_cands = self.get_unfiltered_rows()
+		if changed_cands is not None and not changed_cands.any():
+			return 0
+		before = self.num_active_world_nodes
+		_, _, filtered = run_filters(
 			self.tmplt_graph, self.world_graph,
-			candidates=self.candidates_array, filters=uclasm.cs_filters,
-			verbose=verbose)
-		return self.world_graph.n_nodes - before
+			candidates=self.candidates_array.copy(), filters=uclasm.cs_filters,
+			verbose=verbose, init_changed_cands=changed_cands, reduce_world=False)
+		self._set_rows(slice(None), filtered)
+		self._filtered_marks.append(len(self._trail))
+		return self.num_active_world_nodes - before
+
+	def get_unfiltered_rows(self):
+		""" The template nodes (as a bool array) whose candidates changed since the last run of the cheap filters
+		that has not been undone, or None if there is none. The candidates of every other template node are still
+		consistent with those of its neighbors, so the filters only need to propagate from these """
+		if len(self._filtered_marks) == 0:
+			return None
+		changed = np.zeros(len(self.candidates_array), dtype=np.bool_)
+		for rows, cols in self._trail[self._filtered_marks[-1]:]:
+			changed[rows] = True
+		return changed
+
+	def is_filtered(self) -> bool:
+		""" Whether the cheap filters would leave candidates_array as it is (see get_unfiltered_rows) """
+		changed = self.get_unfiltered_rows()
+		return changed is not None and not changed.any()
+
+	def mark_changes(self) -> int:
+		""" Returns a marker of the current position in the trail. Pass it to restore_changes
+		to undo every change to candidates_array made after this call """
+		return len(self._trail)
+
+	def restore_changes(self, mark: int = 0) -> None:
+		""" Undo (in reverse order) every change recorded in the trail since mark was taken """
+		while len(self._trail) > mark:
+			self._flip(self._trail.pop())
+		while len(self._filtered_marks) > 0 and self._filtered_marks[-1] > mark:
+			self._filtered_marks.pop()
+
+	def get_changes(self, mark: int = None) -> (np.ndarray, np.ndarray):
+		""" Returns the (rows, cols) of every candidate flipped by the trail up to mark (the whole trail if None).
+		Candidates are only ever removed along the trail so these are distinct and describe compactly how
+		candidates_array at mark differs from when the trail was empty """
+		entries = self._trail[:mark]
+		if len(entries) == 0:
+			return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+		return tuple(np.concatenate([entry[i] for entry in entries]).astype(np.int32) for i in range(2))
+
+	def apply_changes(self, changes: (np.ndarray, np.ndarray)) -> None:
+		""" Replay changes from get_changes of a copy of this cs (taken when both trails were empty).
+		Recorded in the trail like any other change """
+		if len(changes[0]) == 0:
+			return
+		self._flip(changes)
+		self._trail.append(changes)
+
+	def _set_rows(self, rows, new_rows: np.ndarray) -> bool:
+		""" Set candidates_array[rows] to new_rows and push the flipped bits onto the trail.
+		Memory used is proportional to the number of changed bits.
+		:return: bool indicating if anything changed """
+		row_idxs = np.arange(self.candidates_array.shape[0])[rows]
+		changed_rows, changed_cols = np.nonzero(self.candidates_array[rows] != new_rows)
+		if len(changed_rows) == 0:
+			return False
+		flipped = (row_idxs[changed_rows], changed_cols)
+		self._flip(flipped)
+		self._trail.append(flipped)
+		return True
 
-	def restore_changes(self):
-		""" Not sure what this does yet but we might need to restore some changes say by the filters """
-		pass
+	def _flip(self, flipped: (np.ndarray, np.ndarray)) -> None:
+		""" Flip the bits of candidates_array at the (rows, cols) of flipped and update the counts of their rows """
+		self.candidates_array[flipped] ^= True
+		rows = flipped[0]
+		if self._cand_counts is not None:
+			deltas = np.where(self.candidates_array[flipped], 1, -1)
+			self._cand_counts += np.bincount(rows, weights=deltas, minlength=len(self._cand_counts)).astype(np.int64)
+		self._changed_rows[rows] = True
+
+	def pop_changed_rows(self) -> np.ndarray:
+		""" The template nodes whose candidates changed since the last call (see match_subgraph_utils.Ordering) """
+		rows = np.flatnonzero(self._changed_rows)
+		self._changed_rows[rows] = False
+		return rows
 
 	# ========== QUERIES ==========
 	def get_incoming_neighbors(self, sn: SuperTemplateNode, channel: str) -> {SuperTemplateNode}:
 		""" Given a supernode and a channel,
 		returns a set of incoming supernode neighbors in that channel"""
-		assert sn in self.supernodes.values()
-		result = set()  # a set so we don't add duplicate nodes
-		root = sn.get_root()
-		adj = self.tmplt_graph.ch_to_adj[channel]
-		for pin in np.argwhere(adj[:, root]):
-			if not self.in_same_equiv_class(pin[0], root):
-				result.add(self.get_supernode_by_idx(pin[0]))
-		return result
+		return set(self.get_incoming_superedges(sn, channel)[0])
 
 	def get_outgoing_neighbors(self, sn: SuperTemplateNode, channel: str) -> {SuperTemplateNode}:
 		""" Given a supernode,
 		returns a set of outgoing supernode neighbors in that channel"""
-		assert sn in self.supernodes.values()
+		return set(self.get_outgoing_superedges(sn, channel)[0])
+
+	def get_incoming_superedges(self, sn: SuperTemplateNode, channel: str) -> ((SuperTemplateNode,), np.ndarray):
+		""" The incoming supernode neighbors of sn in channel and the multiplicities of their superedges """
+		return self.superedge_index[channel][0][sn.get_root()]
+
+	def get_outgoing_superedges(self, sn: SuperTemplateNode, channel: str) -> ((SuperTemplateNode,), np.ndarray):
+		""" The outgoing supernode neighbors of sn in channel and the multiplicities of their superedges """
+		return self.superedge_index[channel][1][sn.get_root()]
+
+	def get_neighbors(self, sn: SuperTemplateNode) -> {SuperTemplateNode}:
+		""" The supernode neighbors of sn in any channel and direction """
 		result = set()
-		root = sn.get_root()
-		adj = self.tmplt_graph.ch_to_adj[channel]
-		for pin in np.argwhere(adj[root]):
-			if not self.in_same_equiv_class(pin[1], root):
-				result.add(self.get_supernode_by_idx(pin[1]))
+		for ch in self.channels:
+			result.update(self.get_incoming_superedges(sn, ch)[0])
+			result.update(self.get_outgoing_superedges(sn, ch)[0])
 		return result
 
 	def has_cand_edge(
 			self, m1: (SuperTemplateNode, Supernode), m2: (SuperTemplateNode, Supernode),
-			channel: str) -> bool:
+			channel: str, multiplicity_of_super_edge: int = None) -> bool:
 		""" Given two matches, check if the matching cand_nodes have candidate edge
 		Return a bool specifying if there is a candidate edge from t1 to t2
+		multiplicity_of_super_edge: that of the superedge from t1 to t2 if already known (see superedge_index)
 		"""
 		t1: SuperTemplateNode = m1[0]
 		c1: Supernode = m1[1]
 		t2: SuperTemplateNode = m2[0]
 		c2: Supernode = m2[1]
-		if len(set(c1.name) & set(c2.name)) > 0:  # cannot have intersecting nodes!
-			# print_debug(f"CandidateStructure.has_cand_edge: False because {str(c1.name)} and {str(c2.name)} has intersecting nodes: "
-			#             f"{set(c1.name) & set(c2.name)}")
+		if not set(c1.vertices).isdisjoint(c2.vertices):  # cannot have intersecting nodes!
+			# print_debug(f"CandidateStructure.has_cand_edge: False because {str(c1)} and {str(c2)} has intersecting nodes: "
+			#             f"{set(c1.vertices) & set(c2.vertices)}")
 			return False
-		multiplicity_of_super_edge = self.get_superedge_multiplicity(t1, t2, channel)
+		if multiplicity_of_super_edge is None:
+			multiplicity_of_super_edge = self.get_superedge_multiplicity(t1, t2, channel)
 		if multiplicity_of_super_edge == 0:
 			# print_debug(f"has_cand_edge: False because no superedge between {str(t1)} and {str(t2)}.")
 			return False
 		# check all edges in the world graph
-		world_matrix = self.world_graph.ch_to_adj[channel].A
-		vertices_of_c1 = self.get_vertices_from_names(c1.name)
-		vertices_of_c2 = self.get_vertices_from_names(c2.name)
-		connection_mat = world_matrix[np.ix_(vertices_of_c1, vertices_of_c2)]
+		connection_mat = self.world_graph.multiplicity(
+			channel, np.array(c1.vertices).reshape(-1, 1), np.array(c2.vertices).reshape(1, -1))
 		if not np.all((connection_mat >= multiplicity_of_super_edge)):
 			# each connection from c1 to c2 must be greater than or equals to the multiplicity super edge
 			return False
@@ -203,18 +367,10 @@ class CandidateStructure(object):
 	def get_candidates(self, sn: SuperTemplateNode) -> [Supernode]:
 		""" Returns an iterator of candidates of a given supernode
 		Iterates through subsets of nodes for supernodes rather than permutations
-		Yields singleton for trivial supernodes """
+		Yields singleton for trivial supernodes. The candidate nodes have no name (see Supernode) """
 		# IMPORTANT: must use yield for iterator.... can be complicated wrt storage
-		# TODO: Equivalent classes in world nodes
-		if sn.is_trivial():
-			for n in self._get_cand_list(sn):  # n is a string
-				n = [n]
-				idxs = self.get_vertices_from_names(n)
-				yield Supernode(idxs, name=n)
-		else:  # n is not trivial
-			for n in self.get_candidate_combination(sn):  # n is a tuple
-				idxs = self.get_vertices_from_names(n)
-				yield Supernode(idxs, name=list(n))
+		# the candidates are read now so the iterator does not see later changes to candidates_array
+		return (Supernode(idxs) for idxs in self.get_candidate_combination(sn))
 
 	def supernode_clique_and_cand_node_clique(self, supernode: SuperTemplateNode, cand_node: Supernode) -> bool:
 		""" Returns a bool specifying if the given cand_node satisfy the clique condition of supernode:
@@ -225,11 +381,10 @@ class CandidateStructure(object):
 			return True
 		for ch in self.tmplt_graph.channels:
 			if supernode.is_clique(ch):  # only check for clique channels
-				supernode_submatrix = self._get_submatrix(
-					self.tmplt_graph.ch_to_adj[ch].A, supernode.get_vertices())
-				candidate_node_submatrix = self._get_submatrix(
-					self.world_graph.ch_to_adj[ch].A,
-					self.get_vertices_from_names(cand_node.name))
+				supernode_submatrix = self._get_tmplt_submatrix(ch, supernode.get_vertices())
+				cand_vertices = np.array(cand_node.vertices)
+				candidate_node_submatrix = self.world_graph.multiplicity(
+					ch, cand_vertices.reshape(-1, 1), cand_vertices.reshape(1, -1))
 				if not np.all(candidate_node_submatrix >= supernode_submatrix):
 					# if our world graph does not contain a similar clique in that channel
 					return False
@@ -292,24 +447,73 @@ class CandidateStructure(object):
 		""" Returns if x1 ~ x2 according to candidate equivalence
 		x1 and x2 are idxs of candidates of sn"""
 		for ch in self.channels:  # for each channel, get the world graph
-			world_graph = self.world_graph.ch_to_adj[ch].A
-			for v in self.get_incoming_neighbors(u, ch):
-				mvu = self.get_superedge_multiplicity(v, u, ch)  # multiplicity of ([v],[u]) in channel ch
+			for v, mvu in zip(*self.get_incoming_superedges(u, ch)):  # mvu: multiplicity of ([v],[u]) in channel ch
 				# compute the boolean matrix of cand_edge between x_n and cand of v
-				# print_debug((self.get_cand_list_idxs(v), x1))
-				x1nbr = world_graph[np.ix_(self.get_cand_list_idxs(v), [x1])] >= mvu
-				x2nbr = world_graph[np.ix_(self.get_cand_list_idxs(v), [x2])] >= mvu
+				x1nbr = self._get_world_submatrix(ch, self.get_cand_list_idxs(v), [x1]) >= mvu
+				x2nbr = self._get_world_submatrix(ch, self.get_cand_list_idxs(v), [x2]) >= mvu
 				if not np.all(x1nbr == x2nbr):  # this makes sure same incoming neighbors
 					return False
-			for v in self.get_outgoing_neighbors(u, ch):
-				muv = self.get_superedge_multiplicity(u, v, ch)  # multiplicity of ([u],[v]) in channel ch
+			for v, muv in zip(*self.get_outgoing_superedges(u, ch)):  # muv: multiplicity of ([u],[v]) in channel ch
 				# compute the boolean matrix of cand_edge between x_n and cand of v
-				x1nbr = world_graph[np.ix_([x1], self.get_cand_list_idxs(v))] >= muv
-				x2nbr = world_graph[np.ix_([x2], self.get_cand_list_idxs(v))] >= muv
+				x1nbr = self._get_world_submatrix(ch, [x1], self.get_cand_list_idxs(v)) >= muv
+				x2nbr = self._get_world_submatrix(ch, [x2], self.get_cand_list_idxs(v)) >= muv
 				if not np.all(x1nbr == x2nbr):  # this makes sure same outgoing neighbors
 					return False
 		return True
 
+	def partition_candidates(self, cand_idxs: [int], u: SuperTemplateNode) -> [{int}]:
+		""" Partition cand_idxs (candidates of u) by candidate_equivalence, in the order of their first candidate.
+		Two candidates are equivalent iff their columns of the boolean matrix stacking their connections to the
+		candidates of each neighbour of u (see _get_connectivity) are the same, so the columns are grouped by
+		hashing them. The partition only depends on cand_idxs and the candidates of the neighbours of u: it is
+		memoized on them, since sibling branches of the search often share them """
+		cand_idxs = np.asarray(cand_idxs, dtype=np.int64)
+		if len(cand_idxs) == 0:
+			return []
+		superedges = self._get_superedges(u)
+		nbr_roots = sorted({v.get_root() for _, v, _, _ in superedges})
+		key = (
+			u.get_root(), cand_idxs.tobytes(),
+			np.packbits(self.candidates_array[nbr_roots], axis=1).tobytes())
+		classes = self._partition_cache.get(key)
+		if classes is None:
+			connectivity = self._get_connectivity(cand_idxs, superedges).tocsc()
+			connectivity.sort_indices()
+			indptr, indices = connectivity.indptr, connectivity.indices
+			class_of_column = {}  # the connected candidates (as bytes): the class
+			for j, x in enumerate(cand_idxs.tolist()):
+				class_of_column.setdefault(indices[indptr[j]:indptr[j + 1]].tobytes(), []).append(x)
+			classes = list(class_of_column.values())
+			if len(self._partition_cache) >= PARTITION_CACHE_SIZE:
+				del self._partition_cache[next(iter(self._partition_cache))]  # the oldest
+			self._partition_cache[key] = classes
+		return [set(c) for c in classes]
+
+	def _get_superedges(self, u: SuperTemplateNode) -> [(str, SuperTemplateNode, bool, int)]:
+		""" (channel, neighbour, whether the superedge goes into u, multiplicity) for every superedge of u """
+		superedges = []
+		for ch in self.channels:
+			superedges.extend((ch, v, True, m) for v, m in zip(*self.get_incoming_superedges(u, ch)))
+			superedges.extend((ch, v, False, m) for v, m in zip(*self.get_outgoing_superedges(u, ch)))
+		return superedges
+
+	def _get_connectivity(self, cand_idxs: np.ndarray, superedges) -> sparse.csr_matrix:
+		""" Boolean sparse matrix with a column per candidate in cand_idxs and, for each superedge, a row per
+		candidate of the neighbour: whether the world has (at least the multiplicity of) that superedge between
+		the two candidates """
+		blocks = []
+		for ch, v, is_incoming, multiplicity in superedges:
+			adj = self.world_adjacency[ch]
+			nbr_idxs = self.get_cand_list_idxs(v)
+			if is_incoming:
+				submatrix = adj.submatrix(nbr_idxs, cand_idxs)
+			else:
+				submatrix = adj.submatrix(cand_idxs, nbr_idxs).T
+			blocks.append(sparse.csr_matrix(submatrix >= multiplicity))
+		if len(blocks) == 0:
+			return sparse.csr_matrix((0, len(cand_idxs)), dtype=np.bool_)
+		return sparse.vstack(blocks, format="csr")
+
 	def get_candidates_of_unmatched_supernodes(
 			self, matched_supernodes: {SuperTemplateNode}, curr_node: SuperTemplateNode) -> {int}:
 		""" Returns a bool indicating whether equiv_cand has any overlapping"""
@@ -325,6 +529,16 @@ class CandidateStructure(object):
 		to the given coordinates (idx)"""
 		return matrix[np.ix_(idx, idx)]
 
+	def _get_world_submatrix(self, channel: str, rows: [int], cols: [int]) -> np.ndarray:
+		""" Returns world_adj[rows, cols] of a channel as a dense array.
+		Extracted from the sparse world (see world_adjacency) so we never materialize the whole world matrix """
+		return self.world_adjacency[channel].dense_submatrix(rows, cols)
+
+	def _get_tmplt_submatrix(self, channel: str, idx: [int]) -> np.ndarray:
+		""" Returns tmplt_adj[idx, idx] of a channel as a dense array """
+		submatrix = self.tmplt_graph.ch_to_adj[channel][idx, :][:, idx]
+		return submatrix.toarray() if sparse.issparse(submatrix) else np.asarray(submatrix)
+
 	def get_supernode_by_idx(self, idx: int) -> SuperTemplateNode:
 		""" Given the index of a node, return the supernode"""
 		return self.supernodes[self.equiv_classes.compress_to_root(idx)]
@@ -338,7 +552,12 @@ class CandidateStructure(object):
 		return str(self.equiv_classes)  # for now
 
 	def get_cand_node_from_idxs(self, idxs: [int]) -> Supernode:
-		return Supernode(idxs, self.get_names_from_vertices(idxs))
+		""" The (unnamed) candidate node of the given world idxs """
+		return Supernode(idxs)
+
+	def get_cand_node_names(self, cand_node: Supernode) -> [str]:
+		""" The names of the world nodes of a candidate node """
+		return self.get_names_from_vertices(list(cand_node.vertices))
 
 	# === NUMBER QUERIES ====
 	def get_superedge_multiplicity(self, t1: SuperTemplateNode, t2: SuperTemplateNode, channel: str) -> int:
@@ -0,0 +1,50 @@
+""" Checkpoints of a running search so that it can be resumed (see resume_find_isomorphisms).
+
+A checkpoint at <path> is made of two pickles:
+    - <path>.cs: the candidate structure the search started from. Written once
+    - <path>: the options of the search, the state of its frontier (SearchEngine.get_state) and the solution
+        tree found so far. Rewritten at every checkpoint
+
+Files are written to a temporary file first and then moved in place, so a run killed while checkpointing
+still leaves the previous checkpoint intact.
+"""
+
+import os
+import pickle
+
+from .candidate_structure import CandidateStructure
+from .solution_tree import SolutionTree
+
+CHECKPOINT_VERSION = 1
+
+
+def get_cs_path(path: str) -> str:
+    return path + ".cs"
+
+
+def save_candidate_structure(path: str, candstruct: CandidateStructure) -> None:
+    _dump(candstruct, get_cs_path(path))
+
+
+def save_checkpoint(path: str, engine, options: dict) -> None:
+    """ Save the frontier and the solutions of engine (a SearchEngine) with the options it was run with """
+    _dump({
+        "version": CHECKPOINT_VERSION, "options": options,
+        "state": engine.get_state(), "solution": engine.solution}, path)
+
+
+def load_checkpoint(path: str) -> (CandidateStructure, dict, dict, SolutionTree):
+    """ Returns the candidate structure, options, search state and solution tree saved at path """
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+    assert checkpoint["version"] == CHECKPOINT_VERSION, f"Unsupported checkpoint version {checkpoint['version']}"
+    with open(get_cs_path(path), "rb") as f:
+        candstruct = pickle.load(f)
+    return candstruct, checkpoint["options"], checkpoint["state"], checkpoint["solution"]
+
+
+def _dump(obj, path: str) -> None:
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
@@ -25,125 +25,310 @@ Recursion step:
         - if it's joinable: recurse with the new partial match
         - if not then continue going through the candidates. 
 
+
+The recursion is run by SearchEngine with an explicit stack of frames (see SearchFrame) rather than by the python
+call stack, so the state of the search can be inspected, split between processes or saved at any point.
 """
 
 from .candidate_structure import CandidateStructure
 from .partial_match import PartialMatch
 from .solution_tree import SolutionTree
-from .match_subgraph_utils import Ordering, is_joinable
+from .supernodes import Supernode, SuperTemplateNode
+from .match_subgraph_utils import Ordering, get_joinable_mask
 from .logging_utils import print_info, print_debug, print_warning
-from ..equivalence_partition.equivalence_data_structure import Equivalence
+from .checkpoint import save_candidate_structure, save_checkpoint, load_checkpoint
+from .solution_store import SolutionStoreWriter
 import uclasmcode.candidate_structure.logging_utils as simple_utils
+from itertools import islice
 import time
 import threading
 
 NUM_THREADS = 1
-STOP_FLAG = False  # a flag to stop matching
-VERBOSE_FLAG = False
-filter_verbose_flag = False
-BRAKE = None
-
-total_filter_time = 0
-LEVEL = 1
-match_count = 0
-
-
-def match_subgraph(
-        cs: CandidateStructure, pm: PartialMatch,
-        solution: SolutionTree, ordering: Ordering) -> None:
-    """ pm: dictionary of supernode and matched nodes for partial matches
-        Require a solution tree to be initialized as a global variable with name solution"""
-    global total_filter_time, LEVEL, STOP_FLAG, match_count
-    if STOP_FLAG:  # something wants us to stop
-        return
-
-    # BASE CASE: if pm has enough matched nodes
-    if len(pm) == cs.get_supernodes_count():
-        # this means we have a matching
-        match_count += 1
+CHECKPOINT_INTERVAL = 600  # seconds between two checkpoints of the search
+JOINABLE_CHUNK_SIZE = 1024  # number of candidates tested for joinability at once
+ORDERING_SCORING = "cand_count"  # how the next supernode to match is picked (see Ordering.SCORINGS)
+
+
+class SearchFrame(object):
+    """ One level of the search tree: the supernode matched at this level, an iterator over its
+    joinable (cand, branch) pairs that have not been explored yet, the trail mark of the candidates at this level
+    and how many pairs have been taken from the iterator so far """
+    __slots__ = ["supernode", "branches", "mark", "position"]
+
+    def __init__(self, supernode: SuperTemplateNode, branches, mark: int):
+        self.supernode = supernode
+        self.branches = branches
+        self.mark = mark
+        self.position = 0
+
+
+class SearchEngine(object):
+    """ Depth first search of the search tree with an explicit stack of SearchFrames.
+    stack[i] is the frame for the supernode matched after the first base + i matches of pm: the frames below
+    the top one have already handed out the branch pm is currently exploring.
+    Everything the search needs is kept on the engine, so several engines can run in the same process """
+
+    def __init__(
+            self, candstruct: CandidateStructure, count_only=False, filter_verbose=False, cap_iso=None,
+            solution: SolutionTree = None, stop_event=None, shared_iso_count=None, ordering=ORDERING_SCORING):
+        """ - ordering: how the next supernode to match is picked, one of Ordering.SCORINGS
+            - solution: the tree the solutions are added to. Default is an empty one with the world node names
+            - stop_event: a (multiprocessing) event shared by several engines: each stops as soon as it is set
+            - shared_iso_count: a shared value with the total isomorphisms found by all the engines sharing
+                stop_event. cap_iso is checked against it if given
+        """
+        self.cs = candstruct.copy()
+        # the ordering follows the candidates of the search (its initial_ordering is that of candstruct)
+        self.ordering = Ordering(self.cs, ordering)
+        if solution is None:
+            solution = SolutionTree(
+                self.ordering.initial_ordering, candstruct.world_graph.nodes, count_only=count_only,
+                world_classes=candstruct.world_classes)
+        self.solution = solution
+        self.filter_verbose = filter_verbose
+        self.cap_iso = cap_iso
+        self.stop_event = stop_event
+        self.shared_iso_count = shared_iso_count
+        self.stop_flag = False
+        self.total_filter_time = 0
+        self.num_nodes = 0  # search nodes expanded
+        self.num_filter_calls = 0  # runs of the cheap filters
+        self.last_solution = None  # the complete match found by the last step, if any
+        self.pm = PartialMatch(self.cs.num_world_nodes)
+        self.stack: [SearchFrame] = []
+        self.base = 0  # number of matches of pm below the first frame
+
+    @property
+    def level(self) -> int:
+        return len(self.pm) + 1
+
+    # ========== CONTROL ==========
+    def is_stopped(self) -> bool:
+        """ Whether the search (or a search sharing stop_event) has been asked to stop """
+        return self.stop_flag or (self.stop_event is not None and self.stop_event.is_set())
+
+    def stop(self) -> None:
+        self.stop_flag = True
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def reset(self) -> None:
+        """ Forget the current search (but not the solutions found) """
+        self.cs.restore_changes(0)
+        self.pm = PartialMatch(self.cs.num_world_nodes)
+        self.stack = []
+        self.base = 0
+        self.last_solution = None
+
+    def start(self, prefix: tuple = ()) -> None:
+        """ Start the search of the subtree below prefix, a tuple of (template root, world vertices) matches
+        (see get_prefix). The levels above it are replayed as the search would have run them """
+        self.reset()
+        for sn_root, cand_idxs in prefix:
+            self.prepare_level()
+            self.pm.add_match(self.cs.get_supernode_by_idx(sn_root), self.cs.get_cand_node_from_idxs(cand_idxs))
+        self.base = len(self.pm)
+        self.expand()
+
+    def run(self) -> SolutionTree:
+        """ Search until the stack is empty or the search is stopped """
+        while self.step():
+            pass
+        return self.solution
+
+    def step(self) -> bool:
+        """ Explore the next branch of the top frame (or pop it if it has none left).
+        Returns whether there is anything left to explore """
+        self.last_solution = None
+        if self.is_stopped():
+            return False
+        if len(self.stack) == 0:
+            return False
+        frame = self.stack[-1]
+        self.cs.restore_changes(frame.mark)  # undo whatever the previous branch did to the candidates
+        cand, branch = next(frame.branches, (None, None))
+        frame.position += 1
+        if cand is None:  # no branches left: go back to the previous level
+            self.stack.pop()
+            if len(self.stack) > 0:
+                self.pm.rm_last_match()
+            print_debug(f"Finished level. RETURNING to level {self.level}.")
+            return len(self.stack) > 0
+        # cand is joinable: we add it to the partial match and explore until we have a full match
+        self.pm.add_match(supernode=frame.supernode, candidate_node=branch)
+        self.expand()
+        return True
+
+    def expand(self) -> None:
+        """ Push a frame for the current partial match. If it is complete it is added to the solutions instead,
+        and if it cannot be completed its last match is undone """
+        self.num_nodes += 1
+        if len(self.pm) == self.cs.get_supernodes_count():
+            # this means we have a matching
+            self.add_solution()
+        elif self.prepare_level():
+            next_supernode, branches = self.candidate_branches()
+            self.stack.append(SearchFrame(next_supernode, branches, self.cs.mark_changes()))
+            return
+        else:
+            print_debug(f"NOT SATISFIABLE. RETURNING to level {self.level - 1}")
+        if len(self.pm) > self.base:
+            self.pm.rm_last_match()
+
+    # ========== SPLITTING ==========
+    def get_prefix(self, depth: int = None) -> tuple:
+        """ The matches of pm below frame depth (all of them if None) as (template root, world vertices) """
+        node_stack = self.pm.node_stack if depth is None else self.pm.node_stack[:self.base + depth]
+        return tuple((sn.get_root(), self.pm.matches[sn].vertices) for sn in node_stack)
+
+    def get_state(self) -> dict:
+        """ What restore_state needs to put a new engine (on the same candidate structure) where this one is.
+        Small: the partial match and the position of each frame's iterator """
+        return {
+            "prefix": self.get_prefix(), "base": self.base, "positions": [frame.position for frame in self.stack],
+            "num_nodes": self.num_nodes, "num_filter_calls": self.num_filter_calls,
+            "total_filter_time": self.total_filter_time}
+
+    def restore_state(self, state: dict) -> None:
+        """ Rebuild the stack saved by get_state. The search is deterministic so the frames are rebuilt by
+        replaying it along the saved partial match and skipping what each frame had already handed out """
+        positions = state["positions"]
+        self.reset()
+        if len(positions) > 0:
+            self.start(state["prefix"][:state["base"]])
+            for depth, position in enumerate(positions):
+                frame = self.stack[depth]
+                is_top = depth == len(positions) - 1
+                # frames below the top one are in the middle of their last branch: take it again
+                for i in range(position if is_top else position - 1):
+                    next(frame.branches, None)
+                frame.position = position
+                if not is_top:
+                    cand, branch = next(frame.branches)
+                    self.pm.add_match(frame.supernode, branch)
+                    self.expand()
+            assert self.get_prefix() == tuple(state["prefix"]), "The checkpoint does not match the search"
+        self.num_nodes = state["num_nodes"]
+        self.num_filter_calls = state.get("num_filter_calls", 0)
+        self.total_filter_time = state["total_filter_time"]
+
+    # ========== ONE LEVEL OF THE SEARCH ==========
+    def add_solution(self) -> None:
+        """ Add the complete match pm to the solution and stop the search if that reaches the cap """
+        solution = self.solution
         if solution.get_isomorphisms_count() == 0:
-            solution.set_ordering(pm.node_stack.copy())
-        solution.add_solution(pm)
+            solution.set_ordering(self.pm.node_stack.copy())
+        prev_count = solution.get_isomorphisms_count()
+        solution.add_solution(self.pm)
+        self.last_solution = self.pm.get_matches().copy()
         print_info(f"FOUND a match. Current iso count: {str(solution.get_isomorphisms_count())} ")
-        LEVEL -= 1
-        if BRAKE is not None and solution.get_isomorphisms_count() > BRAKE:
-            STOP_FLAG = True
-        return  # here we should return to the previous state to try other candidates
-
-    # We haven't finished the match. We must find another one to add onto the match until we have enough
-    if cs.update_candidates(pm.get_last_match()):  # this modifies candidates_array
-        st1 = time.time()
-        print_debug(f"Beginning to run filters at level {LEVEL}")
-        # only run the filters if there was any change
-        num_removed = cs.run_cheap_filters(filter_verbose_flag)  # this modifies world_graph and candidates_array
-        total_filter_time += time.time() - st1
-        print_debug(f"Ran filter during tree search: took {time.time() - st1}s;")
-        if num_removed != 0:
-            print_debug(f"Level {LEVEL}: removed {num_removed} world nodes")
-
-    # see if this is satisfiable
-    if not cs.check_satisfiability():
-        # if it's unsatisfiable and we are only at the first level then we can remove it as candidate
-        LEVEL -= 1
-        print_debug(f"NOT SATISFIABLE. RETURNING to level {LEVEL}")
-        return
-
-    # Now we pick a good next supernode to consider candidates from
-    next_supernode = ordering.get_next_cand(pm)
-    cand_count = cs.get_candidates_count(next_supernode)
-    print_info(f"Level={LEVEL}. World-size={cs.world_graph.n_nodes}. Next supernode is {next_supernode.name} with"
-               f" {cand_count} candidates")
-    # TODO: Can parallelize this for loop (mutex solution and need to duplicate pm/cs/ordering/iterator/etc.)
-    # TODO: This might be taking up a lot of memory for huge tree and because of combinations
-    cand_below = cs.get_candidates_of_unmatched_supernodes(pm.matches, next_supernode)
-    cand_vertices = cs.get_cand_list_idxs(next_supernode)
-    # ========= WORLD NODE EQUIV: get the world nodes that participate in the next supernode and partition them ======
-    if len(cand_below & set(cand_vertices)) == 0:  # if we have no intersection
-        cand_equiv = Equivalence(cand_vertices)
-        cand_equiv.partition(cs.candidate_equivalence, next_supernode)  # partition candidate equiv.
-        print_info(f"Level {LEVEL}: " + repr(cand_equiv))
-        for cand_class in cand_equiv.classes():
-            if len(cand_class & cand_below) != 0:
-                # TODO: HANDLE THIS CASE!!!!
-                print_warning(f"(level {LEVEL}) -- INTERSECTION BELOW FOR {cand_class & cand_below}. SHOULD NOT HAPPEN")
-            # at the leaf node we only need to check one
-            tempiter = iter(cand_class)
-            representative = [next(tempiter) for i in range(len(next_supernode))]
-            cand = cs.get_cand_node_from_idxs(representative)
-            if is_joinable(pm, cs, supernode=next_supernode, candidate_node=cand):
-                big_cand = cs.get_cand_node_from_idxs(cand_class)
-                pm.add_match(next_supernode, big_cand)
-                LEVEL += 1
-                match_subgraph(cs.copy(), pm, solution, ordering)
-                pm.rm_last_match()
-    # ===============================================================================================================
-    else:  # if there is an intersection, we just perform normal tree search for now
-        for cand in cs.get_candidates(next_supernode):  # get the candidates of our chosen supernode
-            if STOP_FLAG:
-                LEVEL -= 1
-                return
-            print_debug(f"Level={LEVEL}({cand_count}): Looping with pair {(str(next_supernode), str(cand))};", end="")
+        total_count = solution.get_isomorphisms_count()
+        if self.shared_iso_count is not None:  # the cap is on the total over all the engines
+            with self.shared_iso_count.get_lock():
+                self.shared_iso_count.value += total_count - prev_count
+                total_count = self.shared_iso_count.value
+        if self.cap_iso is not None and total_count > self.cap_iso:
+            self.stop()
+
+    def prepare_level(self) -> bool:
+        """ Propagate the last match of pm to the candidates (recorded in the trail) and run the cheap filters
+        if anything changed since they last ran (the first time at the root). Returns whether the resulting candidates are still satisfiable """
+        cs = self.cs
+        # only run the filters if there was any change since they last ran (they propagate from the changed rows)
+        if cs.update_candidates(self.pm.get_last_match()) or not cs.is_filtered():  # modifies candidates_array
+            st1 = time.time()
+            print_debug(f"Beginning to run filters at level {self.level}")
+            num_removed = cs.run_cheap_filters(self.filter_verbose)  # this modifies candidates_array
+            self.total_filter_time += time.time() - st1
+            self.num_filter_calls += 1
+            print_debug(f"Ran filter during tree search: took {time.time() - st1}s;")
+            if num_removed != 0:
+                print_debug(f"Level {self.level}: removed {num_removed} world nodes")
+
+        # see if this is satisfiable
+        return cs.check_satisfiability()
+
+    def candidate_branches(self):
+        """ Picks the next supernode to match and returns it with an iterator of pairs (cand, branch) where cand is
+        joinable to pm (as it is now) and branch is what to add to pm for next_supernode. branch is cand itself,
+        or the whole class of cand when the candidates of next_supernode are partitioned into equivalent classes.
+        With cs.world_classes, the world nodes already in pm are left out and, when the candidates are not
+        partitioned, only the canonical candidates are tried (see world_equivalence).
+        Everything is read from cs now so the iterator does not depend on later changes to cs """
+        cs, pm = self.cs, self.pm
+        # Now we pick a good next supernode to consider candidates from
+        next_supernode = self.ordering.get_next_cand(pm)
+        cand_count = cs.get_candidates_count(next_supernode)
+        print_info(f"Level={self.level}. World-size={cs.num_active_world_nodes}. "
+                   f"Next supernode is {next_supernode.name} with {cand_count} candidates")
+        world_classes = cs.world_classes
+        # TODO: This might be taking up a lot of memory for huge tree and because of combinations
+        cand_below = cs.get_candidates_of_unmatched_supernodes(pm.matches, next_supernode)
+        cand_vertices = cs.get_cand_list_idxs(next_supernode)
+        if world_classes is not None:
+            used = pm.get_matched_world_nodes(cs.num_world_nodes)
+            cand_vertices = [v for v in cand_vertices if not used[v]]
+        # ========= WORLD NODE EQUIV: get the world nodes that participate in the next supernode and partition ======
+        if len(cand_below & set(cand_vertices)) == 0:  # if we have no intersection
+            if world_classes is not None:  # only one node of each world class needs to be compared
+                cand_classes = world_classes.partition_candidates(
+                    cand_vertices, cs.partition_candidates, next_supernode)
+            else:
+                cand_classes = cs.partition_candidates(cand_vertices, next_supernode)  # partition candidate equiv.
+            print_info(f"Level {self.level}: #classes/#vertices={len(cand_classes)}/{len(cand_vertices)}. "
+                       f"Non-triv classes size: {[len(c) for c in cand_classes if len(c) > 1]}")
+            for cand_class in cand_classes:
+                if len(cand_class & cand_below) != 0:
+                    # TODO: HANDLE THIS CASE!!!!
+                    print_warning(f"(level {self.level}) -- INTERSECTION BELOW FOR {cand_class & cand_below}. "
+                                  f"SHOULD NOT HAPPEN")
+            branches = _class_branches(cs, next_supernode, cand_classes)
+        # ===========================================================================================================
+        elif world_classes is not None:  # the unused nodes of a world class are interchangeable: try only one
+            cands = world_classes.get_canonical_candidates(cand_vertices, len(next_supernode))
+            branches = _canonical_branches(cs, list(cands))
+        else:
+            # if there is an intersection, we just perform normal tree search for now
             # cand can be a singleton or a larger subset depending on the size of the supernode.
             # get_candidates in cs will take care of either case and return an appropriate iterator
-            if is_joinable(pm, cs, supernode=next_supernode, candidate_node=cand):  # check
-                # if we can join, we add it to the partial match and recurse until we have a full match
-                print_debug(" and they were JOINABLE!")
-                pm.add_match(supernode=next_supernode, candidate_node=cand)  # we have a bigger partial match to explore
-                LEVEL += 1
-                match_subgraph(
-                    cs.copy(), pm, solution,
-                    ordering)  # this recursion step guarantees we have a DFS search. This tree is huge
-                pm.rm_last_match()
-            else:
-                print_debug(" and NOT JOINABLE.")
-    LEVEL -= 1
-    print_debug(f"Bottom level. Finished for loop. RETURNING to level {LEVEL}.")
-    return
+            branches = ((cand, cand) for cand in cs.get_candidates(next_supernode))
+        # the iterator may be advanced after pm has changed (e.g. by work_stealing): keep pm as it is now
+        return next_supernode, _joinable_branches(self.pm.copy(), cs, next_supernode, branches, self.level)
+
+
+def _joinable_branches(pm: PartialMatch, cs: CandidateStructure, next_supernode: SuperTemplateNode, branches, level):
+    """ The pairs of branches whose cand is joinable to pm, tested JOINABLE_CHUNK_SIZE at a time """
+    while True:
+        chunk = list(islice(branches, JOINABLE_CHUNK_SIZE))
+        if len(chunk) == 0:
+            return
+        mask = get_joinable_mask(pm, cs, next_supernode, [cand.vertices for cand, branch in chunk])
+        print_debug(f"Level={level}: {int(mask.sum())} of {len(chunk)} candidates of {next_supernode.name} "
+                    f"are JOINABLE")
+        for pair, is_joinable in zip(chunk, mask):
+            if is_joinable:
+                yield pair
+
+
+def _class_branches(cs: CandidateStructure, next_supernode: SuperTemplateNode, cand_classes: [set]):
+    for cand_class in cand_classes:
+        # at the leaf node we only need to check one
+        tempiter = iter(cand_class)
+        representative = [next(tempiter) for i in range(len(next_supernode))]
+        yield cs.get_cand_node_from_idxs(representative), cs.get_cand_node_from_idxs(cand_class)
+
+
+def _canonical_branches(cs: CandidateStructure, cands: [[int]]):
+    for cand in cands:
+        cand_node = cs.get_cand_node_from_idxs(cand)
+        yield cand_node, cand_node
 
 
 def find_isomorphisms(
         candstruct: CandidateStructure, verbose=True, debug=True, count_only=False,
-        filter_verbose=False, cap_iso=None, timeout=None, cap_matches=None
+        filter_verbose=False, cap_iso=None, timeout=None, cap_matches=None, num_workers=NUM_THREADS,
+        scheduler="static", checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL, solution_store=None,
+        ordering=ORDERING_SCORING
 ) -> SolutionTree:
     """ Given a cs, find all solutions and append them to a solution tree
     for returning. Options:
@@ -153,35 +338,132 @@ def find_isomorphisms(
     - cap_iso: stop the algorithm after these many isomorphisms
     - timeout: stop the algorithm after <timeout> seconds. Default is None
     - cap_matches: stop after certain number of matches (disregarding combinations and permutations)
+    - num_workers: if more than 1, explore the search tree with that many processes
+    - scheduler: how the processes share the search tree. "static" splits its top levels up front
+        (see parallel_find_isomorphisms), "work_stealing" splits it as it goes (see work_stealing)
+    - checkpoint_path: save the state of the search there every checkpoint_interval seconds and when it
+        finishes or stops, so it can be continued with resume_find_isomorphisms (see checkpoint).
+        Only for the single process search
+    - solution_store: also write every match to a solution store (see solution_store) at this path as it is
+        found. Use with count_only to keep the solutions without holding them in memory.
+        Only for the single process search
+    - ordering: how the next supernode to match is picked, one of Ordering.SCORINGS ("cand_count", "distance",
+        "connectivity", "ri", "vf2pp", "graphql", "core_first"). See benchmark_orderings to compare them
     """
-    global STOP_FLAG, total_filter_time, VERBOSE_FLAG, filter_verbose_flag, BRAKE, LEVEL, match_count
-    VERBOSE_FLAG = verbose
-    total_filter_time = 0
-    filter_verbose_flag = filter_verbose
-    BRAKE = cap_iso
+    if num_workers > 1 and scheduler == "work_stealing":
+        from .work_stealing import work_stealing_find_isomorphisms
+        return work_stealing_find_isomorphisms(
+            candstruct, num_workers=num_workers, verbose=verbose, debug=debug, count_only=count_only,
+            filter_verbose=filter_verbose, cap_iso=cap_iso, timeout=timeout, cap_matches=cap_matches,
+            ordering=ordering)
+    if num_workers > 1:
+        from .parallel_find_isomorphisms import parallel_find_isomorphisms
+        return parallel_find_isomorphisms(
+            candstruct, num_workers=num_workers, verbose=verbose, debug=debug, count_only=count_only,
+            filter_verbose=filter_verbose, cap_iso=cap_iso, timeout=timeout, cap_matches=cap_matches,
+            ordering=ordering)
     simple_utils.VERBOSE = verbose
     simple_utils.DEBUG = debug
 
     print_info(f"======= BEGINNING FIND_ISOMORPHISM)=====")
-    ordering = Ordering(candstruct)
-    good_ordering = ordering.initial_ordering
-    sol = SolutionTree(good_ordering, candstruct.world_graph.nodes, count_only=count_only)
-    partial_match = PartialMatch()
+    engine = SearchEngine(
+        candstruct, count_only=count_only, filter_verbose=filter_verbose, cap_iso=cap_iso, ordering=ordering)
+    if checkpoint_path is not None:
+        save_candidate_structure(checkpoint_path, candstruct)
+
+    store_writer = None
+    if solution_store is not None:
+        store_writer = SolutionStoreWriter(
+            solution_store, engine.ordering.initial_ordering, candstruct.world_graph.nodes,
+            candstruct.world_classes)
 
     print_info("======= BEGIN SUBGRAPH MATCHING =======")
-    if timeout is not None:
-        threading.Timer(timeout, timeout_thread_function).start()
-    match_subgraph(candstruct.copy(), partial_match, sol, ordering)
-    print_info(f"- Total filter time: {total_filter_time}s")
+    engine.start()
+    options = {"count_only": count_only, "filter_verbose": filter_verbose, "cap_iso": cap_iso, "ordering": ordering}
+    sol = _run(engine, timeout, checkpoint_path, checkpoint_interval, options, store_writer)
+    print_info(f"- Total filter time: {engine.total_filter_time}s")
     print_info(f"====== Finished subgraph matching. Returning solution tree. =====")
+    return sol
+
 
-    LEVEL = 1  # reset level for next run
-    match_count = 0
-    STOP_FLAG = False
+def iter_isomorphisms(
+        candstruct: CandidateStructure, verbose=False, debug=False, filter_verbose=False, cap_iso=None, timeout=None,
+        ordering=ORDERING_SCORING):
+    """ Yields the solutions of find_isomorphisms as they are found, without building a solution tree: memory
+    is bounded by the depth of the search. Each solution is a compressed match, a dict from the supernodes to
+    the matched world nodes (a Supernode standing for all the SolutionTree.count_isomorphisms(match) ways of
+    mapping the supernode into it). The search only advances when the next solution is asked for.
+    Options are the same as in find_isomorphisms """
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    engine = SearchEngine(
+        candstruct, count_only=True, filter_verbose=filter_verbose, cap_iso=cap_iso, ordering=ordering)
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, timeout_function, args=(engine,))
+        timer.daemon = True
+        timer.start()
+    try:
+        engine.start()
+        if engine.last_solution is not None:  # a template with no supernode left to match
+            yield engine.last_solution
+        while engine.step():
+            if engine.last_solution is not None:
+                yield engine.last_solution
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def resume_find_isomorphisms(
+        checkpoint_path: str, verbose=True, debug=True, timeout=None, checkpoint_interval=CHECKPOINT_INTERVAL
+) -> SolutionTree:
+    """ Continue the search saved at checkpoint_path by find_isomorphisms exactly where it was when the
+    checkpoint was taken, with the same options. Keeps checkpointing to the same path """
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    candstruct, options, state, solution = load_checkpoint(checkpoint_path)
+    print_info(f"======= RESUMING FIND_ISOMORPHISM FROM {checkpoint_path} "
+               f"({solution.get_isomorphisms_count()} isomorphisms so far) =====")
+    engine = SearchEngine(
+        candstruct, count_only=options["count_only"], filter_verbose=options["filter_verbose"],
+        cap_iso=options["cap_iso"], solution=solution, ordering=options.get("ordering", ORDERING_SCORING))
+    engine.restore_state(state)
+    sol = _run(engine, timeout, checkpoint_path, checkpoint_interval, options)
+    print_info(f"- Total filter time: {engine.total_filter_time}s")
+    print_info(f"====== Finished subgraph matching. Returning solution tree. =====")
     return sol
 
 
-def timeout_thread_function():
+def _run(
+        engine: SearchEngine, timeout, checkpoint_path, checkpoint_interval, options: dict,
+        store_writer: SolutionStoreWriter = None) -> SolutionTree:
+    """ Run engine until it finishes or times out, checkpointing along the way if checkpoint_path is given
+    and writing the matches to store_writer if given """
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, timeout_function, args=(engine,))
+        timer.daemon = True
+        timer.start()
+    last_checkpoint = time.time()
+    if store_writer is not None and engine.last_solution is not None:  # nothing was left to match
+        store_writer.add(engine.last_solution)
+    while engine.step():
+        if store_writer is not None and engine.last_solution is not None:
+            store_writer.add(engine.last_solution)
+        if checkpoint_path is not None and time.time() - last_checkpoint > checkpoint_interval:
+            save_checkpoint(checkpoint_path, engine, options)
+            print_info(f"Saved checkpoint to {checkpoint_path}")
+            last_checkpoint = time.time()
+    if timer is not None:
+        timer.cancel()
+    if store_writer is not None:
+        store_writer.close()
+    if checkpoint_path is not None:  # an empty stack means the search is done
+        save_checkpoint(checkpoint_path, engine, options)
+    return engine.solution
+
+
+def timeout_function(engine: SearchEngine):
     print_info("Timed out by user!")
-    global STOP_FLAG
-    STOP_FLAG = True
+    engine.stop()
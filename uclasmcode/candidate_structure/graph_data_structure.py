@@ -1,10 +1,14 @@
 """
 Filtering algorithms expect data to come in the form of Graph objects
+
+The search of the candidate structure reads the world through SparseAdjacency instead (one per channel): the
+world stays sparse however large it is.
 """
 
 from uclasmcode.uclasm.utils.misc import index_map
 from uclasmcode.uclasm.utils import data_structures
 import numpy as np
+import scipy.sparse as sparse
 
 
 class Graph:
@@ -88,3 +92,62 @@ class Graph:
 def sparse_to_dense_graph(old_graph: data_structures.Graph):
     result = Graph(old_graph.nodes, old_graph.channels, old_graph.adjs, old_graph.labels)
     return result
+
+
+class SparseAdjacency:
+    """ A sparse adjacency matrix kept both as CSR and CSC (with sorted indices) for the submatrix queries of the
+    search: adj[np.ix_(rows, cols)] is read from the rows (CSR) or from the columns (CSC), whichever has fewer
+    entries to go through, and never as a dense matrix of the size of the world.
+    (Single entries are looked up with Graph.multiplicity instead) """
+
+    def __init__(self, adj):
+        csr = sparse.csr_matrix(adj)
+        csr.sum_duplicates()  # also sorts the indices
+        csr.eliminate_zeros()
+        self.shape = csr.shape
+        self.csr = csr
+        self.csc = csr.tocsc()
+        self.csc.sort_indices()
+
+    @property
+    def nnz(self) -> int:
+        return self.csr.nnz
+
+    def submatrix(self, rows, cols) -> sparse.csr_matrix:
+        """ adj[np.ix_(rows, cols)] as a (len(rows), len(cols)) sparse matrix """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        cols = np.asarray(cols, dtype=np.int64).reshape(-1)
+        csr, csc = self.csr, self.csc
+        if np.sum(csr.indptr[rows + 1] - csr.indptr[rows]) <= np.sum(csc.indptr[cols + 1] - csc.indptr[cols]):
+            row_positions, col_positions, data = _select(csr, rows, cols)
+        else:
+            col_positions, row_positions, data = _select(csc, cols, rows)
+        return sparse.csr_matrix((data, (row_positions, col_positions)), shape=(len(rows), len(cols)))
+
+    def dense_submatrix(self, rows, cols) -> np.ndarray:
+        """ adj[np.ix_(rows, cols)] as a dense array """
+        return self.submatrix(rows, cols).toarray()
+
+
+def _select(compressed, major, minor) -> (np.ndarray, np.ndarray, np.ndarray):
+    """ The entries of the lines major of a CSR (rows) or CSC (columns) matrix that are at the indices minor in
+    the other dimension, as (position in major, position in minor, value). minor may have repeats """
+    indptr, indices = compressed.indptr, compressed.indices
+    starts = indptr[major]
+    lengths = indptr[major + 1] - starts
+    entries = _concatenated_ranges(starts, lengths)
+    major_positions = np.repeat(np.arange(len(major)), lengths)
+    # the positions in minor of the index of each entry (none if it is not in minor)
+    order = np.argsort(minor, kind="stable")
+    sorted_minor = minor[order]
+    first = np.searchsorted(sorted_minor, indices[entries], side="left")
+    counts = np.searchsorted(sorted_minor, indices[entries], side="right") - first
+    is_selected = np.repeat(np.arange(len(entries)), counts)
+    minor_positions = order[_concatenated_ranges(first, counts)]
+    return major_positions[is_selected], minor_positions, compressed.data[entries[is_selected]]
+
+
+def _concatenated_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """ np.concatenate([np.arange(s, s + l) for s, l in zip(starts, lengths)]) without the python loop """
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) > 0 else 0) - np.repeat(ends - lengths - starts, lengths)
@@ -2,13 +2,16 @@
 Utilities functions for match_subgraph function. Includes:
     - pick_next_candidate
     - is_joinable
+    - get_joinable_mask (is_joinable for many candidates of a supernode at once)
 """
 
 from .candidate_structure import CandidateStructure, SuperTemplateNode
 from .partial_match import PartialMatch
 from .supernodes import Supernode
 import numpy as np
+import scipy.sparse as sparse
 from collections import deque
+from scipy.special import comb
 from .logging_utils import print_debug, print_info, print_warning
 
 
@@ -25,7 +28,7 @@ def is_joinable(
             f"\t\tcandidate_node={repr(candidate_node)} and supernode={repr(supernode)}"
 
     # if the intersection is non-trivial i.e. does not satisfy the alldiff constraint
-    if set(candidate_node.name) & pm.already_matched_world_nodes:
+    if pm.get_matched_world_nodes(cs.num_world_nodes)[list(candidate_node.vertices)].any():
         # print_debug(f"ISJOINABLE(29): FAILED ALLDIFF")
         return False
 
@@ -36,35 +39,178 @@ def is_joinable(
 
     # check the homomorphism condition
     for channel in cs.channels:
-        matched_incoming_nbr = {  # set of incoming nbr that's already matched
-            inbr for inbr in cs.get_incoming_neighbors(supernode, channel) \
-            if inbr in pm.matches}
-        matched_outgoing_nbr = {  # outgoing
-            onbr for onbr in cs.get_outgoing_neighbors(supernode, channel) \
-            if onbr in pm.matches}
-        # for each neighbor, we must have a candidate edge between the two cand nodes
-        for inbr in matched_incoming_nbr:
-            if not cs.has_cand_edge(  # the order matters here because direction
-                    (inbr, pm.matches[inbr]), (supernode, candidate_node), channel):
+        # for each neighbor already matched, we must have a candidate edge between the two cand nodes
+        for inbr, multiplicity in zip(*cs.get_incoming_superedges(supernode, channel)):
+            if inbr in pm.matches and not cs.has_cand_edge(  # the order matters here because direction
+                    (inbr, pm.matches[inbr]), (supernode, candidate_node), channel, multiplicity):
                 # print_debug(f"ISJOINABLE(49): FAILED HOMO IN {inbr.name} {channel}")
                 return False
-        for onbr in matched_outgoing_nbr:
-            if not cs.has_cand_edge(
-                    (supernode, candidate_node), (onbr, pm.matches[onbr]), channel):
+        for onbr, multiplicity in zip(*cs.get_outgoing_superedges(supernode, channel)):
+            if onbr in pm.matches and not cs.has_cand_edge(
+                    (supernode, candidate_node), (onbr, pm.matches[onbr]), channel, multiplicity):
                 # print_debug(f"ISJOINABLE(29): FAILED HOMO OUT")
                 return False
     return True
 
 
+def get_joinable_mask(
+        pm: PartialMatch, cs: CandidateStructure, supernode: SuperTemplateNode, cand_idxs: np.ndarray) -> np.ndarray:
+    """ Same as is_joinable for many candidate nodes at once. cand_idxs is an int array of shape
+    (#candidate nodes, len(supernode)): the world indices of each candidate node.
+    Returns the boolean mask of the joinable candidate nodes """
+    assert supernode not in pm.matches, \
+        "PartialMatch.get_joinable_mask: Trying to join an existing match"
+    cand_idxs = np.asarray(cand_idxs, dtype=np.int64).reshape(-1, len(supernode))
+    world_adjs = cs.world_adjacency
+
+    # the alldiff constraint
+    mask = ~pm.get_matched_world_nodes(cs.num_world_nodes)[cand_idxs].any(axis=1)
+
+    # the clique condition: compare each pair of positions of the candidate nodes to the supernode's
+    if not supernode.is_trivial():
+        sn_vertices = supernode.get_vertices()
+        for ch in cs.channels:
+            if not supernode.is_clique(ch):
+                continue
+            tmplt_submatrix = _to_array(cs.tmplt_graph.ch_to_adj[ch][sn_vertices, :][:, sn_vertices])
+            for i, j in zip(*np.nonzero(tmplt_submatrix)):
+                mask &= cs.world_graph.multiplicity(ch, cand_idxs[:, i], cand_idxs[:, j]) >= tmplt_submatrix[i, j]
+
+    # the homomorphism condition: every world node of the candidate node needs (at least the multiplicity of)
+    # the superedge with every world node matched to each matched neighbor
+    world_nodes = np.unique(cand_idxs[mask])  # only the candidate nodes still joinable
+    for ch in cs.channels:
+        for is_incoming, (nbrs, multiplicities) in (
+                (True, cs.get_incoming_superedges(supernode, ch)), (False, cs.get_outgoing_superedges(supernode, ch))):
+            for nbr, multiplicity in zip(nbrs, multiplicities):
+                if nbr not in pm.matches or len(world_nodes) == 0:
+                    continue
+                nbr_idxs = list(pm.matches[nbr].vertices)
+                if is_incoming:
+                    connections = world_adjs[ch].dense_submatrix(nbr_idxs, world_nodes)
+                else:
+                    connections = world_adjs[ch].dense_submatrix(world_nodes, nbr_idxs).T
+                is_connected = np.zeros(cs.num_world_nodes, dtype=np.bool_)
+                is_connected[world_nodes] = np.all(connections >= multiplicity, axis=0)
+                mask &= is_connected[cand_idxs].all(axis=1)
+                world_nodes = world_nodes[is_connected[world_nodes]]
+    return mask
+
+
+def _to_array(matrix) -> np.ndarray:
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+
+class _IndexedHeap(object):
+    """ A binary min heap of items with keys that can be changed or removed in O(log n) """
+
+    def __init__(self):
+        self._heap = []  # (key, item)
+        self._index = {}  # item: its position in _heap
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def peek(self):
+        """ The item with the smallest key """
+        return self._heap[0][1]
+
+    def update(self, item, key) -> None:
+        """ Insert item with key or change its key """
+        if item in self._index:
+            i = self._index[item]
+            old_key = self._heap[i][0]
+            self._heap[i] = (key, item)
+            self._sift_up(i) if key < old_key else self._sift_down(i)
+        else:
+            self._heap.append((key, item))
+            self._index[item] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+
+    def remove(self, item) -> None:
+        i = self._index.pop(item)
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._index[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self._index[last[1]])
+
+    def _sift_up(self, i: int) -> None:
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._heap[i][0] < self._heap[parent][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int) -> None:
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap) and self._heap[child][0] < self._heap[smallest][0]:
+                    smallest = child
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
+
+    def _swap(self, i: int, j: int) -> None:
+        self._heap[i], self._heap[j] = self._heap[j], self._heap[i]
+        self._index[self._heap[i][1]] = i
+        self._index[self._heap[j][1]] = j
+
+
 class Ordering(object):
-    """ A utility class for keeping track of orderings"""
+    """ A utility class for keeping track of orderings.
+    get_next_cand picks the unmatched supernode with the smallest score (see SCORINGS) given the current
+    candidates of cs. The unmatched supernodes are kept in an indexed priority queue: at each call only the
+    scores of the supernodes whose candidates changed (see CandidateStructure.pop_changed_rows) or that were
+    (un)matched since the last call, and of their neighbors, are updated """
+
+    # the score of sn (smaller is picked first) given its number of candidate nodes cand_count
+    SCORINGS = {
+        "cand_count": lambda self, sn, cand_count: (cand_count,),
+        # distance from the start node of distance_ordering first
+        "distance": lambda self, sn, cand_count: (self.distances.get(sn, float("inf")), cand_count),
+        # the most neighbors already matched first
+        "connectivity": lambda self, sn, cand_count: (-self.num_matched_nbrs[sn], cand_count),
+        # RI: the static order of ri_ordering (the most neighbors among the supernodes ordered before first)
+        "ri": lambda self, sn, cand_count: (self.ranks[sn],),
+        # VF2++: the static order of vf2pp_ordering (BFS levels from a supernode with few candidates)
+        "vf2pp": lambda self, sn, cand_count: (self.ranks[sn],),
+        # GraphQL: grow the match along the template, the fewest candidate nodes first among the neighbors
+        "graphql": lambda self, sn, cand_count: (self.num_matched_nbrs[sn] == 0, cand_count),
+        # CFL: the 2-core of the template first (grown as in "graphql"), its trees last
+        "core_first": lambda self, sn, cand_count: (sn not in self.core, self.num_matched_nbrs[sn] == 0, cand_count),
+    }
 
-    def __init__(self, cs: CandidateStructure):
+    def __init__(self, cs: CandidateStructure, scoring="cand_count"):
+        """ scoring: one of SCORINGS or a function (ordering, sn, cand_count) -> comparable score """
         self.cs = cs
         # self.distances = {sn: self._get_distances_dict_from(sn) for sn in self.cs.supernodes.values()}
         self.initial_ordering = self.cand_count_ordering()
         assert len(self.initial_ordering) == self.cs.get_supernodes_count()
         self.index = 0
+        self.scoring = self.SCORINGS[scoring] if isinstance(scoring, str) else scoring
+        self.distances = self._get_distances_dict_from(self.distance_ordering()[0]) if scoring == "distance" else {}
+        self.ranks = {}  # the position of each supernode in the static ordering of "ri" and "vf2pp"
+        if scoring == "ri":
+            self.ranks = {sn: i for i, sn in enumerate(self.ri_ordering())}
+        elif scoring == "vf2pp":
+            self.ranks = {sn: i for i, sn in enumerate(self.vf2pp_ordering())}
+        self.core = self._get_core() if scoring == "core_first" else set()
+        self.num_matched_nbrs = {sn: 0 for sn in cs.supernodes.values()}
+        # ties are broken by the order of cs.supernodes
+        self._positions = {sn: i for i, sn in enumerate(cs.supernodes.values())}
+        self._queue = _IndexedHeap()
+        self._matched = []  # pm.node_stack as of the last call of get_next_cand
+        cs.pop_changed_rows()
+        for sn in cs.supernodes.values():
+            self._queue.update(sn, self._get_key(sn))
 
     # def get_next_cand(self, pm: PartialMatch) -> SuperTemplateNode:
     #     """ Given a partial match, return a good next candidate """
@@ -74,25 +220,37 @@ class Ordering(object):
 
     def get_next_cand(self, pm: PartialMatch) -> SuperTemplateNode:
         """ Given a partial match, return a good next candidate """
-        cand_counts = self.cs.get_supernodes_cand_count()
-        # nbr = self.cs.get_supernodes_nbr_count()
-        #
-        # if distance:
-        #     try:
-        #         lastsn, _ = pm.get_last_match()
-        #     except TypeError:
-        #         return self.initial_ordering[0]
-        #     distance_lastsn = self.distances[lastsn]
-        #     # get the minimum candidate count, non-matched supernode
-        #     toreturn = min(
-        #         [(sn, cand_counts[sn], distance_lastsn[sn]) for sn in self.cs.supernodes.values() if sn not in pm.matches],
-        #         key=lambda x: (x[1], x[2]))[0]
-        #     return toreturn
-
-        toreturn = min(
-            [(sn, cc) for sn, cc in cand_counts.items() if sn not in pm.matches],
-            key=lambda x: x[1])[0]
-        return toreturn
+        self._update(pm)
+        return self._queue.peek()
+
+    def _update(self, pm: PartialMatch) -> None:
+        """ Bring the queue up to date with pm and the candidates of cs """
+        to_update = set()
+        # pm.node_stack is a stack: only its top changed since the last call
+        common = 0
+        while common < min(len(self._matched), len(pm.node_stack)) and \
+                self._matched[common] == pm.node_stack[common]:
+            common += 1
+        for sn, is_matched in [(sn, False) for sn in reversed(self._matched[common:])] + \
+                [(sn, True) for sn in pm.node_stack[common:]]:
+            if is_matched:
+                self._queue.remove(sn)
+            else:  # back in the queue (with its score updated below)
+                self._queue.update(sn, self._get_key(sn))
+                to_update.add(sn)
+            for nbr in self._get_neighbors(sn):
+                self.num_matched_nbrs[nbr] += 1 if is_matched else -1
+                to_update.add(nbr)
+        self._matched = list(pm.node_stack)
+        supernodes = self.cs.supernodes
+        to_update.update(supernodes[row] for row in self.cs.pop_changed_rows().tolist() if row in supernodes)
+        for sn in to_update:
+            if sn not in pm.matches:
+                self._queue.update(sn, self._get_key(sn))
+
+    def _get_key(self, sn: SuperTemplateNode) -> tuple:
+        cand_count = comb(self.cs.cand_counts[sn.get_root()], len(sn))
+        return self.scoring(self, sn, cand_count), self._positions[sn]
 
     def increment_index(self):
         # print_debug(f"Incrementing ordering index to: {self.index+1}")
@@ -123,29 +281,98 @@ class Ordering(object):
         scores = {sn: cand_counts[sn] / nbr[sn] for sn in self.cs.supernodes.values()}
         start_node = min(scores.items(), key=lambda x: x[1])[0]
         distances = self._get_distances_dict_from(start_node)
-        to_order = [(sn, distances[sn], scores[sn], cand_counts[sn], degrees[sn]) for sn in self.cs.supernodes.values()]
+        to_order = [(sn, distances.get(sn, float("inf")), scores[sn], cand_counts[sn], degrees[sn]) for sn in self.cs.supernodes.values()]
         sorted_to_order = sorted(to_order, key=lambda x: (x[1], x[2], -x[4]))
         print_debug(f"DISTANCE ORDERING: {self._print_order_nicely(sorted_to_order)}")
         return [i[0] for i in sorted_to_order]
 
+    def ri_ordering(self) -> [SuperTemplateNode]:
+        """ The ordering of RI (Bonnici et al. 2013), from the template structure only: start with the supernode
+        of largest degree, then repeatedly take the one with the most neighbors already ordered. Ties are broken by
+        the number of ordered supernodes it shares an unordered neighbor with, then by its number of neighbors not
+        adjacent to the ordered ones, then by degree """
+        degrees = self.cs.get_supernodes_degrees()
+        nbrs = self._get_neighbors_dict()
+        ordered = []
+        ordered_set = set()
+        remaining = list(self.cs.supernodes.values())
+        while len(remaining) > 0:
+            frontier = set().union(*(nbrs[v] for v in ordered)) - ordered_set
+
+            def score(u):
+                unordered_nbrs = nbrs[u] - ordered_set
+                return (len(nbrs[u] & ordered_set), sum(1 for v in ordered if nbrs[v] & unordered_nbrs),
+                        len(unordered_nbrs - frontier), degrees[u])
+            best = max(remaining, key=score)
+            remaining.remove(best)
+            ordered.append(best)
+            ordered_set.add(best)
+        print_debug(f"RI ORDERING: {[str(sn.name) for sn in ordered]}")
+        return ordered
+
+    def vf2pp_ordering(self) -> [SuperTemplateNode]:
+        """ The ordering of VF2++ (Juttner and Madarasi 2018): BFS levels from the supernode with the fewest
+        candidate nodes (then largest degree) of each connected component. Within a level the supernode with the
+        most neighbors already ordered goes first, then the one of largest degree, then the fewest candidates """
+        cand_counts = self.cs.get_supernodes_cand_count()
+        degrees = self.cs.get_supernodes_degrees()
+        nbrs = self._get_neighbors_dict()
+        ordered = []
+        ordered_set = set()
+        remaining = list(self.cs.supernodes.values())
+        while len(remaining) > 0:
+            root = min(remaining, key=lambda sn: (cand_counts[sn], -degrees[sn]))
+            visited = {root}
+            level = [root]
+            while len(level) > 0:
+                to_order = list(level)
+                while len(to_order) > 0:
+                    best = max(to_order, key=lambda sn: (len(nbrs[sn] & ordered_set), degrees[sn], -cand_counts[sn]))
+                    to_order.remove(best)
+                    ordered.append(best)
+                    ordered_set.add(best)
+                next_level = []
+                for v in level:
+                    for nbr in nbrs[v]:
+                        if nbr not in visited:
+                            visited.add(nbr)
+                            next_level.append(nbr)
+                level = next_level
+            remaining = [sn for sn in remaining if sn not in ordered_set]
+        print_debug(f"VF2++ ORDERING: {[str(sn.name) for sn in ordered]}")
+        return ordered
+
     def __str__(self):
         return str([str(i) for i in self.initial_ordering])
 
+    def _get_neighbors_dict(self) -> {SuperTemplateNode: {SuperTemplateNode}}:
+        """ The neighbors of every supernode (other than itself) """
+        return {sn: self._get_neighbors(sn) - {sn} for sn in self.cs.supernodes.values()}
+
+    def _get_core(self) -> {SuperTemplateNode}:
+        """ The 2-core of the template: what is left after repeatedly removing the supernodes with at most one
+        neighbor. Empty if the template (of supernodes) is a forest """
+        nbrs = self._get_neighbors_dict()
+        degrees = {sn: len(nbrs[sn]) for sn in nbrs}
+        queue = deque(sn for sn in nbrs if degrees[sn] <= 1)
+        removed = set(queue)
+        while len(queue) != 0:
+            v = queue.popleft()
+            for nbr in nbrs[v]:
+                if nbr not in removed:
+                    degrees[nbr] -= 1
+                    if degrees[nbr] <= 1:
+                        removed.add(nbr)
+                        queue.append(nbr)
+        return set(nbrs) - removed
+
     def _get_neighbors(self, sn: SuperTemplateNode) -> {SuperTemplateNode}:
         """ Returns a set of neighbors of a given supernode"""
-        root = sn.get_root()
-        nbrs = set()
-        for pin in np.argwhere(self.cs.tmplt_graph.sym_composite_adj[root]):
-            if not self.cs.in_same_equiv_class(pin[1], root):
-                nbrs.add(self.cs.get_supernode_by_idx(pin[1]))
-        return nbrs
+        return self.cs.get_neighbors(sn)
 
     def _get_distances_dict_from(self, sn: SuperTemplateNode) -> {SuperTemplateNode: int}:
         """ Given a start supernode sn, returns a dictionary containing the
-        distance of the other supernodes...."""
-        if not self.cs.tmplt_graph.is_connected():
-            print_warning("TEMPLATE GRAPH NOT CONNECTED! DO NOT USE DISTANCE. HAVE NOT SUPPORTED")
-
+        distance of the other supernodes.... (those not connected to sn are left out)"""
         visited = {sn}
         result = {sn: 0}
         queue = deque()
@@ -157,6 +384,8 @@ class Ordering(object):
                     result[nbr] = result[v]+1
                     visited.add(nbr)
                     queue.append(nbr)
+        if len(result) != self.cs.get_supernodes_count():
+            print_warning("TEMPLATE GRAPH NOT CONNECTED! DO NOT USE DISTANCE. HAVE NOT SUPPORTED")
         return result
 
     @staticmethod
@@ -0,0 +1,132 @@
+""" Parallel version of find_isomorphisms.
+
+The top split_depth levels of the search tree are expanded in the main process exactly as SearchEngine would
+expand them. Every partial match reached at that depth is a work unit: the subtree below it is independent of
+all the others, so the units are explored by a pool of worker processes and their solution trees are merged
+back in the order the sequential search would have visited them.
+
+A work unit is stored compactly as a tuple of (template root, matched world vertices) pairs. A worker replays
+it with its own SearchEngine (running the same filters the main process ran on the way down) and then searches
+the subtree below it.
+
+All the workers share a stop event (set on timeout or once the cap on the isomorphisms is reached) and the
+running total of isomorphisms they found.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .find_isomorphisms import SearchEngine, ORDERING_SCORING
+from .candidate_structure import CandidateStructure
+from .solution_tree import SolutionTree
+from .logging_utils import print_info
+import uclasmcode.candidate_structure.logging_utils as simple_utils
+
+# split one more level when the first level has fewer work units than this many per worker
+MIN_UNITS_PER_WORKER = 4
+
+_engine = None  # the search engine of a worker process. Set by _init_worker
+
+
+def split_search_tree(engine: SearchEngine, split_depth: int) -> [tuple]:
+    """ Returns the work units for the partial matches of length split_depth (or complete matches
+    for smaller templates) in the order the search would visit them. engine is reset before returning """
+    engine.reset()
+    units = []
+    _split(engine, split_depth, units)
+    engine.reset()
+    return units
+
+
+def _split(engine: SearchEngine, depth: int, units: [tuple]) -> None:
+    cs, pm = engine.cs, engine.pm
+    if depth == 0 or len(pm) == cs.get_supernodes_count():
+        units.append(engine.get_prefix())
+        return
+    mark = cs.mark_changes()
+    if engine.prepare_level():
+        next_supernode, branches = engine.candidate_branches()
+        for cand, branch in branches:
+            pm.add_match(next_supernode, branch)
+            _split(engine, depth - 1, units)
+            pm.rm_last_match()
+    cs.restore_changes(mark)
+
+
+def _init_worker(
+        candstruct, count_only, cap_iso, stop_event, shared_iso_count, verbose, debug, filter_verbose, ordering):
+    global _engine
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    _engine = SearchEngine(
+        candstruct, count_only=count_only, filter_verbose=filter_verbose, cap_iso=cap_iso,
+        stop_event=stop_event, shared_iso_count=shared_iso_count, ordering=ordering)
+
+
+def _explore(unit: tuple) -> (SolutionTree, float):
+    """ Explore the subtree below a work unit. Returns its solution tree and the time spent filtering """
+    engine = _engine
+    engine.solution = SolutionTree(
+        engine.ordering.initial_ordering, count_only=engine.solution.count_only,
+        world_classes=engine.cs.world_classes)
+    engine.total_filter_time = 0
+    engine.start(unit)
+    engine.run()
+    return engine.solution, engine.total_filter_time
+
+
+def parallel_find_isomorphisms(
+        candstruct: CandidateStructure, num_workers=None, split_depth=None, verbose=True, debug=True,
+        count_only=False, filter_verbose=False, cap_iso=None, timeout=None, cap_matches=None,
+        ordering=ORDERING_SCORING
+) -> SolutionTree:
+    """ Same as find_isomorphisms but the subtrees are explored by a pool of processes. Options:
+    - num_workers: number of worker processes. Default is the number of cpus
+    - split_depth: number of levels of the search tree expanded before handing out the subtrees below them.
+        Default is 1, or 2 if the first level has too few subtrees to keep the workers busy
+    - the rest are the same as in find_isomorphisms. With cap_iso, the workers may overshoot the cap by the
+        isomorphisms they find before noticing the others have stopped
+    """
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    if num_workers is None:
+        num_workers = os.cpu_count()
+
+    print_info(f"======= BEGINNING PARALLEL FIND_ISOMORPHISM ({num_workers} workers) =====")
+    engine = SearchEngine(candstruct, count_only=count_only, filter_verbose=filter_verbose, ordering=ordering)
+    sol = engine.solution
+    st = time.time()
+    if split_depth is None:
+        units = split_search_tree(engine, 1)
+        if len(units) < MIN_UNITS_PER_WORKER * num_workers:
+            units = split_search_tree(engine, 2)
+    else:
+        units = split_search_tree(engine, split_depth)
+    print_info(f"Split the search tree into {len(units)} work units in {time.time() - st}s")
+
+    ctx = multiprocessing.get_context()
+    stop_event = ctx.Event()
+    shared_iso_count = ctx.Value('d', 0.0)
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, stop_event.set)
+        timer.daemon = True
+        timer.start()
+    total_filter_time = 0
+    with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(candstruct, count_only, cap_iso, stop_event, shared_iso_count,
+                      verbose, debug, filter_verbose, ordering)) as executor:
+        futures = [executor.submit(_explore, unit) for unit in units]
+        for future in futures:  # merge in the order of the sequential search
+            unit_sol, filter_time = future.result()
+            sol.merge(unit_sol)
+            total_filter_time += filter_time
+    if timer is not None:
+        timer.cancel()
+    print_info(f"- Total filter time (summed over workers): {total_filter_time}s")
+    print_info(f"====== Finished parallel subgraph matching. Returning solution tree. =====")
+    return sol
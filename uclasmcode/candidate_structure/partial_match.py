@@ -1,6 +1,8 @@
 """ by Tim Nguyen (7/17/19)
 PartialMatch class: Data structure for matching algorithm to modify, update, restore partial matches """
 
+import numpy as np
+
 # from .logging_utils import print_info
 from .supernodes import Supernode, SuperTemplateNode
 
@@ -13,19 +15,20 @@ class PartialMatch(object):
 		- get_matches   (returns a dictionary of Supernode and matched world node)
 		- add_match     (add a new match and keeps track of the order of adding) """
 
-	def __init__(self):
-		""" """
+	def __init__(self, num_world_nodes: int = 0):
+		""" num_world_nodes: the size of the world graph (grown as needed if unknown) """
 		# dictionary of Supernode to a set of matched nodes of same size as supernode
 		# #Note that __hash__ is defined in Supernode
 		self.matches: {SuperTemplateNode: Supernode} = {}
 		self.node_stack: [SuperTemplateNode] = []  # a stack of last added SuperTemplateNodes
-		self.already_matched_world_nodes = set()  # for checking alldiff
+		# for checking alldiff: whether each world node (by index) is in some match
+		self.matched_world_nodes = np.zeros(num_world_nodes, dtype=np.bool_)
 
 	# ========== METHODS ===========
 	def rm_last_match(self) -> SuperTemplateNode:
 		""" pop the last match from the stack and remove the other stuff"""
 		last_super_node = self.node_stack.pop()
-		self.already_matched_world_nodes -= set(self.matches.pop(last_super_node).name)
+		self.matched_world_nodes[list(self.matches.pop(last_super_node).vertices)] = False
 		return last_super_node
 
 	def get_last_match(self) -> (SuperTemplateNode, Supernode):
@@ -47,13 +50,29 @@ class PartialMatch(object):
 		# push the new matches onto the stack
 		self.node_stack.append(supernode)
 		self.matches[supernode] = candidate_node
-		self.already_matched_world_nodes.update(candidate_node.name)
+		self.get_matched_world_nodes(candidate_node.vertices[-1] + 1)[list(candidate_node.vertices)] = True
+
+	def copy(self) -> 'PartialMatch':
+		""" A copy that later changes to this partial match do not affect (the supernodes are shared) """
+		temp = PartialMatch(len(self.matched_world_nodes))
+		for sn in self.node_stack:
+			temp.add_match(sn, self.matches[sn])
+		return temp
 
 	# =========== QUERIES ==========
 	def get_matches(self) -> {SuperTemplateNode: {Supernode}}:
 		""" Returns a dictionary of matches of this partial match"""
 		return self.matches
 
+	def get_matched_world_nodes(self, num_world_nodes: int) -> np.ndarray:
+		""" Boolean array of whether each of the first num_world_nodes world nodes is in some match.
+		A view: it changes with the partial match """
+		if len(self.matched_world_nodes) < num_world_nodes:
+			grown = np.zeros(num_world_nodes, dtype=np.bool_)
+			grown[:len(self.matched_world_nodes)] = self.matched_world_nodes
+			self.matched_world_nodes = grown
+		return self.matched_world_nodes[:num_world_nodes]
+
 	def print_match_stack(self) -> str:
 		""" Return a nicely formatted match stack for debugging mainly """
 		return str([str(i) for i in self.node_stack])
@@ -61,7 +80,7 @@ class PartialMatch(object):
 	# === utils ====
 	def __str__(self):
 		""" Gives the string of the matched dictionary """
-		return str([(str(u.name), str(v.name)) for u, v in self.matches.items()])
+		return str([(str(u.get_name()), str(v.get_name())) for u, v in self.matches.items()])
 
 	def __repr__(self):
 		""" Gives some useful info for debugging """
@@ -0,0 +1,191 @@
+""" Columnar on-disk storage for the solutions of find_isomorphisms.
+
+A store is a directory with
+    - header.json: the template supernodes in the order the columns are stored (root, template vertices and names),
+        the names of the world nodes and the number of matches written so far
+    - sizes.bin: int32 array of shape (#matches, #supernodes). The size of the world class matched to each supernode
+    - nodes.bin: int32 array. The world indices of each match, supernode after supernode, match after match
+    - world_classes.bin: int32 array. The class of each world node, only if the search branched on world
+        classes (see world_equivalence). Needed to count the isomorphisms the matches stand for
+
+Matches are appended as they are found (see find_isomorphisms(solution_store=...)) and the header is
+rewritten at every flush, so a store is readable (up to the last flush) even if the search is killed.
+SolutionStore reads the arrays with numpy.memmap so nothing is loaded until it is queried.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+from scipy.special import comb
+
+from .supernodes import Supernode, SuperTemplateNode
+from .solution_tree import SolutionTree
+from .world_equivalence import WorldClasses
+
+STORE_VERSION = 1
+HEADER_FILE = "header.json"
+SIZES_FILE = "sizes.bin"
+NODES_FILE = "nodes.bin"
+WORLD_CLASSES_FILE = "world_classes.bin"
+DTYPE = np.int32
+
+# number of matches buffered in memory between two writes
+FLUSH_EVERY = 4096
+
+
+class SolutionStoreWriter(object):
+    """ Appends compressed matches ({SuperTemplateNode: Supernode} dicts) to a store """
+
+    def __init__(self, path: str, ordering: [SuperTemplateNode], world_nodes, world_classes: WorldClasses = None):
+        """ ordering: the template supernodes (the columns of the store)
+        world_nodes: the names of the world nodes (world_graph.nodes)
+        world_classes: the world classes the search branched on (CandidateStructure.world_classes) """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.ordering = list(ordering)
+        self.world_nodes = np.asarray(world_nodes).tolist()
+        self.num_matches = 0
+        self._sizes = []
+        self._nodes = []
+        # start from empty files
+        for file_name in (SIZES_FILE, NODES_FILE):
+            open(os.path.join(path, file_name), "wb").close()
+        self.has_world_classes = world_classes is not None
+        if self.has_world_classes:
+            with open(os.path.join(path, WORLD_CLASSES_FILE), "wb") as f:
+                f.write(world_classes.labels.astype(DTYPE).tobytes())
+        self._write_header()
+
+    def add(self, match_dict: {SuperTemplateNode: Supernode}) -> None:
+        for sn in self.ordering:
+            world_idxs = match_dict[sn].vertices
+            self._sizes.append(len(world_idxs))
+            self._nodes.extend(world_idxs)
+        self.num_matches += 1
+        if self.num_matches % FLUSH_EVERY == 0:
+            self.flush()
+
+    def add_solution_tree(self, sol: SolutionTree) -> None:
+        """ Append every match stored in a (not count_only) solution tree """
+        for match_dict in sol.iterate_isomorphisms():
+            self.add(match_dict)
+
+    def flush(self) -> None:
+        for file_name, values in ((SIZES_FILE, self._sizes), (NODES_FILE, self._nodes)):
+            with open(os.path.join(self.path, file_name), "ab") as f:
+                f.write(np.asarray(values, dtype=DTYPE).tobytes())
+        self._sizes = []
+        self._nodes = []
+        self._write_header()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_header(self) -> None:
+        header = {
+            "version": STORE_VERSION,
+            "num_matches": self.num_matches,
+            "has_world_classes": self.has_world_classes,
+            "supernodes": [
+                {"root": int(sn.get_root()), "vertices": [int(v) for v in sn.vertices],
+                 "names": np.asarray(sn.name).tolist()}
+                for sn in self.ordering],
+            "world_nodes": self.world_nodes}
+        temp_path = os.path.join(self.path, HEADER_FILE + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(header, f)
+        os.replace(temp_path, os.path.join(self.path, HEADER_FILE))
+
+
+class SolutionStore(object):
+    """ Read-only view of a store written by SolutionStoreWriter """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        assert header["version"] == STORE_VERSION, f"Unsupported solution store version {header['version']}"
+        self.path = path
+        self.num_matches = header["num_matches"]
+        self.world_nodes = header["world_nodes"]
+        self.supernodes = [
+            SuperTemplateNode(sn["vertices"], name=sn["names"], root=sn["root"]) for sn in header["supernodes"]]
+        num_supernodes = len(self.supernodes)
+        self.sizes = self._memmap(SIZES_FILE, (self.num_matches, num_supernodes))
+        # offsets[i] is where match i starts in nodes
+        self.offsets = np.zeros(self.num_matches + 1, dtype=np.int64)
+        np.cumsum(self.sizes.sum(axis=1), out=self.offsets[1:])
+        self.nodes = self._memmap(NODES_FILE, (int(self.offsets[-1]),))
+        self.world_classes = None
+        if header.get("has_world_classes", False):
+            self.world_classes = WorldClasses(self._memmap(WORLD_CLASSES_FILE, (len(self.world_nodes),)))
+
+    # ====== QUERIES ======
+    def get_num_matches(self) -> int:
+        return self.num_matches
+
+    def get_isomorphisms_count(self):
+        """ Same as SolutionTree.get_isomorphisms_count """
+        if self.num_matches == 0:
+            return 0
+        if self.world_classes is not None:
+            return sum(self.world_classes.count_isomorphisms(match) for match in self.iterate_isomorphisms())
+        counts = np.ones(self.num_matches)
+        for col, sn in enumerate(self.supernodes):
+            counts *= math.factorial(len(sn)) * comb(self.sizes[:, col], len(sn))
+        return counts.sum()
+
+    def get_match_idxs(self, i: int) -> [np.ndarray]:
+        """ The world indices matched to each supernode (in the order of self.supernodes) by match i """
+        bounds = self.offsets[i] + np.concatenate([[0], np.cumsum(self.sizes[i])])
+        return [self.nodes[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def get_match(self, i: int) -> {SuperTemplateNode: Supernode}:
+        """ Match i in the same form as the matches of SolutionTree.iterate_isomorphisms """
+        return {sn: self._get_world_supernode(idxs) for sn, idxs in zip(self.supernodes, self.get_match_idxs(i))}
+
+    def iterate_isomorphisms(self):
+        for i in range(self.num_matches):
+            yield self.get_match(i)
+
+    def get_min_complete_cand_set(self) -> {SuperTemplateNode: {Supernode}}:
+        """ Same as SolutionTree.get_min_complete_cand_set """
+        cand_sets = {sn: set() for sn in self.supernodes}
+        for match_dict in self.iterate_isomorphisms():
+            for sn, world_sn in match_dict.items():
+                cand_sets[sn].add(world_sn)
+        return cand_sets
+
+    def get_signal_nodes(self) -> {Supernode}:
+        """ Same as SolutionTree.get_signal_nodes """
+        return set.union(*list(self.get_min_complete_cand_set().values()))
+
+    def get_signal_node_idxs(self) -> np.ndarray:
+        """ The (sorted) indices of the world nodes that appear in some match. Computed from the arrays only """
+        return np.unique(self.nodes)
+
+    def __len__(self):
+        return self.num_matches
+
+    # ====== HELPERS ======
+    def _get_world_supernode(self, idxs: np.ndarray) -> Supernode:
+        idxs = [int(i) for i in idxs]
+        return Supernode(idxs, [self.world_nodes[i] for i in idxs])
+
+    def _memmap(self, file_name: str, shape: tuple) -> np.ndarray:
+        if np.prod(shape) == 0:  # memmap cannot map an empty file
+            return np.zeros(shape, dtype=DTYPE)
+        return np.memmap(os.path.join(self.path, file_name), dtype=DTYPE, mode="r", shape=shape)
+
+
+def save_solution_store(path: str, sol: SolutionTree, world_nodes) -> None:
+    """ Write the matches of a (not count_only) solution tree to a store at path """
+    with SolutionStoreWriter(path, sol.template_node_ordering, world_nodes, sol.world_classes) as writer:
+        writer.add_solution_tree(sol)
@@ -1,9 +1,10 @@
 """ by Tim Nguyen (7/17/19)
-*anytree library: https://anytree.readthedocs.io/en/2.6.0/index.html
 
 This is a solution tree for the subgraph isomorphism problem.
 Inherit from Graph. Given a fixed ordering of the template's nodes (equiv classes)
 A solution of the subgraph matching problem is a path of this tree from the root to a leaf
+The tree is a trie: the children of a node are indexed by their supernode, so adding a solution
+takes one dict lookup per level.
 We enumerate all the possible isomorphisms this way as well as provide an easy way
 to count the total number of isomorphisms.
 
@@ -14,7 +15,10 @@ Attribute:
 Queries:
 	- print_tree				(print the tree in a nicely formatted form)
 	- iterate_isomorphisms 		(return an iterator that gives ALL the valid matching)
+								(see find_isomorphisms.iter_isomorphisms to get them without building the tree)
 	- get_isomorphisms_count 	(return a number of total number of isomorphisms)
+								(with world_classes, each match also stands for its images under permutations
+								of the world classes. See world_equivalence)
 	- get_signal_nodes			(return a set of all nodes in the world graph participating in some signal)
 	- get_min_complete_cand_set	(return a dictionary of 
 									"supernode (equiv classes)": min complete cand set )
@@ -24,19 +28,50 @@ Methods:
 
 from .supernodes import Supernode, SuperTemplateNode
 from .partial_match import PartialMatch
-from anytree import Node, RenderTree, DoubleStyle 		# we use the anytree library for tree
+from .world_equivalence import WorldClasses
 import math 		# for factorial
 from uclasmcode.candidate_structure.logging_utils import log_solutions
 from scipy.special import comb  # for combinations
 
+# the style used to print the tree
+VERTICAL, CONTINUE, END = "\u2551   ", "\u2560\u2550\u2550 ", "\u255a\u2550\u2550 "
 
-class SolutionNode(Node):
+
+class SolutionNode(object):
 	""" A custome node for this problem """
+	__slots__ = ["supernode", "name", "parent", "_children"]
+
 	def __init__(self, sn: Supernode = None, parent=None, name=None):
 		self.supernode = sn
-		if name is None:
+		if name is None and sn.name is not None:
 			name = str(sn.name)
-		Node.__init__(self, name, parent, supernode=sn)
+		self.name = name  # None for the (unnamed) candidate nodes of the search: see SolutionTree.get_node_name
+		self._children = {}  # supernode: SolutionNode
+		self.parent = parent
+		if parent is not None:
+			parent._children[sn] = self
+
+	def get_child(self, sn: Supernode):
+		""" Returns the child with the given supernode or None if there is none """
+		return self._children.get(sn)
+
+	@property
+	def children(self) -> tuple:
+		return tuple(self._children.values())
+
+	@property
+	def is_leaf(self) -> bool:
+		return len(self._children) == 0
+
+	@property
+	def path(self) -> tuple:
+		""" The nodes from the root down to this node """
+		path = []
+		node = self
+		while node is not None:
+			path.append(node)
+			node = node.parent
+		return tuple(reversed(path))
 
 	def __hash__(self):
 		return hash(self.supernode)
@@ -52,29 +87,57 @@ class SolutionTree(object):
 	This class also provides queries to obtain other information about the solution space of related problems
 	"""
 
-	def __init__(self, ordering: [SuperTemplateNode], name_dict: {int: str} = None, count_only=False):
+	def __init__(
+			self, ordering: [SuperTemplateNode], name_dict: {int: str} = None, count_only=False,
+			world_classes: WorldClasses = None):
 		""" ordering specifies an ordering of the template nodes in form of a list
-		ideally should be to minimize the width of the tree """
+		ideally should be to minimize the width of the tree
+		world_classes: the world classes the search branched on (CandidateStructure.world_classes) """
 		self.root = SolutionNode(name="root") 	# this is the main tree
 		self.num_isomorphisms = 0 	# counter used to with add
 		# the dictionary below stores the nodes at the level matching the ordering
 		self.template_candidate_dict = {i: set() for i in ordering}
 		self.template_node_ordering = ordering
 		self.num_tmplt_nodes = len(self.template_node_ordering)
-		self.name_dict = name_dict  # this is world.node_idxs
+		self.name_dict = name_dict  # this is world.nodes: the names of the matched world nodes are only looked up here
 		self.count_only = count_only
 		self.match_count = 0
+		self.world_classes = world_classes
 
 	# ###### QUERIES #########
 	def print_tree(self):  # nice fancy function from library
 		pass
 
 	def iterate_isomorphisms(self):
-		pass
+		""" Yields the matches stored in the tree (root to leaf paths) as dicts from the template
+		supernodes to the matched world supernodes. Empty if count_only """
+		path = []
+		stack = [iter(self.root.children)]
+		while stack:
+			node = next(stack[-1], None)
+			if node is None:
+				stack.pop()
+				if path:
+					path.pop()
+				continue
+			path.append(node.supernode)
+			if len(path) == self.num_tmplt_nodes:
+				yield dict(zip(self.template_node_ordering, path))
+				path.pop()
+			else:
+				stack.append(iter(node.children))
 
 	def get_isomorphisms_count(self):
 		return self.num_isomorphisms
 
+	def get_node_name(self, node: SolutionNode) -> str:
+		""" The name of a node of the tree: that of its world nodes if the tree has the name_dict """
+		if node.name is not None:
+			return node.name
+		if self.name_dict is None:
+			return str(list(node.supernode.vertices))
+		return str([self.name_dict[i] for i in node.supernode.vertices])
+
 	def get_num_matches(self):
 		return self.match_count
 
@@ -103,6 +166,20 @@ class SolutionTree(object):
 		if not self.count_only:
 			self._append_to_tree(match_dict)
 
+	def merge(self, other: 'SolutionTree') -> None:
+		""" Add the solutions of other to this tree. The two trees must come from disjoint parts of the
+		search tree (e.g. the work units of a parallel search) so that no solution is counted twice """
+		if other.get_isomorphisms_count() == 0:
+			return
+		if self.get_isomorphisms_count() == 0:
+			self.set_ordering(other.template_node_ordering)
+		self.num_isomorphisms += other.num_isomorphisms
+		self.match_count += other.match_count
+		if self.count_only or other.count_only:
+			return
+		for match_dict in other.iterate_isomorphisms():
+			self._append_to_tree(match_dict)
+
 	# # PRIVATE
 	def _append_to_tree(self, match_dict: {SuperTemplateNode: Supernode}) -> None:
 		""" Given a match from template nodes to set of world node
@@ -115,24 +192,27 @@ class SolutionTree(object):
 			# given the hash is correct, we should add each match only once
 			self.template_candidate_dict[curr_tmplt_node].add(match)
 			# now we check if there's a child already on this path
-			child_flag = False
-			for child in prev_node.children:  # child is a SolutionNode(match)
-				if match == child.supernode:  # if it exists already
-					child_flag = True
-					prev_node = child  # we want to keep the same child for next layer
-					break
-			if not child_flag:  # if there's no child, create one and set it as that for next run
-				prev_node = SolutionNode(
-					match, name=str(match.name),
-					parent=prev_node)
+			child = prev_node.get_child(match)
+			if child is None:  # if there's no child, create one and set it as that for next run
+				child = SolutionNode(match, parent=prev_node)
+			prev_node = child  # we want to keep the same child for next layer
 
 	def _increase_counter(self, match_dict: {Supernode: set}) -> None:
 		""" Given a matching in a form of dictionary, we increase the isomorphism count appropriately"""
-		temp = 1
 		self.match_count += 1
+		self.num_isomorphisms += self.count_isomorphisms(match_dict, self.world_classes)
+
+	@staticmethod
+	def count_isomorphisms(match_dict: {Supernode: set}, world_classes: WorldClasses = None) -> float:
+		""" The number of isomorphisms a (compressed) match stands for: each supernode can be mapped to any
+		subset of its match of the right size, in any order.
+		If the match was found by branching on world_classes, see WorldClasses.count_isomorphisms instead """
+		if world_classes is not None:
+			return world_classes.count_isomorphisms(match_dict)
+		temp = 1
 		for sn, matches in match_dict.items():
 			temp *= math.factorial(len(sn))*comb(len(matches), len(sn))
-		self.num_isomorphisms += temp
+		return temp
 
 	# ### UTILITIES
 
@@ -144,10 +224,25 @@ class SolutionTree(object):
 			return "UNSATISFIABLE PROBLEM: NO ISOMORPHISM FOUND."
 		result = f"ISOMORPHISM COUNT: {self.get_isomorphisms_count()}. TEMPLATE NODES ORDER:\n"
 		result += str([str(i.name) for i in self.template_node_ordering]) + "\n"
-		for pre, _, node in RenderTree(self.root, style=DoubleStyle):
-			result += ("%s%s\n" % (pre, node.name))
+		for pre, node in self._render():
+			result += ("%s%s\n" % (pre, self.get_node_name(node)))
 		return result
 
+	def _render(self):
+		""" Yields (prefix, node) for printing each line of the tree """
+		yield "", self.root
+		stack = [("", iter(self.root.children), len(self.root._children))]
+		while stack:
+			indent, children, num_left = stack[-1]
+			node = next(children, None)
+			if node is None:
+				stack.pop()
+				continue
+			is_last = num_left == 1
+			stack[-1] = (indent, children, num_left - 1)
+			yield indent + (END if is_last else CONTINUE), node
+			stack.append((indent + (" " * len(END) if is_last else VERTICAL), iter(node.children), len(node._children)))
+
 	def __repr__(self):
 		""" Returns the num_isomorphisms, template_candidate_dict, and
 		template_node_ordering"""
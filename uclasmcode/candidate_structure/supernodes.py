@@ -6,19 +6,21 @@
 class Supernode(object):
     """An object to hold equivalent classes and sets of nodes
     for other data structure. Special is that it sorts the equiv_class
-    into a tuple for hashing and comparing if we store supernodes in a dictionary/set for example"""
+    into a tuple for hashing and comparing if we store supernodes in a dictionary/set for example.
+    The search only ever uses the (int) vertices: the candidate nodes it makes have no name, which is
+    resolved from the vertices when the results are printed (see SolutionTree)"""
+    __slots__ = ["vertices", "name"]
 
     channels = []  # class attribute: a list of channels. Initialized in main
 
-    def __init__(self, equiv_class: list or set or tuple, name: [str]):
-        """ Note that equiv_class should be either a set, list or tuple
+    def __init__(self, equiv_class: list or set or tuple or int, name: [str] = None):
+        """ Note that equiv_class should be either a set, list, tuple (or array) of ints or a single int
         We use a sorted tuple for hashing and comparing """
-        assert name is not None, "must pass in a name field!!!"
         try:
-            self.vertices = tuple(sorted(equiv_class))  # for ease of comparing
-        except TypeError:  # maybe better checks here
-            self.vertices = tuple([equiv_class])
-        self.name = name  # ideally the tuple with the real name
+            self.vertices = tuple(sorted(int(v) for v in equiv_class))  # for ease of comparing
+        except TypeError:  # a single vertex
+            self.vertices = (int(equiv_class),)
+        self.name = name  # ideally the tuple with the real name (None for the candidate nodes of the search)
 
     def get_vertices(self) -> tuple:
         """ returns a tuple of vertices of the equiv class of the supernode"""
@@ -43,17 +45,29 @@ class Supernode(object):
     def __ne__(self, other) -> bool:
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for cls in type(self).__mro__ for slot in getattr(cls, "__slots__", [])}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():  # also the __dict__ of supernodes pickled before __slots__
+            setattr(self, slot, value)
+
+    def get_name(self):
+        """ The name if there is one, otherwise the vertices """
+        return self.vertices if self.name is None else self.name
+
     def __str__(self):
-        return f"Supernode({self.name})"
+        return f"Supernode({self.get_name()})"
 
     def __repr__(self):
-        return f"Supernode{self.name} with Vertices: {self.vertices}"
+        return f"Supernode{self.get_name()} with Vertices: {self.vertices}"
 
 
 class SuperTemplateNode(Supernode):
     """ A class to contain information about the super template nodes
     Each node is an equivalent class and contains additional information
     about clique and connectivity """
+    __slots__ = ["clique_dict", "_root"]
 
     def __init__(
             self, equiv_class: set or tuple or int,
@@ -88,7 +102,7 @@ class SuperTemplateNode(Supernode):
         return len(self) == 1  # is equivalent to checking self.clique_dict is None
 
     def __str__(self):
-        return f"SuperTemplateNode{self.name}"
+        return f"SuperTemplateNode{self.get_name()}"
 
     def __repr__(self):
-        return f"SuperTemplateNode{self.name} with cliques: {str(self.clique_dict)}"
+        return f"SuperTemplateNode{self.get_name()} with cliques: {str(self.clique_dict)}"
@@ -0,0 +1,241 @@
+""" Work-stealing parallel search.
+
+Splitting the top levels of the search tree up front (parallel_find_isomorphisms) balances badly when one
+subtree dominates. Here every worker process runs its own SearchEngine, whose explicit stack of frames
+
+    frame = (supernode, iterator over the unexplored (cand, branch) pairs of that supernode, trail mark)
+
+can be split at any time. When a worker is idle it announces it and waits on the task queue. Busy workers check
+for idle ones every CHECK_INTERVAL search nodes and, if there are any, donate half of the unexplored siblings of
+their shallowest frame that has some left (the largest subtrees they hold). Such a task is compact:
+
+    (partial match, candidate delta, supernode root, siblings)
+
+- partial match: the (template root, world vertices) pairs matched above the frame
+- candidate delta: the candidates removed at the frame, as the (rows, cols) of CandidateStructure.get_changes
+- siblings: the (cand, branch) world vertices not yet explored at the frame
+
+so the thief neither replays the filters above the frame nor recomputes its candidates.
+Per-worker busy time, number of tasks, donations and search nodes are collected in WorkerStats.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from itertools import chain, islice
+
+from .find_isomorphisms import SearchEngine, SearchFrame, ORDERING_SCORING
+from .candidate_structure import CandidateStructure
+from .solution_tree import SolutionTree
+from .match_subgraph_utils import Ordering
+from .logging_utils import print_info
+import uclasmcode.candidate_structure.logging_utils as simple_utils
+
+# number of search nodes between two checks for idle workers
+CHECK_INTERVAL = 64
+# at most this many siblings are looked at (and half of them donated) at a time
+MAX_DONATED_SIBLINGS = 1024
+# how long an idle worker waits on the task queue before checking whether the search is over
+IDLE_POLL_INTERVAL = 0.01
+
+
+class WorkerStats(object):
+    """ What one worker process did during the search """
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.busy_time = 0.
+        self.total_time = 0.
+        self.num_tasks = 0
+        self.num_donated = 0  # tasks given away to idle workers
+        self.num_nodes = 0  # search nodes expanded
+
+    @property
+    def utilization(self) -> float:
+        return self.busy_time / self.total_time if self.total_time > 0 else 0.
+
+    def __str__(self):
+        return f"worker {self.worker_id}: utilization={self.utilization:.1%} busy={self.busy_time:.2f}s " \
+               f"tasks={self.num_tasks} donated={self.num_donated} nodes={self.num_nodes}"
+
+
+class _Shared(object):
+    """ The queues, counters and events shared by the workers """
+
+    def __init__(self, ctx):
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.num_idle = ctx.Value('i', 0)
+        self.num_queued = ctx.Value('i', 0)  # tasks put on the queue and not yet taken
+        self.num_pending = ctx.Value('i', 0)  # tasks put on the queue and not yet finished
+        self.done = ctx.Event()
+        self.stop_event = ctx.Event()
+        self.iso_count = ctx.Value('d', 0.)
+
+    def put_task(self, task) -> None:
+        with self.num_pending.get_lock():
+            self.num_pending.value += 1
+        with self.num_queued.get_lock():
+            self.num_queued.value += 1
+        self.tasks.put(task)
+
+    def get_task(self, timeout: float):
+        task = self.tasks.get(timeout=timeout)
+        with self.num_queued.get_lock():
+            self.num_queued.value -= 1
+        return task
+
+    def finish_task(self) -> None:
+        with self.num_pending.get_lock():
+            self.num_pending.value -= 1
+            if self.num_pending.value == 0:
+                self.done.set()
+
+    def is_over(self) -> bool:
+        return self.done.is_set() or self.stop_event.is_set()
+
+
+class _Worker(object):
+    """ Runs tasks with its own SearchEngine """
+
+    def __init__(self, worker_id: int, engine: SearchEngine, shared: _Shared):
+        self.shared = shared
+        self.engine = engine
+        self.stats = WorkerStats(worker_id)
+
+    def run(self) -> None:
+        st = time.time()
+        shared = self.shared
+        while not shared.is_over():
+            try:
+                task = shared.get_task(timeout=0)
+            except queue.Empty:
+                task = self._wait_for_task()
+                if task is None:
+                    break
+            st_task = time.time()
+            self._run_task(*task)
+            self.stats.busy_time += time.time() - st_task
+            self.stats.num_tasks += 1
+            shared.finish_task()
+        self.stats.total_time = time.time() - st
+        self.stats.num_nodes = self.engine.num_nodes
+        self.shared.results.put((self.engine.solution, self.stats, self.engine.total_filter_time))
+
+    def _wait_for_task(self):
+        shared = self.shared
+        with shared.num_idle.get_lock():
+            shared.num_idle.value += 1
+        try:
+            while not shared.is_over():
+                try:
+                    return shared.get_task(timeout=IDLE_POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return None
+        finally:
+            with shared.num_idle.get_lock():
+                shared.num_idle.value -= 1
+
+    def _run_task(self, prefix: tuple, changes, root, siblings) -> None:
+        engine = self.engine
+        if root is None:  # the whole search
+            engine.start(prefix)
+        else:
+            engine.reset()
+            cs = engine.cs
+            cs.apply_changes(changes)
+            for sn_root, cand_idxs in prefix:
+                engine.pm.add_match(cs.get_supernode_by_idx(sn_root), cs.get_cand_node_from_idxs(cand_idxs))
+            engine.base = len(engine.pm)
+            branches = ((cs.get_cand_node_from_idxs(cand), cs.get_cand_node_from_idxs(branch))
+                        for cand, branch in siblings)
+            engine.stack.append(SearchFrame(cs.get_supernode_by_idx(root), branches, cs.mark_changes()))
+        while engine.step():
+            if engine.num_nodes % CHECK_INTERVAL == 0 and \
+                    self.shared.num_idle.value > self.shared.num_queued.value:
+                self._donate()
+        engine.reset()
+
+    def _donate(self) -> None:
+        """ Give half of the unexplored siblings of the shallowest frame that has some to an idle worker """
+        engine = self.engine
+        for depth, frame in enumerate(engine.stack):
+            siblings = list(islice(frame.branches, MAX_DONATED_SIBLINGS))
+            if len(siblings) == 0:
+                continue
+            kept, donated = siblings[:len(siblings) // 2], siblings[len(siblings) // 2:]
+            frame.branches = chain(kept, frame.branches)
+            self.shared.put_task((
+                engine.get_prefix(depth), engine.cs.get_changes(frame.mark), frame.supernode.get_root(),
+                [(cand.vertices, branch.vertices) for cand, branch in donated]))
+            self.stats.num_donated += 1
+            return
+
+
+def _run_worker(worker_id, candstruct, shared, count_only, cap_iso, verbose, debug, filter_verbose, ordering):
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    # tasks left on the queue after a stop are dropped rather than blocking the exit
+    shared.tasks.cancel_join_thread()
+    engine = SearchEngine(
+        candstruct, filter_verbose=filter_verbose, cap_iso=cap_iso,
+        stop_event=shared.stop_event, shared_iso_count=shared.iso_count, ordering=ordering)
+    # without the world node names: the tree is sent back to the main process
+    engine.solution = SolutionTree(
+        engine.ordering.initial_ordering, count_only=count_only, world_classes=candstruct.world_classes)
+    _Worker(worker_id, engine, shared).run()
+
+
+def work_stealing_find_isomorphisms(
+        candstruct: CandidateStructure, num_workers=None, verbose=True, debug=True, count_only=False,
+        filter_verbose=False, cap_iso=None, timeout=None, cap_matches=None, return_stats=False,
+        ordering=ORDERING_SCORING):
+    """ Same as find_isomorphisms but searched by num_workers processes (default: the number of cpus) that
+    share the work as it is discovered. Options are the same as in find_isomorphisms and:
+    - return_stats: also return the list of the WorkerStats of each worker
+    The solution tree has the same solutions as the sequential search but its branches may be in another order
+    """
+    simple_utils.VERBOSE = verbose
+    simple_utils.DEBUG = debug
+    if num_workers is None:
+        num_workers = os.cpu_count()
+
+    print_info(f"======= BEGINNING WORK-STEALING FIND_ISOMORPHISM ({num_workers} workers) =====")
+    sol = SolutionTree(
+        Ordering(candstruct).initial_ordering, candstruct.world_graph.nodes, count_only=count_only,
+        world_classes=candstruct.world_classes)
+    ctx = multiprocessing.get_context()
+    shared = _Shared(ctx)
+    shared.put_task(((), None, None, None))  # the root of the search tree
+    workers = [
+        ctx.Process(target=_run_worker, args=(
+            i, candstruct, shared, count_only, cap_iso, verbose, debug, filter_verbose, ordering))
+        for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, shared.stop_event.set)
+        timer.daemon = True
+        timer.start()
+
+    results = [shared.results.get() for i in range(num_workers)]
+    for worker in workers:
+        worker.join()
+    if timer is not None:
+        timer.cancel()
+    all_stats = []
+    total_filter_time = 0
+    for worker_sol, stats, filter_time in sorted(results, key=lambda result: result[1].worker_id):
+        sol.merge(worker_sol)
+        all_stats.append(stats)
+        total_filter_time += filter_time
+        print_info(str(stats))
+    print_info(f"- Total filter time (summed over workers): {total_filter_time}s")
+    print_info(f"====== Finished work-stealing subgraph matching. Returning solution tree. =====")
+    if return_stats:
+        return sol, all_stats
+    return sol
@@ -0,0 +1,91 @@
+""" Structural equivalence classes of the world graph (see CandidateStructure.compress_world).
+
+Two world nodes are in the same class iff they are structurally equivalent in every channel (see
+equivalence_partition.hashing_partition) and are candidates for the same template nodes. Swapping any two nodes
+of a class is then an automorphism of the world that leaves the candidates unchanged, so the nodes of a class
+that are not in the partial match are interchangeable for the rest of the search. The world is never rebuilt:
+the search branches on the quotient world graph, only ever trying the smallest unused node(s) of each class
+(get_canonical_candidates), and a match stands for all its images under permutations of the classes.
+
+The classes also refine the candidate equivalence of the search, so the candidates of a supernode are partitioned
+by comparing one node per class (partition_candidates). A match can then mix both kinds of branches: see
+count_isomorphisms for how its count is expanded.
+"""
+
+import math
+from collections import Counter
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from uclasmcode.equivalence_partition.hashing_partition import partition_labels
+from .supernodes import Supernode
+
+
+class WorldClasses(object):
+    """ A partition of the world nodes into classes of interchangeable nodes """
+
+    def __init__(self, labels: np.ndarray):
+        """ labels: the class of each world node (from 0 to #classes - 1) """
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.sizes = np.bincount(self.labels)
+
+    @classmethod
+    def from_graph(cls, world, candidates: np.ndarray) -> 'WorldClasses':
+        """ Partition the nodes of the world graph given the (#TemplateNode, #WorldNodes) candidates array """
+        labels = [partition_labels(adj) for adj in world.ch_to_adj.values()]
+        # split the classes by candidates too: the nodes of a class must be candidates for the same template nodes
+        columns = np.concatenate([np.stack(labels), candidates.astype(np.int64)]) if labels else candidates
+        _, labels = np.unique(columns.T, axis=0, return_inverse=True)
+        return cls(labels.reshape(-1))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def get_compression(self) -> float:
+        """ 1 - #classes / #world nodes """
+        return 1 - len(self.sizes) / len(self.labels)
+
+    def get_canonical_candidates(self, cand_idxs: [int], size: int):
+        """ Yields the sets (as sorted lists) of size world nodes the search has to try for a supernode of that size
+        given its unused candidates cand_idxs: for each way of choosing how many nodes to take from each class,
+        the smallest candidates of the class """
+        class_nodes = self._group(cand_idxs)
+        for choice in combinations_with_replacement(list(class_nodes), size):
+            counts = Counter(choice)
+            if all(count <= len(class_nodes[label]) for label, count in counts.items()):
+                yield sorted(v for label, count in counts.items() for v in class_nodes[label][:count])
+
+    def partition_candidates(self, cand_idxs: [int], partition, *args) -> [{int}]:
+        """ Partition the unused candidates cand_idxs with partition(nodes, *args) -> [{int}] (e.g.
+        CandidateStructure.partition_candidates), which must put the unused candidates of a same class together:
+        only one node per class is partitioned """
+        class_nodes = self._group(cand_idxs)
+        rep_classes = partition([nodes[0] for nodes in class_nodes.values()], *args)
+        return [{v for rep in rep_class for v in class_nodes[self.labels[rep]]} for rep_class in rep_classes]
+
+    def count_isomorphisms(self, match_dict: {Supernode: Supernode}) -> int:
+        """ The number of isomorphisms a match found with these classes stands for. A supernode of size s is
+        matched either to canonical candidates or to a whole class of candidates (of size k >= s), which stands
+        for its s! * comb(k, s) ordered subsets. On top of that, the m nodes of a world class of size c used by the
+        match can be relabeled in c! / (c - m)! ways, up to the orders of the nodes a supernode takes from the
+        same class. (A class of candidates has every unused node of the world classes it meets, so these are
+        relabeled within it and counted once) """
+        count = 1
+        relabelings = 1  # orders counted twice
+        used = Counter()
+        for sn, match in match_dict.items():
+            count *= math.factorial(len(sn)) * math.comb(len(match), len(sn))
+            for label, num in Counter(self.labels[v] for v in match.vertices).items():
+                relabelings *= math.factorial(num)
+                used[label] += num
+        for label, num in used.items():
+            count *= math.perm(int(self.sizes[label]), num)
+        return count // relabelings
+
+    def _group(self, idxs: [int]) -> {int: [int]}:
+        """ label: nodes of idxs in the class, in increasing order. Classes are ordered by their smallest node """
+        class_nodes = {}
+        for v in sorted(idxs):
+            class_nodes.setdefault(self.labels[v], []).append(v)
+        return class_nodes
@@ -1,3 +1,5 @@
 from .equivalence_data_structure import *
+from .array_equivalence import *
 from .multichannel_structural_equivalence import *
 from .partition_equivalence_vertices import *
+from .hashing_partition import *
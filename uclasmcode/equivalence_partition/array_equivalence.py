@@ -0,0 +1,212 @@
+""" The Equivalence data structure backed by NumPy arrays, for elements that are indices (non-negative ints)
+such as the vertices of a graph.
+
+The union-find forest is an int array of parents (-1 for the indices that are not elements) with an array of
+the sizes of the trees at their roots. Once the partition is done, the root of every element is computed at once
+by pointer jumping and kept as a vector of labels, so that compress_to_root and in_same_class are a single lookup
+and classes()/non_trivial_classes() are sorts of that vector. Merging invalidates the labels: the queries then
+fall back to path compression until they are computed again.
+"""
+
+import numpy as np
+
+
+class ArrayEquivalence(object):
+    """ Same interface as Equivalence (see there) for elements 0 <= v < n.
+    The classes are always listed in the order of their smallest element """
+
+    def __init__(self, starting_set):
+        """ starting_set is a set (or any iterable) of indices to start with """
+        elements = np.fromiter(starting_set, dtype=np.int64)
+        n = int(elements.max()) + 1 if len(elements) > 0 else 0
+        self.parent = np.full(n, -1, dtype=np.int64)  # -1 for the indices that are not elements
+        self.parent[elements] = elements
+        self.size = np.zeros(n, dtype=np.int64)  # the size of the tree of each root (0 for the other indices)
+        self.size[elements] = 1
+        self._labels = None  # the root of each element (-1 for the other indices) if up to date
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray, vertices=None) -> 'ArrayEquivalence':
+        """ The partition of the vertices (default all the indices of labels) with a class per label.
+        The root of a class is its smallest element """
+        labels = np.asarray(labels)
+        vertices = np.arange(len(labels)) if vertices is None else np.unique(np.fromiter(vertices, dtype=np.int64))
+        result = cls(())
+        n = int(vertices[-1]) + 1 if len(vertices) > 0 else 0
+        result.parent = np.full(n, -1, dtype=np.int64)
+        result.size = np.zeros(n, dtype=np.int64)
+        # vertices is sorted so the first occurrence of each label is the smallest element of its class
+        _, first, inverse = np.unique(labels[vertices], return_index=True, return_inverse=True)
+        roots = vertices[first]
+        result.parent[vertices] = roots[inverse.reshape(-1)]
+        result.size[roots] = np.bincount(inverse.reshape(-1))
+        result._labels = result.parent.copy()
+        return result
+
+    @classmethod
+    def from_equivalence(cls, equiv) -> 'ArrayEquivalence':
+        """ The same partition (with the same roots) as an Equivalence of indices """
+        if isinstance(equiv, ArrayEquivalence):
+            return equiv
+        result = cls(equiv.parent_map)
+        for v in equiv.parent_map:
+            result.parent[v] = equiv.compress_to_root(v)
+        result.size[:] = 0
+        for root, size in equiv.root_size_map.items():
+            result.size[root] = size
+        result._labels = result.parent.copy()
+        return result
+
+    # ## METHODS ###
+    def add_singleton(self, new_value):
+        """ add a new value as its own equiv class"""
+        assert not self._is_element(new_value), \
+            "ArrayEquivalence.add_singleton: " + str(new_value) + " is already in the equiv class!"
+        if new_value >= len(self.parent):
+            grown = np.full(new_value + 1, -1, dtype=np.int64)
+            grown[:len(self.parent)] = self.parent
+            self.parent = grown
+            self.size = np.concatenate([self.size, np.zeros(new_value + 1 - len(self.size), dtype=np.int64)])
+        self.parent[new_value] = new_value
+        self.size[new_value] = 1
+        self._labels = None
+
+    def merge_classes_of(self, a, b):
+        """ merge the equivalence classes of a and b together (union by size) """
+        assert self._is_element(a), "ArrayEquivalence.merge_classes_of: Value " + str(a) + " does not exist."
+        assert self._is_element(b), "ArrayEquivalence.merge_classes_of: Value " + str(b) + " does not exist."
+        root_of_a = self.compress_to_root(a)
+        root_of_b = self.compress_to_root(b)
+        if root_of_a == root_of_b:
+            return  # they are already in the same equivalence class
+        small_root, big_root = (root_of_a, root_of_b) if self.size[root_of_a] < self.size[root_of_b] \
+            else (root_of_b, root_of_a)
+        self.parent[small_root] = big_root
+        self.size[big_root] += self.size[small_root]
+        self.size[small_root] = 0
+        self._labels = None
+
+    def merge_set(self, set_to_merge):
+        """ given a set of elements in ArrayEquivalence, merge them together """
+        one_elem = next(iter(set_to_merge))
+        for a in set_to_merge:
+            self.merge_classes_of(one_elem, a)
+
+    def partition(self, equivalence_relation: 'function', *args, **kwargs) -> [set]:
+        """ Same as Equivalence.partition. The labels are up to date afterwards """
+        classes = []
+        for i in self.get_roots().tolist():
+            for c in classes:
+                if equivalence_relation(next(iter(c)), i, *args, **kwargs):
+                    c.add(i)
+                    break
+            else:  # new class
+                classes.append({i})
+        for c in classes:
+            self.merge_set(c)
+        _ = self.labels
+        return classes
+
+    # ## QUERIES ###
+    @property
+    def labels(self) -> np.ndarray:
+        """ The root of every index (-1 for those that are not elements), computed at once by pointer jumping.
+        Do not modify """
+        if self._labels is None:
+            parent = self.parent
+            is_element = parent >= 0
+            while True:
+                grandparent = np.where(is_element, parent[np.maximum(parent, 0)], -1)
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+            self.parent = parent  # fully compressed
+            self._labels = parent.copy()
+        return self._labels
+
+    @property
+    def parent_map(self) -> {int: int}:
+        """ The parent of each element, as in Equivalence (a copy) """
+        elements = self.get_elements()
+        return dict(zip(elements.tolist(), self.parent[elements].tolist()))
+
+    @property
+    def root_size_map(self) -> {int: int}:
+        """ The size of the class of each root, as in Equivalence (a copy) """
+        roots = self.get_roots()
+        return dict(zip(roots.tolist(), self.size[roots].tolist()))
+
+    def get_elements(self) -> np.ndarray:
+        """ The elements in increasing order """
+        return np.flatnonzero(self.parent >= 0)
+
+    def get_roots(self) -> np.ndarray:
+        """ The roots in increasing order """
+        return np.flatnonzero(self.size > 0)
+
+    def in_same_class(self, a, b) -> bool:
+        """ return a bool indicating if a and b are in the same classes """
+        assert self._is_element(a), "ArrayEquivalence.in_same_class: " + str(a) + " does not exist."
+        assert self._is_element(b), "ArrayEquivalence.in_same_class: " + str(b) + " does not exist."
+        return self.compress_to_root(a) == self.compress_to_root(b)
+
+    def __len__(self):
+        """ returns the number of elements in the equiv class"""
+        return int(np.count_nonzero(self.parent >= 0))
+
+    def class_count(self):
+        """ return the number of unique equiv classes"""
+        return int(np.count_nonzero(self.size))
+
+    def classes(self) -> [{int}]:
+        """ returns a list of sets of equivalence classes """
+        return self._get_classes(min_size=1)
+
+    def non_trivial_classes(self) -> [{int}]:
+        """ returns a list of sets of non-trivial (>1) equivalence classes """
+        return self._get_classes(min_size=2)
+
+    def __str__(self):
+        """ print out the equiv classes """
+        return "Equiv Classes: " + str(self.classes()) + "\nParent_map: " + str(self.parent_map) \
+            + "\nRoot_size_map: " + str(self.root_size_map)
+
+    def __repr__(self):
+        return f"#classes/#vertices={self.class_count()}/{len(self)}. " \
+            f"Non-triv classes size: {[len(i) for i in self.non_trivial_classes()]}"
+
+    def get_equiv_size(self, node):
+        return int(self.size[self.compress_to_root(node)])
+
+    def compress_to_root(self, a) -> int:
+        """ returns the root of a (and compresses the path to it if the labels are not up to date) """
+        assert self._is_element(a), "ArrayEquivalence.compress_to_root: " + str(a) + " does not exist."
+        if self._labels is not None:
+            return int(self._labels[a])
+        path = []
+        root = a
+        while self.parent[root] != root:
+            path.append(root)
+            root = self.parent[root]
+        self.parent[path] = root
+        return int(root)
+
+    def get_all_roots(self) -> {int}:
+        """ Return all the roots of the equiv classes"""
+        return set(self.get_roots().tolist())
+
+    def _is_element(self, a) -> bool:
+        return 0 <= a < len(self.parent) and self.parent[a] >= 0
+
+    def _get_classes(self, min_size: int) -> [{int}]:
+        """ The classes with at least min_size elements, in the order of their smallest element """
+        elements = self.get_elements()
+        labels = self.labels[elements]
+        elements = elements[self.size[labels] >= min_size]
+        labels = self.labels[elements]
+        order = np.argsort(labels, kind="stable")  # the elements of each class stay in increasing order
+        elements, labels = elements[order], labels[order]
+        bounds = np.flatnonzero(np.diff(labels)) + 1
+        classes = np.split(elements, bounds) if len(elements) > 0 else []
+        classes.sort(key=lambda c: c[0])
+        return [set(c.tolist()) for c in classes]
@@ -0,0 +1,159 @@
+""" Structural equivalence partition by hashing, for graphs too large for partition_vertices.
+
+Two vertices x != y are structurally equivalent in a channel with adjacency matrix A (see permutation_relation)
+iff A[x, x] == A[y, y], A[x, y] == A[y, x] == c and their rows and columns agree outside of x and y.
+Writing R(v) for the set of (u, A[v, u]) with u != v and A[v, u] != 0 (and C(v) for the columns), that is:
+    - c == 0: R(x) == R(y) and C(x) == C(y)
+    - c != 0: R(x) + (x, c) == R(y) + (y, c) and C(x) + (x, c) == C(y) + (y, c)
+So every vertex gets one key for c == 0 and one for each value c of its reciprocated entries, and equivalent
+vertices are exactly those sharing a key. Keys are hashed with order independent sums of splitmix64 hashes of
+the (u, A[v, u]) pairs, computed directly on the CSR matrices, and vertices are grouped by hash. The relation is
+then verified exactly inside each group, so hash collisions can never merge vertices that are not equivalent.
+
+Channels are combined by grouping the vertices on the tuple of their classes in each channel, as in
+combine_channel_equivalence.
+"""
+
+import numpy as np
+import scipy.sparse as sparse
+
+from .array_equivalence import ArrayEquivalence
+
+# seeds making the hashes of row entries, column entries and the diagonal independent
+_ROW_SEED = np.uint64(0x243F6A8885A308D3)
+_COL_SEED = np.uint64(0x13198A2E03707344)
+_DIAG_SEED = np.uint64(0xA4093822299F31D0)
+
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+    """ The splitmix64 finalizer applied elementwise to a uint64 array """
+    with np.errstate(over="ignore"):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _hash_entries(idxs: np.ndarray, values: np.ndarray, seed: np.uint64) -> np.ndarray:
+    """ Hash of each (index, value) pair """
+    value_bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    return splitmix64(splitmix64(idxs.astype(np.uint64) ^ seed) ^ value_bits)
+
+
+def _row_sums(matrix: sparse.csr_matrix, hashes: np.ndarray) -> np.ndarray:
+    """ Sum (mod 2**64) of the hashes of the entries of each row of a CSR matrix """
+    sums = np.zeros(matrix.shape[0], dtype=np.uint64)
+    starts = matrix.indptr[:-1]
+    nonempty = starts < matrix.indptr[1:]
+    if len(hashes) > 0:
+        sums[nonempty] = np.add.reduceat(hashes, starts[nonempty])
+    return sums
+
+
+def _off_diagonal(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    matrix = matrix.tocoo()
+    keep = (matrix.row != matrix.col) & (matrix.data != 0)
+    return sparse.csr_matrix(
+        (matrix.data[keep], (matrix.row[keep], matrix.col[keep])), shape=matrix.shape)
+
+
+def _reciprocated_entries(adj: sparse.csr_matrix) -> (np.ndarray, np.ndarray):
+    """ The (v, c) pairs such that A[v, u] == A[u, v] == c != 0 for some u != v """
+    coo = adj.tocoo()
+    n = np.int64(adj.shape[0])
+    keys = coo.row.astype(np.int64) * n + coo.col
+    order = np.argsort(keys)
+    keys, values = keys[order], coo.data[order]
+    rows = coo.row[order]
+    reverse_keys = coo.col[order].astype(np.int64) * n + rows
+    pos = np.minimum(np.searchsorted(keys, reverse_keys), len(keys) - 1)
+    is_reciprocated = (keys[pos] == reverse_keys) & (values[pos] == values)
+    pairs = np.unique(np.stack([rows[is_reciprocated], values[is_reciprocated]], axis=1), axis=0)
+    return pairs[:, 0].astype(np.int64), pairs[:, 1]
+
+
+def _same_structure(adj, adj_t, x: int, y: int) -> bool:
+    """ permutation_relation on CSR matrices (adj_t is the CSR of the transpose) """
+    if x == y:
+        return True
+    if adj[x, x] != adj[y, y] or adj[x, y] != adj[y, x]:
+        return False
+    for matrix in (adj, adj_t):
+        entries = []
+        for v in (x, y):
+            start, end = matrix.indptr[v], matrix.indptr[v + 1]
+            idxs, values = matrix.indices[start:end], matrix.data[start:end]
+            keep = (idxs != x) & (idxs != y) & (values != 0)
+            order = np.argsort(idxs[keep])
+            entries.append((idxs[keep][order], values[keep][order]))
+        (x_idxs, x_values), (y_idxs, y_values) = entries
+        if not (np.array_equal(x_idxs, y_idxs) and np.array_equal(x_values, y_values)):
+            return False
+    return True
+
+
+def partition_labels(adj, vertices=None) -> np.ndarray:
+    """ Returns an array of class labels for the vertices of a single channel adjacency matrix (dense or sparse):
+    two vertices have the same label iff they are structurally equivalent. Only the given vertices (default all)
+    are partitioned; the others get the label -1 """
+    adj = sparse.csr_matrix(adj)
+    adj.sum_duplicates()
+    n = adj.shape[0]
+    assert adj.shape[0] == adj.shape[1], "partition_labels: Input matrix must be square!"
+    adj_t = adj.T.tocsr()
+    off_diag, off_diag_t = _off_diagonal(adj), _off_diagonal(adj_t)
+    row_hash = _row_sums(off_diag, _hash_entries(off_diag.indices, off_diag.data, _ROW_SEED))
+    col_hash = _row_sums(off_diag_t, _hash_entries(off_diag_t.indices, off_diag_t.data, _COL_SEED))
+    diag_hash = _hash_entries(np.zeros(n, dtype=np.int64), adj.diagonal(), _DIAG_SEED)
+    is_partitioned = np.ones(n, dtype=np.bool_) if vertices is None else np.isin(np.arange(n), list(vertices))
+
+    # one key per vertex with c == 0 and one per reciprocated value c
+    rec_vertices, rec_values = _reciprocated_entries(off_diag)
+    key_vertices = np.concatenate([np.arange(n), rec_vertices])
+    key_values = np.concatenate([np.zeros(n), rec_values])
+    with np.errstate(over="ignore"):
+        self_hash = np.where(
+            key_values == 0, np.uint64(0), _hash_entries(key_vertices, key_values, _ROW_SEED))
+        self_hash_t = np.where(
+            key_values == 0, np.uint64(0), _hash_entries(key_vertices, key_values, _COL_SEED))
+        key_hash = splitmix64(row_hash[key_vertices] + self_hash) ^ \
+            splitmix64(col_hash[key_vertices] + self_hash_t + _COL_SEED) ^ diag_hash[key_vertices]
+    keep = is_partitioned[key_vertices]
+    key_vertices, key_values, key_hash = key_vertices[keep], key_values[keep], key_hash[keep]
+
+    # group the keys by (c, hash) and merge the vertices that verify the relation exactly
+    equiv = ArrayEquivalence(np.flatnonzero(is_partitioned))
+    order = np.lexsort((key_vertices, key_hash, key_values))
+    key_vertices, key_values, key_hash = key_vertices[order], key_values[order], key_hash[order]
+    is_new_group = np.ones(len(order), dtype=np.bool_)
+    is_new_group[1:] = (key_hash[1:] != key_hash[:-1]) | (key_values[1:] != key_values[:-1])
+    bounds = np.append(np.flatnonzero(is_new_group), len(order))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end - start < 2:
+            continue
+        group = key_vertices[start:end].tolist()
+        # nearly always a single class, but collisions are split off against representatives
+        representatives = []
+        for v in group:
+            for rep in representatives:
+                if equiv.in_same_class(rep, v) or _same_structure(adj, adj_t, rep, v):
+                    equiv.merge_classes_of(rep, v)
+                    break
+            else:
+                representatives.append(v)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    labels[:len(equiv.labels)] = equiv.labels
+    return labels
+
+
+def partition_vertices_hashing(adj, vertices=None) -> ArrayEquivalence:
+    """ Same as partition_vertices but by hashing (see module docstring). adj can be sparse """
+    return ArrayEquivalence.from_labels(partition_labels(adj, vertices), vertices)
+
+
+def partition_multichannel_hashing(ch_to_adj, vertices=None) -> ArrayEquivalence:
+    """ Same as partition_multichannel but by hashing, directly on the sparse matrices (see module docstring)"""
+    labels = np.stack([partition_labels(adj, vertices) for adj in ch_to_adj.values()], axis=1)
+    _, combined = np.unique(labels, axis=0, return_inverse=True)
+    return ArrayEquivalence.from_labels(combined.reshape(-1), vertices)
@@ -3,6 +3,9 @@
     by TimNg
     Last Update: 7/10/19"""
 
+import numpy as np
+
+from .array_equivalence import ArrayEquivalence
 from .equivalence_data_structure import Equivalence
 from .partition_equivalence_vertices import partition_vertices # this is for 1 channel
 
@@ -28,13 +31,18 @@ def combine_channel_equivalence(equiv_partition_dict):
             of sets of vertices in the same equiv classes for all channel
     """
     one_partition = next(iter(equiv_partition_dict.values()))
+    if all(isinstance(equiv, ArrayEquivalence) for equiv in equiv_partition_dict.values()):
+        # the classes are the distinct tuples of the labels of the vertices in each channel
+        labels = np.stack([equiv.labels for equiv in equiv_partition_dict.values()], axis=1)
+        _, combined = np.unique(labels, axis=0, return_inverse=True)
+        return ArrayEquivalence.from_labels(combined.reshape(-1), one_partition.get_elements())
     result = Equivalence(list(one_partition.parent_map.keys()))
     result.partition(multichannel_equivalence_relation, equiv_partition_dict)
     return result
 
 
 # this version is for the format used in the darpa project --> can be made to general matrix
-def partition_multichannel(ch_to_adj, vertices=None) -> Equivalence:
+def partition_multichannel(ch_to_adj, vertices=None) -> ArrayEquivalence:
     """Input: Dictionary of 'ch': sparse adj_matrix
         Output: Equivalence class object that contains the proper partition ->
         use .classes() to obtain a list of sets of vertices in the same equivalence classes (structural equivalence)"""
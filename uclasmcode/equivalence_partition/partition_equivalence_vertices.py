@@ -4,7 +4,7 @@
     by TimNg
     Last Update: 8/7/19 (Extended for vertices)"""
 
-from .equivalence_data_structure import Equivalence
+from .array_equivalence import ArrayEquivalence
 import numpy as np
 
 
@@ -42,16 +42,16 @@ def permutation_relation(vertex_a, vertex_b, adj_matrix):
     return True
 
 
-def partition_vertices(adj_matrix: '2d numpy array', vertices=None) -> Equivalence:
+def partition_vertices(adj_matrix: '2d numpy array', vertices=None) -> ArrayEquivalence:
     """ Given a set of vertices and an adj_matrix (directed multigraph)
     we partition them in terms of the permutation relation.
     If vertices is none, we partition all nodes of that graph"""
     assert adj_matrix.shape[0] == adj_matrix.shape[1], "partition_vertices: Input matrix must be square!"
     if vertices is None:
         # initialize an equivalence relation fill with nodes
-        vertices_partition = Equivalence(range(0, adj_matrix.shape[0]))
+        vertices_partition = ArrayEquivalence(range(0, adj_matrix.shape[0]))
     else:
-        vertices_partition = Equivalence(vertices)
+        vertices_partition = ArrayEquivalence(vertices)
     # partition into equivalence classes
     vertices_partition.partition(permutation_relation, adj_matrix)
     return vertices_partition
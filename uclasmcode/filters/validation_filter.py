@@ -13,8 +13,7 @@ def validate_alldiff_solns(tmplt, world, candidates, marked,
     var_to_vals = {
         tmplt_idx: [
             node_to_marked_col_idx[world.nodes[cand_idx]]
-            for cand_idx in range(world.n_nodes)
-            if candidates[tmplt_idx, cand_idx]
+            for cand_idx in np.flatnonzero(candidates[tmplt_idx])
         ]
         for tmplt_idx in range(tmplt.n_nodes)
     }
@@ -128,6 +127,9 @@ def validation_filter(tmplt, world, *, candidates=None, in_signal_only=False,
     in_signal_only: Rather than checking pairs, if this option is True, only
      check that each candidate participates in at least one signal, ignoring
      which template node it corresponds to
+
+    The candidates are packed into uclasm.BitsetCandidates (if they are not
+    already) since they are copied for every candidate tried.
     """
     if candidates is None:
         tmplt, world, candidates = uclasm.run_filters(
@@ -135,10 +137,14 @@ def validation_filter(tmplt, world, *, candidates=None, in_signal_only=False,
             candidates=np.ones((tmplt.n_nodes, world.n_nodes), dtype=np.bool),
             **kwargs)
 
+    is_packed = isinstance(candidates, uclasm.BitsetCandidates)
+    if not is_packed:
+        candidates = uclasm.BitsetCandidates.from_bool(candidates)
+
     # Start by marking every current candidate-template node pair to be checked
     # A zero entry here means that we have already checked whether or not the
     # candidate corresponds to the template node in any signals.
-    marked = candidates.copy()
+    marked = candidates.to_bool()
 
     node_to_marked_col_idx = {node: idx for idx, node in enumerate(world.nodes)}
 
@@ -192,4 +198,6 @@ def validation_filter(tmplt, world, *, candidates=None, in_signal_only=False,
             # Unmark the pair that was found
             marked[marked_tmplt_idx, marked_cand_idx] = False
 
+    if not is_packed:
+        candidates = candidates.to_bool()
     return tmplt, world, candidates
@@ -1,18 +1,20 @@
 from .label_filter import label_filter
-from .stats_filter import stats_filter
+from .stats_filter import stats_filter, incremental_stats_filter
 from .topology_filter import topology_filter
 from .neighborhood_filter import neighborhood_filter
 from .permutation_filter import permutation_filter
 from .run_filters import run_filters
 from . import topology_filter_dense
+from . import topology_filter_bitset
 
 # These are the most commonly used filters
 cheap_filters = [stats_filter, topology_filter]
-cs_filters = [stats_filter, topology_filter_dense.topology_filter]
+cs_filters = [incremental_stats_filter, topology_filter_bitset.topology_filter]
 
 # This needs to be imported after cheap_filters is defined since it relies
 # on cheap_filters
-from .elimination_filter import elimination_filter
+from .elimination_filter import elimination_filter, parallel_elimination_filter
+from .sac_filter import sac_filter
 
 # Elimination filter is also frequently used
 all_filters = cheap_filters + [elimination_filter]
@@ -1,7 +1,24 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
 import numpy as np
 import networkx as nx
 from . import run_filters, cheap_filters
 from ..utils.misc import one_hot
+from ..utils.bitset_candidates import BitsetCandidates, accepts_bitsets
+from ..utils.shared_graph import SharedGraph
+
+# Number of batches of candidates per worker each template node is split into
+# by the parallel elimination filter
+BATCHES_PER_WORKER = 4
+
+# The template and shared world of a worker process. Set by _init_worker
+_tmplt = None
+_shared_world = None
+# (key, graph) of the subgraph of the shared world the last task ran on
+_world = (None, None)
 
 def centrality_ordered_node_idxs(tmplt, world, candidates):
     """
@@ -28,64 +45,156 @@ def centrality_ordered_node_idxs(tmplt, world, candidates):
 
     return sorted(range(tmplt.n_nodes), key=metric_tuple)
 
+def is_eliminated(tmplt, world, candidates, node_idx, cand_idx):
+    """
+    Whether choosing cand_idx for node_idx and running the cheap filters
+    leaves some template node without candidates. candidates is not modified.
+    """
+    # Don't modify the original template unless you mean to
+    candidates_copy = candidates.copy()
+    candidates_copy[:, cand_idx] = False
+    candidates_copy[node_idx, :] = one_hot(cand_idx, world.n_nodes)
+
+    _, _, result_candidates = run_filters(
+        tmplt, world, candidates=candidates_copy, filters=cheap_filters,
+        init_changed_cands=one_hot(node_idx, tmplt.n_nodes),
+        verbose=False)
+
+    # TODO: add something to the data structure so we can check this
+    # without have to do the summation every time
+    return ~np.all(result_candidates.any(axis=1))
+
+def _init_worker(tmplt, shared_world):
+    global _tmplt, _shared_world
+    _tmplt = tmplt
+    _shared_world = shared_world
+
+def _get_world(world_idxs):
+    """
+    The subgraph of the shared world on the nodes world_idxs. Consecutive
+    tasks mostly share it (they are the batches of a same template node), so
+    the last one is kept.
+    """
+    global _world
+    key = world_idxs.tobytes()
+    if _world[0] != key:
+        shared_world = _shared_world.attach()
+        if len(world_idxs) == shared_world.n_nodes:
+            _world = (key, shared_world)
+        else:
+            _world = (key, shared_world.subgraph(world_idxs))
+    return _world[1]
+
+def _eliminate_batch(world_idxs, words, node_idx, cand_idxs):
+    """ The candidates of node_idx among cand_idxs that are eliminated """
+    world = _get_world(world_idxs)
+    candidates = BitsetCandidates(words, world.n_nodes)
+    return [cand_idx for cand_idx in cand_idxs
+            if is_eliminated(_tmplt, world, candidates, node_idx, cand_idx)]
+
+def _eliminate_in_parallel(executor, num_workers, shared_world, world,
+                           candidates, node_idx, cand_idxs):
+    """
+    The candidates of node_idx among cand_idxs that are eliminated, tried in
+    batches by the workers of executor. Only the indices of the nodes of world
+    in shared_world and the packed candidates are sent to them.
+    """
+    shared_node_idxs = shared_world.attach().node_idxs
+    world_idxs = np.array([shared_node_idxs[node] for node in world.nodes],
+                          dtype=np.int64)
+    n_batches = min(len(cand_idxs), BATCHES_PER_WORKER * num_workers)
+    futures = [executor.submit(_eliminate_batch, world_idxs, candidates.words,
+                               node_idx, batch)
+               for batch in np.array_split(cand_idxs, n_batches)]
+    return [cand_idx for future in futures for cand_idx in future.result()]
+
+@accepts_bitsets
 def elimination_filter(tmplt, world, candidates, *,
                        changed_cands=None,
                        verbose=False,
+                       num_workers=None,
                        **kwargs):
     """
     If choosing a candidate for a template node and running the the filters
     results in all of the candidates disappearing, that candidate is
     eliminated
+
+    The candidates are packed into BitsetCandidates (if they are not already)
+    since they are copied for every candidate tried.
+
+    num_workers: if more than 1, the candidates of each template node are
+        tried by a pool of that many processes, sharing the world through
+        shared memory (see SharedGraph). The candidates eliminated are the same.
     """
+    is_packed = isinstance(candidates, BitsetCandidates)
+    if not is_packed:
+        candidates = BitsetCandidates.from_bool(candidates)
+
     nbr_counts = tmplt.is_nbr.sum(axis=1).flat
 
-    n_skipped = 0
-    for node_idx in centrality_ordered_node_idxs(tmplt, world, candidates):
-        n_candidates = np.sum(candidates[node_idx])
-        # If the node only has one candidate, there is no need to check it
-        # If the node only has one neighbor, there is no point in filtering on
-        # it since it will be taken care of by filtering on its one neighbor
-        if n_candidates == 1 or nbr_counts[node_idx] == 1:
-            # print("skipping", tmplt.nodes[node_idx])
-            n_skipped += 1
-            continue
-
-        if verbose:
-            print("trying", tmplt.nodes[node_idx], "which has",
-                  n_candidates, "candidates")
-
-        init_changed_cands = np.zeros(tmplt.nodes.shape, dtype=np.bool)
-
-        elim_count = 0
-        cand_idxs = np.argwhere(candidates[node_idx]).flat
-        for i, cand_idx in enumerate(cand_idxs):
-            # Don't modify the original template unless you mean to
-            candidates_copy = candidates.copy()
-            candidates_copy[:, cand_idx] = False
-            candidates_copy[node_idx, :] = one_hot(cand_idx, world.n_nodes)
-
-            if verbose and i % 10 == 0:
-                print("cand {} of {}".format(i, len(cand_idxs)))
-
-            _, _, result_candidates = run_filters(
-                tmplt, world, candidates=candidates_copy, filters=cheap_filters,
-                init_changed_cands=one_hot(node_idx, tmplt.n_nodes),
-                verbose=False)
-
-            # TODO: add something to the data structure so we can check this
-            # without have to do the summation every time
-            if ~np.all(result_candidates.any(axis=1)):
-                elim_count += 1
-                candidates[node_idx, cand_idx] = False
-                init_changed_cands[node_idx] = True
-
-        if np.any(init_changed_cands):
-            tmplt, world, candidates = run_filters(
-                tmplt, world, candidates=candidates, filters=cheap_filters,
-                init_changed_cands=init_changed_cands, verbose=False)
-        print("Eliminating", elim_count, "of", n_candidates, ";world now has", world.n_nodes, "nodes")
+    with ExitStack() as stack:
+        executor = None
+        if num_workers is not None and num_workers > 1:
+            shared_world = stack.enter_context(SharedGraph(world))
+            executor = stack.enter_context(ProcessPoolExecutor(
+                max_workers=num_workers, mp_context=multiprocessing.get_context(),
+                initializer=_init_worker, initargs=(tmplt, shared_world)))
+
+        n_skipped = 0
+        for node_idx in centrality_ordered_node_idxs(tmplt, world, candidates):
+            n_candidates = np.sum(candidates[node_idx])
+            # If the node only has one candidate, there is no need to check it
+            # If the node only has one neighbor, there is no point in filtering on
+            # it since it will be taken care of by filtering on its one neighbor
+            if n_candidates == 1 or nbr_counts[node_idx] == 1:
+                # print("skipping", tmplt.nodes[node_idx])
+                n_skipped += 1
+                continue
+
+            if verbose:
+                print("trying", tmplt.nodes[node_idx], "which has",
+                      n_candidates, "candidates")
+
+            # The trials for the candidates of a same node are independent:
+            # each one replaces the row of node_idx, so the eliminations are
+            # applied once they are all done
+            cand_idxs = np.flatnonzero(candidates[node_idx])
+            if executor is not None:
+                eliminated = _eliminate_in_parallel(
+                    executor, num_workers, shared_world, world, candidates,
+                    node_idx, cand_idxs)
+            else:
+                eliminated = []
+                for i, cand_idx in enumerate(cand_idxs):
+                    if verbose and i % 10 == 0:
+                        print("cand {} of {}".format(i, len(cand_idxs)))
+                    if is_eliminated(tmplt, world, candidates, node_idx, cand_idx):
+                        eliminated.append(cand_idx)
+
+            elim_count = len(eliminated)
+            if elim_count > 0:
+                candidates[node_idx, eliminated] = False
+                tmplt, world, candidates = run_filters(
+                    tmplt, world, candidates=candidates, filters=cheap_filters,
+                    init_changed_cands=one_hot(node_idx, tmplt.n_nodes),
+                    verbose=False)
+            print("Eliminating", elim_count, "of", n_candidates, ";world now has", world.n_nodes, "nodes")
 
     if verbose:
         print("Elimination filter finished, skipped {} nodes".format(n_skipped))
 
+    if not is_packed:
+        candidates = candidates.to_bool()
     return tmplt, world, candidates
+
+@accepts_bitsets
+def parallel_elimination_filter(tmplt, world, candidates, *,
+                                num_workers=None, **kwargs):
+    """
+    elimination_filter trying the candidates on a pool of num_workers
+    processes (default the number of cpus), to use in a list of filters
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    return elimination_filter(tmplt, world, candidates,
+                              num_workers=num_workers, **kwargs)
@@ -1,5 +1,16 @@
+from ..utils.bitset_candidates import (BitsetCandidates, accepts_bitsets,
+                                       pack_rows)
 
 
+@accepts_bitsets
 def label_filter(tmplt, world, candidates, *, verbose=False, **kwargs):
+    if isinstance(candidates, BitsetCandidates):
+        # one packed mask of the world nodes per distinct template label
+        label_to_rows = {}
+        for node_idx, label in enumerate(tmplt.labels):
+            label_to_rows.setdefault(label, []).append(node_idx)
+        for label, rows in label_to_rows.items():
+            candidates.and_rows(pack_rows(world.labels == label)[0], rows)
+        return tmplt, world, candidates
     candidates[:,:] &= tmplt.labels.reshape(-1,1) == world.labels.reshape(1,-1)
     return tmplt, world, candidates
@@ -56,19 +56,19 @@ def compute_cost(tmplt, world, t_vert, w_vert, matching):
 	"""
 	cost = 0
 	matched_t_nbrs = compute_matched_neighbors(tmplt, t_vert, matching, unmatched=False)
+	if len(matched_t_nbrs) == 0:
+		return cost
+	w_nbrs = matching[matched_t_nbrs].astype(np.int64)
 
-	for t_nbr in matched_t_nbrs:
-		w_nbr = matching[t_nbr]
-		for channel in tmplt.channels:
-			t_adj = tmplt.ch_to_adj[channel]
-			t_out = t_adj[t_vert, t_nbr]
-			t_in = t_adj[t_nbr, t_vert]
+	# all the matched neighbors at once (see Graph.multiplicity)
+	for channel in tmplt.channels:
+		t_out = tmplt.multiplicity(channel, t_vert, matched_t_nbrs).astype(np.int64)
+		t_in = tmplt.multiplicity(channel, matched_t_nbrs, t_vert).astype(np.int64)
 
-			w_adj = world.ch_to_adj[channel]
-			w_out = w_adj[w_vert, w_nbr]
-			w_in = w_adj[w_nbr, w_vert]
+		w_out = world.multiplicity(channel, w_vert, w_nbrs).astype(np.int64)
+		w_in = world.multiplicity(channel, w_nbrs, w_vert).astype(np.int64)
 
-			cost += max(t_out - w_out, 0) + max(t_in - w_in, 0)
+		cost += np.maximum(t_out - w_out, 0).sum() + np.maximum(t_in - w_in, 0).sum()
 	return cost
 
 
@@ -102,13 +102,11 @@ def compute_cost_matrix(tmplt, world, t_vert, w_vert, matching):
 	t_column = np.zeros(len(t_nbrs))
 	for channel in tmplt.channels:
 		# We reshape the arrays to take advantage of broadcasting
-		t_adj = tmplt.ch_to_adj[channel]
-		t_out_counts = t_adj[t_vert, t_nbrs].reshape((len(t_nbrs), 1))
-		t_in_counts = t_adj[t_nbrs, t_vert].reshape((len(t_nbrs), 1))
+		t_out_counts = tmplt.multiplicity(channel, t_vert, t_nbrs).reshape((len(t_nbrs), 1)).astype(np.int64)
+		t_in_counts = tmplt.multiplicity(channel, t_nbrs, t_vert).reshape((len(t_nbrs), 1)).astype(np.int64)
 
-		w_adj = world.ch_to_adj[channel]
-		w_out_counts = w_adj[w_vert, w_nbrs].reshape((1, len(w_nbrs)))
-		w_in_counts = w_adj[w_nbrs, w_vert].reshape((1, len(w_nbrs)))
+		w_out_counts = world.multiplicity(channel, w_vert, w_nbrs).reshape((1, len(w_nbrs))).astype(np.int64)
+		w_in_counts = world.multiplicity(channel, w_nbrs, w_vert).reshape((1, len(w_nbrs))).astype(np.int64)
 
 		# There should be no advantage to having more edges then necessary
 		# so we lowerbound the arrays at 0
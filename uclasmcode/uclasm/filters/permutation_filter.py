@@ -1,11 +1,16 @@
 import numpy as np
+from ..utils.bitset_candidates import BitsetCandidates, accepts_bitsets
 
+@accepts_bitsets
 def permutation_filter(tmplt, world, candidates, *,
                        changed_cands=None, verbose=False):
     """
     If k nodes in the template have the same k candidates, then those candidates
     are eliminated as candidates for all other template nodes
     """
+    if isinstance(candidates, BitsetCandidates):
+        return permutation_filter_bitsets(tmplt, world, candidates)
+
     # The i'th element of this array is the number of cands for tmplt.nodes[i]
     cand_counts = np.sum(candidates, axis=1)
 
@@ -37,3 +42,28 @@ def permutation_filter(tmplt, world, candidates, *,
             break
 
     return tmplt, world, candidates
+
+def permutation_filter_bitsets(tmplt, world, candidates):
+    """
+    permutation_filter on BitsetCandidates: the template nodes whose cands
+    are a subset of those of node_idx are found with one popcount of the
+    AND of every row with the row of node_idx.
+    """
+    cand_counts = candidates.row_counts()
+
+    for node_idx, cand_count in sorted(enumerate(cand_counts), key=lambda x: -x[1]):
+        if cand_count >= tmplt.n_nodes:
+            continue
+
+        row = candidates.words[node_idx].copy()
+        matches = candidates.intersection_counts(row) == cand_counts
+        match_count = np.sum(matches)
+
+        if match_count == cand_count:
+            candidates.and_rows(~row, ~matches)
+
+        if match_count > cand_count:
+            candidates.clear()
+            break
+
+    return tmplt, world, candidates
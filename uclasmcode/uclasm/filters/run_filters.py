@@ -4,6 +4,7 @@ import numpy as np
 from . import label_filter
 from . import permutation_filter
 from ..utils import summarize
+from ..utils.bitset_candidates import call_filter
 
 # TODO: logging
 
@@ -16,6 +17,8 @@ def run_filters(tmplt, world, *,
                 init_changed_cands=None):
     """
     Repeatedly run the desired filters until the candidates converge
+
+    candidates: bool array or BitsetCandidates, returned as the same type
     """
 
     has_gt = len(set(tmplt.nodes) - set(world.nodes)) == 0
@@ -76,8 +79,8 @@ def run_filters(tmplt, world, *,
                 print("running", filter.__name__)
 
             # Run whatever filter and the permutation filter
-            tmplt, world, candidates = filter(
-                tmplt, world, candidates, changed_cands=changed_cands,
+            tmplt, world, candidates = call_filter(
+                filter, tmplt, world, candidates, changed_cands=changed_cands,
                 verbose=verbose)
             filters_so_far.append(filter.__name__.replace("_filter", ""))
             tmplt, world, candidates = permutation_filter(
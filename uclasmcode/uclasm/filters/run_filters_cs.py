@@ -3,6 +3,7 @@ import numpy as np
 from . import label_filter
 from . import permutation_filter
 from ..utils import summarize
+from ..utils.bitset_candidates import call_filter
 from uclasmcode.candidate_structure.logging_utils import print_info, print_debug
 
 
@@ -14,9 +15,16 @@ def run_filters(tmplt, world, *,
                 filters=None,
                 verbose=False,
                 max_iter=-1,
-                init_changed_cands=None):
+                init_changed_cands=None,
+                reduce_world=True):
 	"""
 	Repeatedly run the desired filters until the candidates converge
+
+	candidates: bool array or BitsetCandidates, returned as the same type
+
+	reduce_world: if False, the world graph is never replaced by the subgraph of
+		nodes that are still candidates, so the returned world and candidates keep
+		their original indices and filters can reuse whatever they cached for that world
 	"""
 
 	has_gt = len(set(tmplt.nodes) - set(world.nodes)) == 0
@@ -45,7 +53,7 @@ def run_filters(tmplt, world, *,
 	init_cand_counts = candidates.sum(axis=1)
 
 	if init_changed_cands is None:
-		init_changed_cands = np.ones(tmplt.nodes.shape, dtype=np.bool)
+		init_changed_cands = np.ones(tmplt.nodes.shape, dtype=np.bool_)
 
 	changed_cands = init_changed_cands
 
@@ -72,8 +80,8 @@ def run_filters(tmplt, world, *,
 			# print_debug("running" + str(filter.__name__))
 
 			# Run whatever filter and the permutation filter
-			tmplt, world, candidates = filter(
-				tmplt, world, candidates, changed_cands=changed_cands,
+			tmplt, world, candidates = call_filter(
+				filter, tmplt, world, candidates, changed_cands=changed_cands,
 				verbose=verbose)
 			filters_so_far.append(filter.__name__.replace("_filter", ""))
 			tmplt, world, candidates = permutation_filter(
@@ -108,7 +116,7 @@ def run_filters(tmplt, world, *,
 		is_cand_any = candidates.any(axis=0)
 
 		# If not all world nodes are candidates for at least one template node
-		if ~is_cand_any.all():
+		if reduce_world and ~is_cand_any.all():
 			# Get rid of unnecessary world nodes
 			world = world.subgraph(is_cand_any)
 			candidates = candidates[:, is_cand_any]
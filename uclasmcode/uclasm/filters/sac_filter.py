@@ -0,0 +1,228 @@
+"""
+Singleton arc consistency (SAC) elimination.
+
+Like the elimination filter, every candidate c of a template node is tried by
+making it the only candidate of the node (and removing it from the others) and
+propagating: if some template node is left without candidates, c is
+eliminated. Instead of running the cheap filters from scratch on a copy of the
+candidates for every trial, a SACEngine keeps the propagation state across
+trials:
+
+- the candidates, packed as in BitsetCandidates,
+- for every template arc (s, d) (see topology_filter_bitset.get_template_arcs)
+  and every candidate u of s, the number of candidates of d connected to u by
+  enough edges (its support count).
+
+A trial removes candidates as a delta and propagates along the template
+neighbors with a worklist: the removed candidates of d are AND-ed with the
+"enough edges" bitsets of the candidates of each neighbor s to decrement their
+support counts, and those left without support are removed in turn. Every
+change is recorded on a trail, so the trial is undone by rolling it back and
+the support counts are reused by the next trial. Eliminations are applied
+through the same propagation, so the counts stay valid for the next template
+node too.
+
+The propagation is topological arc consistency plus the all different
+constraint of the assignment; unlike the elimination filter, the world is
+never reduced to a subgraph so the stats features are not recomputed.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from ..utils.bitset_candidates import (BitsetCandidates, accepts_bitsets,
+                                       pack_rows, popcount, unpack_rows)
+from .elimination_filter import centrality_ordered_node_idxs
+from . import topology_filter_bitset
+from .topology_filter_bitset import (ROW_BLOCK_SIZE, EnoughEdgesBitsets,
+                                     get_template_arcs)
+
+
+def count_supports(bitsets, requirements, rows, dst_words):
+    """
+    For each world node of rows, the number of world nodes of the packed
+    dst_words it is connected to by enough edges for every requirement.
+    """
+    counts = np.zeros(len(rows), dtype=np.int64)
+    for start in range(0, len(rows), ROW_BLOCK_SIZE):
+        block = rows[start:start + ROW_BLOCK_SIZE]
+        enough_edges = dst_words[np.newaxis, :]
+        for channel, is_incoming, multiplicity in requirements:
+            enough_edges = enough_edges & \
+                bitsets.get(channel, is_incoming, multiplicity)[block]
+        counts[start:start + ROW_BLOCK_SIZE] = \
+            popcount(enough_edges).sum(axis=1)
+    return counts
+
+
+class SACEngine:
+    """
+    Persistent propagation state over the candidates of tmplt in world. The
+    candidates (BitsetCandidates) are modified in place.
+    """
+
+    def __init__(self, tmplt, world, candidates):
+        self.candidates = candidates
+        self.words = candidates.words
+        self.n_world = world.n_nodes
+
+        # reuse the bitsets topology_filter_bitset built for this world
+        cache = topology_filter_bitset._cache
+        if cache.world_key == world.cache_key:
+            self.bitsets = cache.bitsets
+        else:
+            self.bitsets = EnoughEdgesBitsets(world)
+        self.arcs, self_loops = get_template_arcs(tmplt)
+        self.nbrs = {}
+        for src_idx, dst_idx in self.arcs:
+            self.nbrs.setdefault(dst_idx, []).append(src_idx)
+
+        # trail of ("cands", node_idx, removed words) and
+        # ("supports", arc, world node idxs, decrements)
+        self.trail = []
+
+        self.supports = {}
+        deltas = []
+        for arc, requirements in self.arcs.items():
+            src_idx, dst_idx = arc
+            rows = self.cand_idxs(src_idx)
+            support = np.zeros(self.n_world, dtype=np.int64)
+            support[rows] = count_supports(self.bitsets, requirements, rows,
+                                           self.words[dst_idx])
+            self.supports[arc] = support
+            deltas.append((src_idx, self.pack(rows[support[rows] == 0])))
+        for node_idx, requirements in self_loops.items():
+            for channel, multiplicity in requirements:
+                deltas.append((node_idx, pack_rows(
+                    self.bitsets.self_edges(channel) < multiplicity)[0]))
+        # False if the candidates have no arc consistent subset
+        self.is_consistent = self.remove(deltas)
+        self.commit()
+
+    def cand_idxs(self, node_idx):
+        return np.flatnonzero(unpack_rows(self.words[node_idx], self.n_world)[0])
+
+    def pack(self, idxs):
+        """ The packed row with the bits of the world nodes idxs set """
+        is_set = np.zeros(self.n_world, dtype=np.bool_)
+        is_set[idxs] = True
+        return pack_rows(is_set)[0]
+
+    def mark(self):
+        """ A mark to roll back to """
+        return len(self.trail)
+
+    def commit(self):
+        """ Make the changes so far permanent """
+        self.trail = []
+
+    def rollback(self, mark):
+        """ Undo every change made since mark """
+        while len(self.trail) > mark:
+            kind, key, *change = self.trail.pop()
+            if kind == "cands":
+                self.words[key] |= change[0]
+            else:
+                idxs, decrements = change
+                self.supports[key][idxs] += decrements
+
+    def remove(self, deltas):
+        """
+        Remove the packed candidates of each (node_idx, words) of deltas and
+        propagate. Returns False as soon as some template node has no
+        candidates left (the changes made so far are kept on the trail).
+        """
+        worklist = deque()
+        removed = {}  # packed candidates removed and not yet propagated
+
+        def drop(node_idx, words):
+            words = words & self.words[node_idx]
+            if not words.any():
+                return True
+            self.trail.append(("cands", node_idx, words))
+            self.words[node_idx] &= ~words
+            if node_idx in removed:
+                removed[node_idx] |= words
+            else:
+                removed[node_idx] = words.copy()
+                worklist.append(node_idx)
+            return self.words[node_idx].any()
+
+        for node_idx, words in deltas:
+            if not drop(node_idx, words):
+                return False
+
+        while worklist:
+            dst_idx = worklist.popleft()
+            dst_removed = removed.pop(dst_idx)
+            for src_idx in self.nbrs.get(dst_idx, []):
+                arc = (src_idx, dst_idx)
+                rows = self.cand_idxs(src_idx)
+                lost = count_supports(self.bitsets, self.arcs[arc], rows,
+                                      dst_removed)
+                has_lost = lost > 0
+                if not has_lost.any():
+                    continue
+                rows, lost = rows[has_lost], lost[has_lost]
+                support = self.supports[arc]
+                support[rows] -= lost
+                self.trail.append(("supports", arc, rows, lost))
+                unsupported = rows[support[rows] == 0]
+                if len(unsupported) > 0 and \
+                        not drop(src_idx, self.pack(unsupported)):
+                    return False
+        return True
+
+    def try_assignment(self, node_idx, cand_idx):
+        """
+        Whether making cand_idx the only candidate of node_idx (and no
+        other node's) leaves every template node with candidates. The state
+        is left unchanged.
+        """
+        mark = self.mark()
+        cand_words = self.pack([cand_idx])
+        deltas = [(node_idx, self.words[node_idx] & ~cand_words)]
+        for other_idx in range(len(self.words)):
+            if other_idx != node_idx:
+                deltas.append((other_idx, cand_words))
+        is_consistent = self.remove(deltas)
+        self.rollback(mark)
+        return is_consistent
+
+
+@accepts_bitsets
+def sac_filter(tmplt, world, candidates, *, changed_cands=None,
+               verbose=False, **kwargs):
+    """
+    Eliminate the candidates whose assignment is not arc consistent, trying
+    the template nodes in the order of the elimination filter (and skipping
+    the same ones) with a SACEngine.
+    """
+    is_packed = isinstance(candidates, BitsetCandidates)
+    if not is_packed:
+        candidates = BitsetCandidates.from_bool(candidates)
+
+    engine = SACEngine(tmplt, world, candidates)
+    nbr_counts = tmplt.is_nbr.sum(axis=1).flat
+    is_consistent = engine.is_consistent
+    for node_idx in centrality_ordered_node_idxs(tmplt, world, candidates):
+        if not is_consistent:
+            break
+        cand_idxs = engine.cand_idxs(node_idx)
+        if len(cand_idxs) == 1 or nbr_counts[node_idx] == 1:
+            continue
+
+        eliminated = [cand_idx for cand_idx in cand_idxs
+                      if not engine.try_assignment(node_idx, cand_idx)]
+        if verbose:
+            print("Eliminating", len(eliminated), "of", len(cand_idxs),
+                  "candidates of", tmplt.nodes[node_idx])
+        is_consistent = engine.remove([(node_idx, engine.pack(eliminated))])
+        engine.commit()
+
+    if not is_consistent:
+        candidates.clear()
+    if not is_packed:
+        candidates = candidates.to_bool()
+    return tmplt, world, candidates
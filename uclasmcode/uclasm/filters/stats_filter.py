@@ -1,5 +1,7 @@
 import numpy as np
 import time
+from collections import OrderedDict
+from ..utils.bitset_candidates import accepts_bitsets
 
 # TODO: can we use changed_cands?
 
@@ -44,28 +46,68 @@ def compute_features(graph, channels=None):
 
     return np.concatenate(features_list, axis=0)
 
-class _cache():
-    tmplt = None
-    tmplt_feats = None
-    world = None
-    world_feats = None
-
-def stats_filter(tmplt, world, candidates, *, verbose=False, **kwargs):
-    global _cache
+class FeatureCache():
+    """
+    Features computed by compute_features, keyed on the graph's cache_key and
+    the channels they were computed over. Only the most recently used
+    `maxsize` entries are kept.
+    """
 
-    if tmplt == _cache.tmplt:
-        tmplt_feats = _cache.tmplt_feats
-    else:
-        tmplt_feats = compute_features(tmplt)
-        _cache.tmplt = tmplt
-        _cache.tmplt_feats = tmplt_feats
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._features = OrderedDict()
+
+    def get(self, graph, channels=None):
+        if channels is None:
+            channels = graph.channels
+        key = (graph.cache_key, tuple(channels))
+        if key in self._features:
+            self._features.move_to_end(key)
+        else:
+            self._features[key] = compute_features(graph, channels=channels)
+            if len(self._features) > self.maxsize:
+                self._features.popitem(last=False)
+        return self._features[key]
+
+    def get_upper_bounds(self, graph, channels=None):
+        """
+        If graph is an induced subgraph, the features of the graph it was
+        taken from restricted to its nodes. Removing nodes never increases
+        any of the features, so these are upper bounds on the features of
+        graph and no new features need to be computed.
+        """
+        if graph.is_root_current:
+            return self.get(graph.root_graph, channels)[:, graph.root_idxs]
+        return self.get(graph, channels)
+
+    def invalidate(self, graph=None):
+        """
+        Drop the cached features of graph, or of every graph if None.
+        """
+        if graph is None:
+            self._features.clear()
+            return
+        for key in [key for key in self._features if key[0][0] == graph._uid]:
+            del self._features[key]
+
+feature_cache = FeatureCache()
+
+@accepts_bitsets
+def stats_filter(tmplt, world, candidates, *, verbose=False,
+                 use_root_features=False, **kwargs):
+    """
+    use_root_features: if world is a subgraph of another graph, bound its
+        features by those of the original graph (see
+        FeatureCache.get_upper_bounds) rather than computing them. Weaker,
+        but the world features are computed at most once.
+    """
+    tmplt_feats = feature_cache.get(tmplt)
 
-    if world == _cache.world:
-        world_feats = _cache.world_feats
+    if use_root_features:
+        world_feats = feature_cache.get_upper_bounds(
+            world, channels=tmplt.channels)
     else:
-        world_feats = compute_features(world, channels=tmplt.channels)
-        _cache.world = world
-        _cache.world_feats = world_feats
+        world_feats = feature_cache.get(world, channels=tmplt.channels)
 
     for tmplt_node_idx, tmplt_node in enumerate(tmplt.nodes):
         tmplt_node_feats = tmplt_feats[:, [tmplt_node_idx]]
@@ -73,3 +115,12 @@ def stats_filter(tmplt, world, candidates, *, verbose=False, **kwargs):
         candidates[tmplt_node_idx] &= new_is_cand
 
     return tmplt, world, candidates
+
+@accepts_bitsets
+def incremental_stats_filter(tmplt, world, candidates, **kwargs):
+    """
+    stats_filter which reuses the features of the original world across
+    subgraphs instead of recomputing them.
+    """
+    return stats_filter(tmplt, world, candidates, use_root_features=True,
+                        **kwargs)
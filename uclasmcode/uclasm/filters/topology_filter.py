@@ -1,6 +1,7 @@
 import numpy as np
 from functools import reduce
 from operator import mul
+from ..utils.bitset_candidates import accepts_bitsets
 
 # TODO: parallelize?
 # TODO: get set of values taken by tmplt edges?
@@ -13,6 +14,7 @@ def iter_adj_pairs(tmplt, world):
         yield (tmplt_adj.T, world_adj.T)
 
 
+@accepts_bitsets
 def topology_filter(tmplt, world, candidates, *,
                     changed_cands=None, **kwargs):
     """
@@ -58,7 +60,7 @@ def topology_filter(tmplt, world, candidates, *,
 
         # srcs with at least one reasonable dst
         src_matches = enough_edges.getnnz(axis=1) > 0
-        candidates[src_idx][src_is_cand] = src_matches
+        candidates[src_idx, src_is_cand] = src_matches
         if not any(src_matches):
             candidates[:,:] = False
             break
@@ -66,7 +68,7 @@ def topology_filter(tmplt, world, candidates, *,
         if src_idx != dst_idx:
             # dsts with at least one reasonable src
             dst_matches = enough_edges.getnnz(axis=0) > 0
-            candidates[dst_idx][dst_is_cand] = dst_matches
+            candidates[dst_idx, dst_is_cand] = dst_matches
             if not any(dst_matches):
                 candidates[:,:] = False
                 break
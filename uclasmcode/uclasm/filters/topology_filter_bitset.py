@@ -0,0 +1,196 @@
+"""
+Topology filter over packed bitsets.
+
+For each (channel, direction, multiplicity) that the template asks for, the
+world's "enough edges" relation is packed once into rows of uint64 words:
+bit v of row u is set iff world_adj[u, v] >= multiplicity (or the transpose
+for the incoming direction). The bitsets are cached per world, so when the
+world graph stays fixed (as in the candidate structure search) they are built
+only once.
+
+A template arc (s, d) is then revised by AND-ing the bitset rows of the
+candidates of s over every requirement of the arc and testing them against
+the packed candidates of d (a row of BitsetCandidates is used as it is).
+Revisions are driven by an AC-3 style worklist seeded with `changed_cands`.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from ..utils.bitset_candidates import (WORD_SIZE, BitsetCandidates,
+                                       accepts_bitsets, n_words_for, pack_rows)
+
+# Number of candidate rows revised at once. Bounds the memory of the AND-ed
+# bitset block to ROW_BLOCK_SIZE * n_words * 8 bytes.
+ROW_BLOCK_SIZE = 4096
+
+
+def pack_threshold(adj, threshold):
+    """
+    Pack the boolean matrix `adj >= threshold` of a sparse matrix into rows
+    of uint64 words without ever densifying it. threshold must be positive.
+    """
+    adj = adj.tocoo()
+    keep = adj.data >= threshold
+    rows, cols = adj.row[keep], adj.col[keep]
+    packed = np.zeros((adj.shape[0], n_words_for(adj.shape[1]) * 8),
+                      dtype=np.uint8)
+    bits = np.left_shift(1, cols & 7).astype(np.uint8)
+    np.bitwise_or.at(packed, (rows, cols >> 3), bits)
+    return packed.view(np.uint64)
+
+
+class EnoughEdgesBitsets:
+    """
+    Lazily built, cached "enough edges" bitsets of a world graph, keyed on
+    (channel, is_incoming, multiplicity).
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.n_words = n_words_for(world.n_nodes)
+        self._bitsets = {}
+
+    def get(self, channel, is_incoming, multiplicity):
+        key = (channel, is_incoming, multiplicity)
+        if key not in self._bitsets:
+            adj = self.world.ch_to_adj[channel]
+            if is_incoming:
+                adj = adj.T
+            self._bitsets[key] = pack_threshold(adj, multiplicity)
+        return self._bitsets[key]
+
+    def self_edges(self, channel):
+        """The edge multiplicity of each world node to itself."""
+        return np.asarray(self.world.ch_to_adj[channel].diagonal()).flatten()
+
+
+def get_template_arcs(tmplt):
+    """
+    Returns a dict mapping each ordered pair (s, d) of distinct neighbors in
+    the template to its requirements: a list of (channel, is_incoming,
+    multiplicity) that the world rows of candidates of s must satisfy toward
+    the candidates of d. Also returns a dict mapping template nodes with self
+    edges to a list of (channel, multiplicity).
+    """
+    arcs = {}
+    self_loops = {}
+    for src_idx, dst_idx in tmplt.nbr_idx_pairs:
+        src_idx, dst_idx = int(src_idx), int(dst_idx)
+        for channel, tmplt_adj in tmplt.ch_to_adj.items():
+            if src_idx == dst_idx:
+                if tmplt_adj[src_idx, src_idx] > 0:
+                    self_loops.setdefault(src_idx, []).append(
+                        (channel, tmplt_adj[src_idx, src_idx]))
+                continue
+            out_val = tmplt_adj[src_idx, dst_idx]
+            in_val = tmplt_adj[dst_idx, src_idx]
+            if out_val > 0:
+                arcs.setdefault((src_idx, dst_idx), []).append(
+                    (channel, False, out_val))
+                arcs.setdefault((dst_idx, src_idx), []).append(
+                    (channel, True, out_val))
+            if in_val > 0:
+                arcs.setdefault((src_idx, dst_idx), []).append(
+                    (channel, True, in_val))
+                arcs.setdefault((dst_idx, src_idx), []).append(
+                    (channel, False, in_val))
+    return arcs, self_loops
+
+
+class _cache():
+    tmplt_key = None
+    arcs = None
+    self_loops = None
+    nbrs = None
+    world_key = None
+    bitsets = None
+
+
+def revise(bitsets, requirements, candidates, src_idx, dst_idx):
+    """
+    Remove the candidates of src_idx that are not connected by enough edges
+    to any candidate of dst_idx. Returns True if any were removed.
+    """
+    src_cands = np.flatnonzero(candidates[src_idx])
+    if isinstance(candidates, BitsetCandidates):
+        dst_packed = candidates.words[dst_idx]
+    else:
+        dst_packed = pack_rows(candidates[dst_idx])[0]
+    is_supported = np.zeros(len(src_cands), dtype=np.bool_)
+    for start in range(0, len(src_cands), ROW_BLOCK_SIZE):
+        block = src_cands[start:start + ROW_BLOCK_SIZE]
+        enough_edges = dst_packed[np.newaxis, :]
+        for channel, is_incoming, multiplicity in requirements:
+            enough_edges = enough_edges & \
+                bitsets.get(channel, is_incoming, multiplicity)[block]
+        is_supported[start:start + ROW_BLOCK_SIZE] = enough_edges.any(axis=1)
+
+    if is_supported.all():
+        return False
+    candidates[src_idx, src_cands[~is_supported]] = False
+    return True
+
+
+@accepts_bitsets
+def topology_filter(tmplt, world, candidates, *,
+                    changed_cands=None, **kwargs):
+    """
+    Same constraint as topology_filter_dense but propagated to arc
+    consistency: every candidate of a template node must be connected by
+    sufficiently many edges, in each channel and direction, to some
+    candidate of each of its template neighbors.
+
+    changed_cands: boolean array indicating which nodes in the template have
+                   candidates that have changed since last time this ran
+    """
+    global _cache
+
+    if tmplt.cache_key != _cache.tmplt_key:
+        _cache.arcs, _cache.self_loops = get_template_arcs(tmplt)
+        _cache.nbrs = {}
+        for src_idx, dst_idx in _cache.arcs:
+            _cache.nbrs.setdefault(dst_idx, []).append(src_idx)
+        _cache.tmplt_key = tmplt.cache_key
+    if world.cache_key != _cache.world_key:
+        _cache.bitsets = EnoughEdgesBitsets(world)
+        _cache.world_key = world.cache_key
+    arcs, nbrs, bitsets = _cache.arcs, _cache.nbrs, _cache.bitsets
+
+    if changed_cands is None:
+        changed_cands = np.ones(tmplt.n_nodes, dtype=np.bool_)
+
+    # self edges only depend on the node itself so they are checked once
+    for node_idx, requirements in _cache.self_loops.items():
+        if changed_cands[node_idx]:
+            for channel, multiplicity in requirements:
+                candidates[node_idx] &= \
+                    bitsets.self_edges(channel) >= multiplicity
+
+    # worklist of arcs (s, d): candidates of s need support among those of d
+    worklist = deque()
+    in_worklist = set()
+    for node_idx in np.flatnonzero(changed_cands):
+        for nbr_idx in nbrs.get(node_idx, []):
+            for arc in ((nbr_idx, node_idx), (node_idx, nbr_idx)):
+                if arc not in in_worklist:
+                    in_worklist.add(arc)
+                    worklist.append(arc)
+
+    while worklist:
+        arc = worklist.popleft()
+        in_worklist.discard(arc)
+        src_idx, dst_idx = arc
+        if not revise(bitsets, arcs[arc], candidates, src_idx, dst_idx):
+            continue
+        if not candidates[src_idx].any():
+            candidates[:, :] = False
+            break
+        # src lost candidates so its neighbors may have lost support
+        for nbr_idx in nbrs.get(src_idx, []):
+            if nbr_idx != dst_idx and (nbr_idx, src_idx) not in in_worklist:
+                in_worklist.add((nbr_idx, src_idx))
+                worklist.append((nbr_idx, src_idx))
+
+    return tmplt, world, candidates
@@ -3,3 +3,5 @@ from .misc import *
 from .graph_ops import *
 from .data_structures import *
 from .summarize import summarize
+from .bitset_candidates import BitsetCandidates, accepts_bitsets, call_filter
+from .shared_graph import SharedGraph
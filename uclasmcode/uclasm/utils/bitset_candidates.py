@@ -0,0 +1,239 @@
+"""
+Candidate matrix packed into bitsets
+
+The candidates of a template node are a row of n_world bits held in uint64
+words (bit j in word j // 64 at position j % 64), so the matrix takes one bit
+per entry instead of the byte of a NumPy bool array: copies, as made for every
+trial candidate by the elimination and validation filters, move 8 times less
+memory, and counting the candidates of every row is a popcount of its words.
+
+BitsetCandidates supports the part of the bool array interface the filters
+use (sum, any, copy, indexing a row, an entry, a column or the whole matrix)
+so most filters run on either. A filter that needs a real bool array is run by
+call_filter on an unpacked copy unless it is marked with accepts_bitsets.
+"""
+
+import numpy as np
+
+WORD_SIZE = 64
+
+# SWAR popcount constants (numpy has no popcount before np.bitwise_count)
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def n_words_for(n_bits):
+    """Number of uint64 words needed to hold n_bits bits."""
+    return (n_bits + WORD_SIZE - 1) // WORD_SIZE
+
+
+def pack_rows(is_set):
+    """
+    Pack a 1d or 2d boolean array into rows of uint64 words. Bit j of a row
+    lives in word j // 64 at position j % 64.
+    """
+    is_set = np.atleast_2d(is_set)
+    n_rows, n_bits = is_set.shape
+    packed = np.zeros((n_rows, n_words_for(n_bits) * 8), dtype=np.uint8)
+    packed[:, :(n_bits + 7) // 8] = np.packbits(is_set, axis=1,
+                                                bitorder="little")
+    return packed.view(np.uint64)
+
+
+def unpack_rows(words, n_bits):
+    """ Inverse of pack_rows: the first n_bits bits of each row of words """
+    words = np.atleast_2d(words)
+    return np.unpackbits(words.view(np.uint8), axis=1, count=n_bits,
+                         bitorder="little").astype(np.bool_)
+
+
+def popcount(words):
+    """ The number of set bits of each uint64 word """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    words = words - ((words >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return (words * _H01) >> np.uint64(56)
+
+
+class BitsetCandidates:
+    """
+    A (n_rows, n_cols) boolean matrix stored as rows of uint64 words. The
+    padding bits past n_cols in the last word of each row are always zero.
+    """
+
+    def __init__(self, words, n_cols):
+        self.words = words
+        self.n_cols = n_cols
+
+    @classmethod
+    def from_bool(cls, is_cand):
+        """ Pack a 2d bool array """
+        is_cand = np.asarray(is_cand, dtype=np.bool_)
+        return cls(pack_rows(is_cand), is_cand.shape[1])
+
+    @classmethod
+    def ones(cls, n_rows, n_cols):
+        """ Every entry set """
+        row = pack_rows(np.ones(n_cols, dtype=np.bool_))
+        return cls(np.repeat(row, n_rows, axis=0), n_cols)
+
+    @classmethod
+    def zeros(cls, n_rows, n_cols):
+        """ No entry set """
+        return cls(np.zeros((n_rows, n_words_for(n_cols)), dtype=np.uint64),
+                   n_cols)
+
+    @property
+    def shape(self):
+        return self.words.shape[0], self.n_cols
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def to_bool(self):
+        """ The matrix as a 2d bool array """
+        return unpack_rows(self.words, self.n_cols)
+
+    def __array__(self, dtype=None):
+        is_cand = self.to_bool()
+        return is_cand if dtype is None else is_cand.astype(dtype)
+
+    def copy(self):
+        return BitsetCandidates(self.words.copy(), self.n_cols)
+
+    def __eq__(self, other):
+        if not isinstance(other, BitsetCandidates):
+            return NotImplemented
+        return self.n_cols == other.n_cols and \
+            np.array_equal(self.words, other.words)
+
+    def __repr__(self):
+        return "BitsetCandidates(shape={}, count={})".format(
+            self.shape, self.sum())
+
+    def _column_mask(self, cols):
+        """ The packed row with the bits of the columns cols set """
+        is_col = np.zeros(self.n_cols, dtype=np.bool_)
+        is_col[cols] = True
+        return pack_rows(is_col)[0]
+
+    def row_counts(self):
+        """ The number of candidates of each row, i.e. sum(axis=1) """
+        return popcount(self.words).sum(axis=1).astype(np.int64)
+
+    def column_counts(self):
+        """ The number of rows having each column as a candidate """
+        return self.to_bool().sum(axis=0)
+
+    def any_rows(self):
+        """ Whether each row has any candidate, i.e. any(axis=1) """
+        return self.words.any(axis=1)
+
+    def any_columns(self):
+        """ Whether each column is a candidate of any row, i.e. any(axis=0) """
+        return unpack_rows(np.bitwise_or.reduce(self.words, axis=0),
+                           self.n_cols)[0]
+
+    def sum(self, axis=None):
+        if axis is None:
+            return int(self.row_counts().sum())
+        if axis in (1, -1):
+            return self.row_counts()
+        if axis == 0:
+            return self.column_counts()
+        raise ValueError("axis {} is out of bounds".format(axis))
+
+    def any(self, axis=None):
+        if axis is None:
+            return bool(self.words.any())
+        if axis in (1, -1):
+            return self.any_rows()
+        if axis == 0:
+            return self.any_columns()
+        raise ValueError("axis {} is out of bounds".format(axis))
+
+    def intersection_counts(self, row):
+        """ The number of candidates each row shares with the packed row """
+        return popcount(self.words & row).sum(axis=1).astype(np.int64)
+
+    def and_rows(self, row, rows=slice(None)):
+        """ Keep only the candidates of the packed row in the given rows """
+        self.words[rows] &= row
+
+    def clear(self):
+        self.words[:] = 0
+
+    def select_columns(self, cols):
+        """ The matrix of the given columns (bool mask or indices) """
+        return BitsetCandidates.from_bool(self.to_bool()[:, cols])
+
+    def difference(self, other):
+        """ The entries set in self but not in other """
+        return BitsetCandidates(self.words & ~other.words, self.n_cols)
+
+    def changed_rows(self, other):
+        """ Whether each row differs from the same row of other """
+        return (self.words != other.words).any(axis=1)
+
+    def _split_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError("BitsetCandidates is 2 dimensional")
+        return key
+
+    @staticmethod
+    def _is_full_slice(key):
+        return isinstance(key, slice) and key == slice(None)
+
+    def __getitem__(self, key):
+        row_key, col_key = self._split_key(key)
+        if self._is_full_slice(row_key):
+            if self._is_full_slice(col_key):
+                return self.copy()
+            if np.ndim(col_key) == 1:
+                return self.select_columns(col_key)
+        elif np.ndim(row_key) == 0:
+            return unpack_rows(self.words[row_key], self.n_cols)[0][col_key]
+        raise IndexError("unsupported index {!r}".format(key))
+
+    def __setitem__(self, key, value):
+        row_key, col_key = self._split_key(key)
+        if self._is_full_slice(row_key) and np.ndim(value) == 0:
+            mask = self._column_mask(col_key)
+            if value:
+                self.words |= mask
+            else:
+                self.words &= ~mask
+        elif np.ndim(row_key) == 0:
+            row = unpack_rows(self.words[row_key], self.n_cols)[0]
+            row[col_key] = value
+            self.words[row_key] = pack_rows(row)[0]
+        else:
+            raise IndexError("unsupported index {!r}".format(key))
+
+
+def accepts_bitsets(filter):
+    """
+    Mark a filter as working on BitsetCandidates as well as bool arrays, so
+    that call_filter does not unpack the candidates for it.
+    """
+    filter.accepts_bitsets = True
+    return filter
+
+
+def call_filter(filter, tmplt, world, candidates, **kwargs):
+    """
+    Run filter on the candidates. BitsetCandidates are unpacked for the filters
+    not marked with accepts_bitsets, and the result packed back.
+    """
+    if not isinstance(candidates, BitsetCandidates) or \
+            getattr(filter, "accepts_bitsets", False):
+        return filter(tmplt, world, candidates, **kwargs)
+    tmplt, world, is_cand = filter(tmplt, world, candidates.to_bool(), **kwargs)
+    return tmplt, world, BitsetCandidates.from_bool(is_cand)
@@ -3,12 +3,17 @@ Filtering algorithms expect data to come in the form of Graph objects
 """
 
 import os
+from itertools import count
 
 from uclasmcode.uclasm.utils.misc import index_map
+from uclasmcode.uclasm.utils.edge_index import EdgeIndex
 import scipy.sparse as sparse
 import numpy as np
 import networkx as nx
 
+# source of unique ids for Graph.cache_key
+_graph_uids = count()
+
 
 class Graph:
     def __init__(self, nodes, channels, adjs, labels=None, name=None):
@@ -32,6 +37,85 @@ class Graph:
         self.out_degree_array = None
         self.degree_array = None
         self.neighbors_list = []
+        self._edge_index = None
+
+        # uid and version make up cache_key; version is bumped whenever the
+        # adjacency matrices are modified in place
+        self._uid = next(_graph_uids)
+        self._version = 0
+
+        # If this graph was produced by subgraph, the graph it was ultimately
+        # taken from and the indices of our nodes in that graph
+        self.root_graph = None
+        self.root_idxs = None
+        self._root_version = None
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # uids are only unique within a process, so an unpickled graph gets a
+        # new one. Graphs pickled before cache keys existed get the defaults.
+        self._uid = next(_graph_uids)
+        self.__dict__.setdefault("_version", 0)
+        self.__dict__.setdefault("root_graph", None)
+        self.__dict__.setdefault("root_idxs", None)
+        self.__dict__.setdefault("_root_version", None)
+        self.__dict__.setdefault("_edge_index", None)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_edge_index"] = None  # rebuilt when needed
+        return state
+
+    @property
+    def cache_key(self):
+        """
+        A hashable key identifying this graph and the current state of its
+        adjacency matrices. Use this instead of object identity for caching.
+        """
+        return (self._uid, self._version)
+
+    @property
+    def is_root_current(self):
+        """
+        Whether this graph is still an induced subgraph of root_graph, i.e.
+        neither has been modified since subgraph was called.
+        """
+        return (self.root_graph is not None and self._version == 0 and
+                self.root_graph._version == self._root_version)
+
+    def invalidate_cache(self):
+        """
+        Call this after modifying the adjacency matrices in place so that
+        anything cached under the old cache_key is no longer used.
+        """
+        self._version += 1
+        self._composite_adj = None
+        self._sym_composite_adj = None
+        self._is_nbr = None
+        self.in_degree_array = None
+        self.out_degree_array = None
+        self.degree_array = None
+        self.neighbors_list = []
+        self._edge_index = None
+
+    @property
+    def edge_index(self):
+        """
+        Hash index of the edge multiplicities of every channel (see
+        EdgeIndex), built on first use and rebuilt after invalidate_cache.
+        """
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self.ch_to_adj)
+
+        return self._edge_index
+
+    def multiplicity(self, channel, src, dst):
+        """
+        The number of edges from src to dst in channel, for arrays (or ints)
+        src and dst broadcast together: a vectorized adj[src, dst] without the
+        overhead of indexing the sparse matrix.
+        """
+        return self.edge_index.multiplicity(channel, src, dst)
 
     @property
     def composite_adj(self):
@@ -125,7 +209,19 @@ class Graph:
         adjs = [adj[node_idxs, :][:, node_idxs] for adj in self.adjs]
 
         # Return a new graph object for the induced subgraph
-        return Graph(nodes, self.channels, adjs, labels=labels)
+        subgraph = Graph(nodes, self.channels, adjs, labels=labels)
+
+        # Remember where the nodes came from so features of the root graph
+        # can be reused (e.g. by incremental_stats_filter)
+        idxs = np.arange(self.n_nodes)[node_idxs]
+        if self.is_root_current:
+            subgraph.root_graph = self.root_graph
+            subgraph.root_idxs = self.root_idxs[idxs]
+        else:
+            subgraph.root_graph = self
+            subgraph.root_idxs = idxs
+        subgraph._root_version = subgraph.root_graph._version
+        return subgraph
 
     def sparsify(self):
         """
@@ -137,6 +233,7 @@ class Graph:
         for ch, adj in self.ch_to_adj.items():
             self.ch_to_adj[ch] = sparse.csr_matrix(adj)
         self.is_sparse = True
+        self.invalidate_cache()
 
     def densify(self):
         """
@@ -151,6 +248,7 @@ class Graph:
         for ch, adj in self.ch_to_adj.items():
             self.ch_to_adj[ch] = adj.A
         self.is_sparse = False
+        self.invalidate_cache()
 
     def convert_dtype(self, dtype):
         """
@@ -158,6 +256,7 @@ class Graph:
         """
         for ch, adj in self.ch_to_adj.items():
             self.ch_to_adj[ch] = adj.astype(dtype)
+        self.invalidate_cache()
 
     def copy(self):
         """
@@ -212,6 +311,7 @@ class Graph:
         count is the number of edges to add.
         """
         self.ch_to_adj[channel][node_1,node_2] += count
+        self.invalidate_cache()
 
     def remove_edge(self, channel, node_1, node_2, count=1):
         """
@@ -221,6 +321,7 @@ class Graph:
         if count > self.ch_to_adj[channel][node_1,node_2]:
             raise ValueError("Specified count to remove is larger than number of edges")
         self.ch_to_adj[channel][node_1,node_2] -= count
+        self.invalidate_cache()
 
     def write_channel_solnon(self, filename, channel):
         """
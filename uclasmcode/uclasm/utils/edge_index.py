@@ -0,0 +1,94 @@
+"""
+Hash index of the edge multiplicities of a multichannel graph
+
+Point lookups adj[u, v] on a scipy sparse matrix go through a python level
+binary search with a large overhead per call. Here the nonzero entries of each
+channel are stored in an open addressing hash table (linear probing) keyed by
+u * n_cols + v, held in two NumPy arrays, and looked up for whole arrays of
+(u, v) pairs at once: each round probes one slot for every pair that is still
+unresolved, and there are as many rounds as the longest probe sequence.
+"""
+
+import numpy as np
+import scipy.sparse as sparse
+
+EMPTY = -1  # key of the free slots (keys are nonnegative)
+MAX_LOAD = 0.5  # the table has at least 1 / MAX_LOAD slots per edge
+# Fibonacci hashing: the top bits of key * 2**64 / golden ratio
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class EdgeIndex:
+    """
+    The multiplicity of every edge of every channel, for vectorized lookups.
+    Built once from the adjacency matrices (sparse or dense); it does not see
+    later changes to them (see Graph.edge_index).
+    """
+
+    def __init__(self, ch_to_adj):
+        self.tables = {ch: _HashTable(adj) for ch, adj in ch_to_adj.items()}
+
+    def multiplicity(self, channel, src, dst):
+        """
+        The number of edges from src to dst in channel, for arrays (or ints)
+        src and dst broadcast together.
+        """
+        return self.tables[channel].get(src, dst)
+
+    def __len__(self):
+        """ The number of (channel, src, dst) with at least one edge """
+        return sum(table.n_entries for table in self.tables.values())
+
+
+class _HashTable:
+    """ The nonzero entries of one adjacency matrix """
+
+    def __init__(self, adj):
+        adj = sparse.coo_matrix(adj)
+        adj.sum_duplicates()
+        is_edge = adj.data != 0
+        self.n_cols = adj.shape[1]
+        self.n_entries = int(np.count_nonzero(is_edge))
+        self.n_bits = max(int(np.ceil(np.log2(max(self.n_entries, 1) / MAX_LOAD))), 1)
+        self.mask = (1 << self.n_bits) - 1
+        self.keys = np.full(1 << self.n_bits, EMPTY, dtype=np.int64)
+        self.values = np.zeros(1 << self.n_bits, dtype=adj.dtype)
+        self._insert(adj.row[is_edge].astype(np.int64) * self.n_cols + adj.col[is_edge],
+                     adj.data[is_edge])
+
+    def _slots(self, keys):
+        """ The first slot to probe for each key """
+        hashed = keys.astype(np.uint64) * HASH_MULTIPLIER
+        return (hashed >> np.uint64(64 - self.n_bits)).astype(np.int64)
+
+    def _insert(self, keys, values):
+        """ Insert distinct keys not in the table yet """
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            is_free = self.keys[slots[pending]] == EMPTY
+            # the first of the keys probing a same free slot takes it
+            claimed, first = np.unique(slots[pending[is_free]], return_index=True)
+            placed = pending[is_free][first]
+            self.keys[claimed] = keys[placed]
+            self.values[claimed] = values[placed]
+            is_placed = np.zeros(len(keys), dtype=np.bool_)
+            is_placed[placed] = True
+            pending = pending[~is_placed[pending]]
+            slots[pending] = (slots[pending] + 1) & self.mask
+
+    def get(self, src, dst):
+        src, dst = np.broadcast_arrays(np.asarray(src, dtype=np.int64),
+                                       np.asarray(dst, dtype=np.int64))
+        keys = (src * self.n_cols + dst).reshape(-1)
+        result = np.zeros(len(keys), dtype=self.values.dtype)
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            found = self.keys[slots[pending]]
+            is_hit = found == keys[pending]
+            result[pending[is_hit]] = self.values[slots[pending[is_hit]]]
+            # a free slot ends the probe sequence: no such edge
+            pending = pending[~is_hit & (found != EMPTY)]
+            slots[pending] = (slots[pending] + 1) & self.mask
+        return result.reshape(src.shape)
@@ -0,0 +1,92 @@
+"""
+Graphs shared between processes through shared memory
+
+SharedGraph copies the adjacency matrices of a Graph (the data, indices and
+indptr arrays of each sparse matrix, or the array of a dense one) into blocks
+of shared memory once. Pickling it only sends the names of the blocks along
+with the nodes, channels and labels, so handing it to the worker processes of
+a pool does not copy the world into every one of them: a worker gets a Graph
+whose adjacency matrices are views of the shared blocks (see attach).
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sparse
+
+from .data_structures import Graph
+
+
+class SharedGraph:
+    """
+    The process creating a SharedGraph owns its blocks: use it as a context
+    manager there so that they are freed on exit.
+    """
+
+    def __init__(self, graph):
+        self.nodes = graph.nodes
+        self.channels = list(graph.channels)
+        self.labels = graph.labels
+        self._blocks = []
+        self.adj_specs = [self._share_adj(adj) for adj in graph.adjs]
+        self._graph = graph
+
+    def _share_array(self, array):
+        """ Copy array into a new block. Returns what is needed to attach it """
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(array.nbytes, 1))
+        self._blocks.append(block)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        return block.name, array.shape, array.dtype.str
+
+    def _share_adj(self, adj):
+        if sparse.issparse(adj):
+            adj = sparse.csr_matrix(adj)
+            return "csr", adj.shape, [self._share_array(array) for array in
+                                      (adj.data, adj.indices, adj.indptr)]
+        return "dense", adj.shape, [self._share_array(np.asarray(adj))]
+
+    def _attach_array(self, name, shape, dtype):
+        block = shared_memory.SharedMemory(name=name)
+        # the views below need the block to stay open as long as we live
+        self._blocks.append(block)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def attach(self):
+        """
+        The shared Graph. In the owning process, the graph it was built from.
+        """
+        if self._graph is None:
+            adjs = []
+            for kind, shape, array_specs in self.adj_specs:
+                arrays = [self._attach_array(*spec) for spec in array_specs]
+                if kind == "csr":
+                    adjs.append(sparse.csr_matrix(tuple(arrays), shape=shape,
+                                                  copy=False))
+                else:
+                    adjs.append(arrays[0])
+            self._graph = Graph(self.nodes, self.channels, adjs,
+                                labels=self.labels)
+            # the blocks are unmapped when we are collected, so the graph
+            # keeps us alive
+            self._graph.shared_graph = self
+        return self._graph
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_blocks"] = []
+        state["_graph"] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+    def unlink(self):
+        """ Free the blocks. Only the owning process should call this """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []